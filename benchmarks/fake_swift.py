@@ -0,0 +1,334 @@
+""" In-process fake Swift for benchmarks.
+
+FakeSwift is a WSGI application implementing the parts of the Swift API
+swiftbrowser uses: auth v1, /info, account, container and object requests,
+JSON listings (marker, end_marker, prefix, delimiter, reverse) and bulk
+deletes. Object metadata is derived from the names, thus containers with
+millions of objects need little more memory than their names.
+
+Every request is delayed by `latency` seconds to simulate the round trip to
+a remote cluster. Connections are not kept alive.
+"""
+import bisect
+import json
+import threading
+import time
+import zlib
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, unquote
+from wsgiref.simple_server import make_server, WSGIRequestHandler, \
+    WSGIServer
+
+CONTENT_TYPES = ('application/octet-stream', 'image/jpeg', 'text/plain',
+                 'application/pdf', 'video/mp4')
+
+
+class FakeContainer(object):
+    """ A container holding a sorted list of object names. """
+
+    def __init__(self):
+        self.names = []
+        self.objects = {}
+        self.bytes_used = 0
+        self.headers = {'x-timestamp': '%.5f' % time.time()}
+
+    def entry(self, name):
+        """ Returns the listing entry of an object. """
+        if name in self.objects:
+            return self.objects[name]
+        crc = zlib.crc32(name.encode('utf-8'))
+        return {
+            'name': name,
+            'bytes': crc % (16 << 20),
+            'hash': '%032x' % crc,
+            'content_type': CONTENT_TYPES[crc % len(CONTENT_TYPES)],
+            'last_modified': '2020-%02d-%02dT%02d:%02d:%02d.%06d' % (
+                crc % 12 + 1, crc % 28 + 1, crc % 24, crc % 60,
+                crc // 60 % 60, crc % 1000000),
+        }
+
+    def add(self, names):
+        """ Adds objects with generated metadata. """
+        self.names.extend(names)
+        self.names.sort()
+        self.bytes_used += sum(self.entry(name)['bytes'] for name in names)
+
+    def put(self, name, size, content_type):
+        self.remove([name])
+        self.objects[name] = {
+            'name': name, 'bytes': size, 'hash': '%032x' % 0,
+            'content_type': content_type or CONTENT_TYPES[0],
+            'last_modified': time.strftime('%Y-%m-%dT%H:%M:%S.000000'),
+        }
+        bisect.insort(self.names, name)
+        self.bytes_used += size
+
+    def exists(self, name):
+        index = bisect.bisect_left(self.names, name)
+        return index < len(self.names) and self.names[index] == name
+
+    def remove(self, names):
+        """ Removes objects, returns the number of removed objects. """
+        indexes = []
+        for name in sorted(set(names)):
+            index = bisect.bisect_left(self.names, name)
+            if index < len(self.names) and self.names[index] == name:
+                indexes.append(index)
+                self.bytes_used -= self.entry(name)['bytes']
+                self.objects.pop(name, None)
+        # Delete contiguous ranges at once, starting at the end
+        end = None
+        for index in reversed(indexes):
+            if end is None:
+                start = end = index
+            elif index == start - 1:
+                start = index
+            else:
+                del self.names[start:end + 1]
+                start = end = index
+        if end is not None:
+            del self.names[start:end + 1]
+        return len(indexes)
+
+    def listing(self, prefix='', delimiter='', marker='', end_marker='',
+                limit=10000, reverse=False):
+        names = self.names
+        items = []
+        if reverse:
+            index = bisect.bisect_left(names, marker) - 1 if marker \
+                else len(names) - 1
+            while index >= 0 and len(items) < limit:
+                name = names[index]
+                if end_marker and name <= end_marker:
+                    break
+                if not name.startswith(prefix):
+                    if name < prefix:
+                        break
+                    index -= 1
+                    continue
+                pos = name.find(delimiter, len(prefix)) if delimiter else -1
+                if pos >= 0:
+                    subdir = name[:pos + 1]
+                    if subdir != marker:
+                        items.append({'subdir': subdir})
+                    index = bisect.bisect_left(names, subdir) - 1
+                    continue
+                items.append(self.entry(name))
+                index -= 1
+            return items
+
+        index = bisect.bisect_right(names, marker) if marker else 0
+        index = max(index, bisect.bisect_left(names, prefix))
+        while index < len(names) and len(items) < limit:
+            name = names[index]
+            if not name.startswith(prefix):
+                break
+            if end_marker and name >= end_marker:
+                break
+            pos = name.find(delimiter, len(prefix)) if delimiter else -1
+            if pos >= 0:
+                subdir = name[:pos + 1]
+                if subdir != marker:
+                    items.append({'subdir': subdir})
+                index = bisect.bisect_left(
+                    names, name[:pos] + chr(ord(delimiter) + 1))
+                continue
+            items.append(self.entry(name))
+            index += 1
+        return items
+
+
+class FakeSwift(object):
+    """ WSGI application emulating a Swift cluster with a single account.
+    """
+
+    def __init__(self, latency=0.0, account='AUTH_bench', bulk=True):
+        self.latency = latency
+        self.account = account
+        self.bulk = bulk
+        self.containers = {}
+        self.headers = {'x-account-meta-temp-url-key': 'benchmark'}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.url = None
+
+    def fill(self, container, count, folders=10):
+        """ Creates container with count objects in folders pseudofolders.
+        """
+        self.containers[container] = FakeContainer()
+        self.containers[container].add([
+            'folder%02d/object%07d.dat' % (i % folders, i)
+            for i in range(count)])
+
+    def __call__(self, environ, start_response):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        method = environ['REQUEST_METHOD']
+        path = unquote(environ.get('PATH_INFO', ''))
+        query = dict((key, values[0]) for key, values in parse_qs(
+            environ.get('QUERY_STRING', ''), keep_blank_values=True).items())
+        with self.lock:
+            status, headers, body = self.handle(environ, method, path, query)
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+            headers.append(('Content-Type', 'application/json'))
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        headers.append(('Content-Length', str(len(body))))
+        if method == 'HEAD':
+            body = b''
+        start_response(status, headers)
+        return [body]
+
+    def handle(self, environ, method, path, query):
+        if path.startswith('/auth/'):
+            return ('200 OK', [
+                ('X-Storage-Url', '%s/v1/%s' % (self.url, self.account)),
+                ('X-Auth-Token', 'AUTH_tkbenchmark')], '')
+        if path == '/info':
+            info = {'swift': {'version': 'fake'},
+                    'slo': {'max_manifest_segments': 1000},
+                    'bulk_upload': {}}
+            if self.bulk:
+                info['bulk_delete'] = {'max_deletes_per_request': 10000}
+            return '200 OK', [], info
+
+        parts = path.split('/', 4)[2:]
+        if not parts or parts[0] != self.account:
+            return '404 Not Found', [], ''
+        if len(parts) == 1 or not parts[1]:
+            return self.handle_account(environ, method, query)
+        if len(parts) == 2 or not parts[2]:
+            return self.handle_container(environ, method, parts[1], query)
+        return self.handle_object(environ, method, parts[1],
+                                  '/'.join(parts[2:]))
+
+    def read_body(self, environ):
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        return environ['wsgi.input'].read(length) if length else b''
+
+    def handle_account(self, environ, method, query):
+        if method == 'POST':
+            if 'bulk-delete' in query:
+                return self.bulk_delete(environ)
+            for key, value in environ.items():
+                if key.startswith('HTTP_X_ACCOUNT_META_'):
+                    name = key[5:].lower().replace('_', '-')
+                    self.headers[name] = value
+            return '204 No Content', [], ''
+        if method == 'DELETE' and 'bulk-delete' in query:
+            return self.bulk_delete(environ)
+
+        headers = [
+            ('X-Account-Container-Count', str(len(self.containers))),
+            ('X-Account-Object-Count', str(sum(
+                len(c.names) for c in self.containers.values()))),
+            ('X-Account-Bytes-Used', str(sum(
+                c.bytes_used for c in self.containers.values()))),
+        ] + list(self.headers.items())
+        if method == 'HEAD':
+            return '204 No Content', headers, ''
+        names = sorted(self.containers)
+        marker = query.get('marker', '')
+        prefix = query.get('prefix', '')
+        limit = int(query.get('limit', 10000))
+        names = [name for name in names
+                 if name > marker and name.startswith(prefix)]
+        listing = [{'name': name, 'count': len(self.containers[name].names),
+                    'bytes': self.containers[name].bytes_used}
+                   for name in names[:limit]]
+        return '200 OK', headers, listing
+
+    def bulk_delete(self, environ):
+        paths = [unquote(line) for line in
+                 self.read_body(environ).decode('utf-8').splitlines()]
+        by_container = {}
+        for path in paths:
+            container, _sep, name = path.lstrip('/').partition('/')
+            by_container.setdefault(container, []).append(name)
+        deleted = 0
+        for container, names in by_container.items():
+            if container in self.containers:
+                deleted += self.containers[container].remove(names)
+        return '200 OK', [], {
+            'Number Deleted': deleted,
+            'Number Not Found': len(paths) - deleted,
+            'Response Status': '200 OK', 'Response Body': '', 'Errors': []}
+
+    def handle_container(self, environ, method, name, query):
+        container = self.containers.get(name)
+        if method == 'PUT':
+            if container is None:
+                self.containers[name] = FakeContainer()
+                return '201 Created', [], ''
+            return '202 Accepted', [], ''
+        if container is None:
+            return '404 Not Found', [], ''
+        if method == 'POST':
+            for key, value in environ.items():
+                if key.startswith('HTTP_X_CONTAINER_'):
+                    header = key[5:].lower().replace('_', '-')
+                    container.headers[header] = value
+            return '204 No Content', [], ''
+        if method == 'DELETE':
+            if container.names:
+                return '409 Conflict', [], ''
+            del self.containers[name]
+            return '204 No Content', [], ''
+
+        headers = [
+            ('X-Container-Object-Count', str(len(container.names))),
+            ('X-Container-Bytes-Used', str(container.bytes_used)),
+        ] + list(container.headers.items())
+        if method == 'HEAD':
+            return '204 No Content', headers, ''
+        listing = container.listing(
+            prefix=query.get('prefix', ''),
+            delimiter=query.get('delimiter', ''),
+            marker=query.get('marker', ''),
+            end_marker=query.get('end_marker', ''),
+            limit=int(query.get('limit', 10000)),
+            reverse=query.get('reverse', '').lower() in ('on', 'true', '1'))
+        return '200 OK', headers, listing
+
+    def handle_object(self, environ, method, container_name, name):
+        container = self.containers.get(container_name)
+        if container is None:
+            return '404 Not Found', [], ''
+        if method == 'PUT':
+            body = self.read_body(environ)
+            container.put(name, len(body), environ.get('CONTENT_TYPE'))
+            return '201 Created', [('Etag', '%032x' % 0)], ''
+        if not container.exists(name):
+            return '404 Not Found', [], ''
+        if method == 'DELETE':
+            container.remove([name])
+            return '204 No Content', [], ''
+        entry = container.entry(name)
+        headers = [('Etag', entry['hash']),
+                   ('Content-Type', entry['content_type'])]
+        return '200 OK', headers, b'\0' * min(entry['bytes'], 1 << 20)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def serve(app, host='127.0.0.1', port=0):
+    """ Serves app in a background thread, returns the server.
+
+    The base url is also stored in app.url. """
+    server = make_server(host, port, app, server_class=ThreadingWSGIServer,
+                         handler_class=QuietHandler)
+    app.url = 'http://%s:%d' % server.server_address
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
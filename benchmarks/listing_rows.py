@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+""" Benchmark building and rendering a page of an object listing.
+
+Compares the former rows (raw listing dicts formatted by template filters,
+pseudofolders deduplicated using a list) with the precomputed rows returned
+by pseudofolder_object_list.
+
+Usage: python benchmarks/listing_rows.py [objects] [pseudofolders]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.test_settings')
+
+import django  # NOQA
+django.setup()
+
+from django.template import engines  # NOQA
+
+from swiftbrowser.utils import pseudofolder_object_list  # NOQA
+
+FILTER_TEMPLATE = """{% load dateconv lastpart %}
+{% for folder in folders %}{{ folder.0|lastpart }}
+{% endfor %}
+{% for key in objects %}{{ key.name|lastpart }} \
+{{ key.last_modified|dateconv|date:"SHORT_DATETIME_FORMAT" }} \
+{{ key.bytes|filesizeformat }}
+{% endfor %}"""
+
+ROW_TEMPLATE = """
+{% for folder in folders %}{{ folder.display_name }}
+{% endfor %}
+{% for key in objects %}{{ key.display_name }} {{ key.modified }} \
+{{ key.size }}
+{% endfor %}"""
+
+
+def list_based_rows(objects, prefix):
+    """ The former pseudofolder_object_list, for comparison """
+    pseudofolders = []
+    objs = []
+    duplist = []
+    for obj in objects:
+        if 'subdir' in obj:
+            entry = obj['subdir'].strip('/') + '/'
+            if entry != prefix and entry not in duplist:
+                duplist.append(entry)
+                pseudofolders.append((entry, obj['subdir']))
+        else:
+            objs.append(obj)
+    return (pseudofolders, objs)
+
+
+def make_listing(count, folders):
+    listing = [{'subdir': 'prefix/folder%06d/' % i} for i in range(folders)]
+    for i in range(count):
+        listing.append({
+            'name': 'prefix/object%06d.dat' % i,
+            'bytes': i * 4096,
+            'hash': 'd41d8cd98f00b204e9800998ecf8427e',
+            'content_type': 'application/octet-stream',
+            'last_modified': '2020-01-%02dT12:34:56.%06d' % (i % 28 + 1, i),
+        })
+    return listing
+
+
+def run(count=10000, folders=2000, repeat=5):
+    """ Returns the best timings in seconds of both implementations. """
+    listing = make_listing(count, folders)
+    engine = engines['django']
+    templates = {
+        'filters': (list_based_rows, engine.from_string(FILTER_TEMPLATE)),
+        'rows': (pseudofolder_object_list, engine.from_string(ROW_TEMPLATE)),
+    }
+    results = {}
+    for name, (func, template) in templates.items():
+        def build():
+            return func([dict(obj) for obj in listing], 'prefix/')
+
+        def render():
+            folders, objects = build()
+            template.render({'folders': folders, 'objects': objects})
+
+        results[name] = {
+            'build': min(timeit.repeat(build, number=1, repeat=repeat)),
+            'total': min(timeit.repeat(render, number=1, repeat=repeat)),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    results = run(*args)
+    for name, timings in sorted(results.items()):
+        print('%-8s build %7.1f ms   build + render %7.1f ms' % (
+            name, timings['build'] * 1000, timings['total'] * 1000))
+    print('speedup  %.1fx' % (
+        results['filters']['total'] / results['rows']['total']))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+""" Benchmarks of swiftbrowser views and utils against an in-process fake
+Swift cluster.
+
+Every benchmark is run for each fixture size, ie. the number of objects in
+the benchmarked container. Timings and the number of requests sent to Swift
+are written as JSON to --output, thus results of two revisions can be
+compared in review.
+
+Usage: python benchmarks/run.py [--sizes 1000,10000,100000] [--latency 1]
+                                [--repeat 5] [--output results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.test_settings')
+
+import django  # NOQA
+django.setup()
+
+from django.conf import settings  # NOQA
+from django.test import Client  # NOQA
+from django.test.utils import override_settings, \
+    setup_test_environment  # NOQA
+from django.urls import reverse  # NOQA
+
+from swiftbrowser import utils  # NOQA
+from swiftbrowser.connection import pool  # NOQA
+
+from fake_swift import FakeSwift, serve  # NOQA
+
+CONTAINER = 'bench'
+
+
+class Benchmarks(object):
+    """ Runs benchmarks and collects their results. """
+
+    def __init__(self, swift, repeat):
+        self.swift = swift
+        self.repeat = repeat
+        self.results = []
+        self.storage_url = '%s/v1/%s' % (swift.url, swift.account)
+        self.client = Client()
+        session = self.client.session
+        session['storage_url'] = self.storage_url
+        session['auth_token'] = 'AUTH_tkbenchmark'
+        session['username'] = 'bench:bench'
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = \
+            session.session_key
+
+    def measure(self, name, size, func, setup=None, number=1):
+        """ Times func, calling setup untimed before every repetition. """
+        timings = []
+        requests = []
+        for _i in range(self.repeat):
+            if setup:
+                setup()
+            before = self.swift.requests
+            start = time.perf_counter()
+            for _n in range(number):
+                func()
+            timings.append((time.perf_counter() - start) / number)
+            requests.append((self.swift.requests - before) / number)
+        result = {
+            'name': name,
+            'size': size,
+            'repeat': self.repeat,
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.mean(timings),
+            'swift_requests': max(requests),
+        }
+        self.results.append(result)
+        print('%-26s %9s %10.3f ms %8.1f requests' % (
+            name, size, result['median'] * 1000, result['swift_requests']))
+        return result
+
+    def get(self, url, **kwargs):
+        response = self.client.get(url, **kwargs)
+        assert response.status_code in (200, 302), response.status_code
+        return response
+
+    def run_views(self, size):
+        self.swift.fill(CONTAINER, size)
+        objectview = reverse('objectview', args=[CONTAINER])
+        folder = reverse('objectview', args=[CONTAINER, 'folder01/'])
+        self.measure('containerview', size,
+                     lambda: self.get(reverse('containerview')))
+        self.measure('objectview', size, lambda: self.get(objectview))
+        self.measure('objectview_folder', size, lambda: self.get(folder))
+        self.measure('objectview_sorted', size, lambda: self.get(
+            folder, data={'sort': 'size', 'order': 'desc'}))
+        self.measure('edit_acl', size, lambda: self.get(
+            reverse('edit_acl', args=[CONTAINER])))
+
+        delete = reverse('delete_container', args=['delete-me'])
+        self.measure('delete_container', size, lambda: self.get(delete),
+                     setup=lambda: self.swift.fill('delete-me', size))
+
+    def run_utils(self, size):
+        page = self.swift.containers[CONTAINER].listing(limit=size)
+        page += [{'subdir': 'folder%05d/' % i} for i in range(size // 10)]
+        self.measure('pseudofolder_object_list', size,
+                     lambda: utils.pseudofolder_object_list(
+                         [dict(obj) for obj in page], 'folder01/'))
+
+    def run_constant(self):
+        prefix = '/'.join('level%d' % i for i in range(10)) + '/'
+        self.measure('prefix_list', None,
+                     lambda: utils.prefix_list(prefix), number=1000)
+        self.measure('get_temp_url', None, lambda: utils.get_temp_url(
+            self.storage_url, 'AUTH_tkbenchmark', CONTAINER, 'object'),
+            number=1000)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma separated fixture sizes, eg. up to '
+                             '1000000')
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help='milliseconds added to every Swift request')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cache', action='store_true',
+                        help='keep the listing cache enabled')
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    swift = FakeSwift(latency=args.latency / 1000.0)
+    server = serve(swift)
+    overrides = {'JOB_WORKERS': 0}
+    if not args.cache:
+        overrides['LISTING_CACHE_TIMEOUT'] = 0
+
+    benchmarks = Benchmarks(swift, args.repeat)
+    try:
+        with override_settings(**overrides):
+            for size in [int(size) for size in args.sizes.split(',')]:
+                benchmarks.run_views(size)
+                benchmarks.run_utils(size)
+            benchmarks.run_constant()
+    finally:
+        server.shutdown()
+        pool.clear()
+
+    with open(args.output, 'w') as output:
+        json.dump({
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'latency_ms': args.latency,
+            'listing_cache': args.cache,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'results': benchmarks.results,
+        }, output, indent=2)
+    print('Results written to %s' % args.output)
+
+
+if __name__ == '__main__':
+    main()
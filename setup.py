@@ -17,7 +17,9 @@ setup(
     url='https://github.com/cschwede/django-swiftbrowser',
     author='Christian Schwede',
     author_email='info@cschwede.de',
-    install_requires=['django>=2', 'python-swiftclient'],
+    python_requires='>=3.7',
+    install_requires=['django>=2', 'python-swiftclient', 'requests'],
+    extras_require={'thumbnails': ['Pillow']},
     zip_safe=False,
     classifiers=[
         'Environment :: Web Environment',
@@ -27,7 +29,7 @@ setup(
         'Operating System :: OS Independent',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.7',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content',
     ],
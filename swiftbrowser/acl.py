@@ -0,0 +1,135 @@
+""" Container ACLs. """
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from swiftclient import client
+
+from django.conf import settings
+
+from swiftbrowser.connection import call
+from swiftbrowser.utils import invalidate_listings
+
+# Read ACL entries making a container public
+PUBLIC_ENTRIES = ('.r:*', '.rlistings')
+
+
+def split_entries(value):
+    """ Returns the unique, non-empty entries of a comma-separated ACL. """
+    entries = OrderedDict()
+    for entry in value.split(','):
+        entry = entry.strip()
+        if entry:
+            entries[entry] = True
+    return list(entries)
+
+
+class ContainerACL(object):
+    """ Read and write ACL of a container as lists of entries. """
+
+    def __init__(self, readers=(), writers=()):
+        self.readers = list(readers)
+        self.writers = list(writers)
+
+    @classmethod
+    def from_headers(cls, headers):
+        return cls(split_entries(headers.get('x-container-read', '')),
+                   split_entries(headers.get('x-container-write', '')))
+
+    def copy(self):
+        return ContainerACL(self.readers, self.writers)
+
+    def headers(self):
+        return {'X-Container-Read': ','.join(self.readers),
+                'X-Container-Write': ','.join(self.writers)}
+
+    def changed_headers(self, other):
+        """ Returns the headers differing from another ACL. """
+        headers = self.headers()
+        previous = other.headers()
+        return dict((key, value) for key, value in headers.items()
+                    if previous[key] != value)
+
+    def grant(self, entries, read=False, write=False):
+        for entry in entries:
+            if read and entry not in self.readers:
+                self.readers.append(entry)
+            if write and entry not in self.writers:
+                self.writers.append(entry)
+
+    def revoke(self, entries, read=True, write=True):
+        if read:
+            self.readers = [e for e in self.readers if e not in entries]
+        if write:
+            self.writers = [e for e in self.writers if e not in entries]
+
+    @property
+    def public(self):
+        return all(entry in self.readers for entry in PUBLIC_ENTRIES)
+
+    def set_public(self, public):
+        if public:
+            self.grant(PUBLIC_ENTRIES, read=True)
+        else:
+            self.revoke(PUBLIC_ENTRIES, write=False)
+
+    def entries(self):
+        """ Returns an ordered dict {entry: {'read': bool, 'write': bool}}.
+        """
+        entries = OrderedDict()
+        for entry in self.readers + self.writers:
+            entries[entry] = {'read': entry in self.readers,
+                              'write': entry in self.writers}
+        return entries
+
+
+def get_acl(storage_url, auth_token, container):
+    """ Returns the ContainerACL of a container. """
+    headers = call(client.head_container, storage_url, auth_token, container)
+    return ContainerACL.from_headers(headers)
+
+
+def update_acl(storage_url, auth_token, container, change):
+    """ Applies change(acl) to the ACL of a container.
+
+    The ACL is read using a single HEAD and only written if change modified
+    it; only the modified headers are sent. Returns a tuple (ACL, True if
+    it was written). """
+    current = get_acl(storage_url, auth_token, container)
+    acl = current.copy()
+    change(acl)
+    headers = acl.changed_headers(current)
+    if not headers:
+        return acl, False
+    call(client.post_container, storage_url, auth_token, container, headers)
+    invalidate_listings(storage_url, container)
+    return acl, True
+
+
+def update_acls(storage_url, auth_token, containers, change, progress=None):
+    """ Applies change(acl) to the ACLs of many containers concurrently.
+
+    Up to BULK_CONCURRENCY containers are updated at once. progress is
+    called with the number of processed and failed containers. Returns a
+    tuple (changed container names, {failed container: http status}). """
+    concurrency = getattr(settings, 'BULK_CONCURRENCY', 10)
+
+    def update(container):
+        try:
+            return update_acl(storage_url, auth_token, container,
+                              change)[1]
+        except client.ClientException as exc:
+            return exc
+
+    changed = []
+    failed = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for processed, (container, result) in enumerate(zip(
+                containers, executor.map(update, containers)), 1):
+            if isinstance(result, client.ClientException):
+                failed[container] = result.http_status or 0
+            elif result:
+                changed.append(container)
+            if progress:
+                progress(processed, len(failed))
+    return changed, failed
@@ -0,0 +1,19 @@
+"""
+ASGI config for swiftbrowser project.
+
+It exposes the ASGI callable as a module-level variable named ``application``
+and serves the async views by default; set ROOT_URLCONF=swiftbrowser.urls to
+use the sync views instead. Requires Django 3.1 or later.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'swiftbrowser.settings')
+os.environ.setdefault('ROOT_URLCONF', 'swiftbrowser.async_urls')
+
+application = get_asgi_application()
@@ -0,0 +1,14 @@
+""" URLs using the async views, see swiftbrowser.asgi """
+from django.conf.urls import url
+
+from swiftbrowser import async_views
+from swiftbrowser.urls import urlpatterns as sync_urlpatterns
+
+async_view_names = ('containerview', 'objectview', 'public_objectview',
+                    'download')
+
+urlpatterns = tuple(
+    url(pattern.pattern.regex.pattern, getattr(async_views, pattern.name),
+        name=pattern.name)
+    if pattern.name in async_view_names else pattern
+    for pattern in sync_urlpatterns)
@@ -0,0 +1,145 @@
+""" Async variants of the browsing views for ASGI deployments.
+
+Requires Django 3.1 or later. Swift requests run in a bounded thread pool
+using the pooled keep-alive connections, while the event loop keeps serving
+other requests. Sessions must not be database backed (the default is
+signed cookies). """
+# -*- coding: utf-8 -*-
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from swiftclient import client
+
+import django
+from django.conf import settings
+from django.contrib import messages
+from django.shortcuts import redirect
+from django.utils.translation import ugettext as _
+
+from swiftbrowser import views
+from swiftbrowser.connection import call
+from swiftbrowser.sorting import SORT_KEYS, get_sorted_page
+from swiftbrowser.utils import cached_listing, get_listing_page
+
+import swiftbrowser
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_SWIFT_THREADS', 64))
+
+
+async def swift(func, *args, **kwargs):
+    """ Runs a blocking Swift call without blocking the event loop. """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def iterate(iterator):
+    """ Yields the items of a blocking iterator, read in the executor. """
+    iterator = iter(iterator)
+    done = object()
+    while True:
+        item = await swift(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+async def containerview(request):
+    """ Returns a list of all containers in current account. """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    try:
+        account_stat, containers = await swift(
+            cached_listing, storage_url, auth_token)
+    except client.ClientException as exc:
+        return views.containerview_failed(request, exc)
+
+    return views.render_containerview(request, account_stat, containers)
+
+
+async def objectview(request, container, prefix=None):
+    """ Returns list of all objects in current container. """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    await swift(views.formpost_status, request, storage_url, container,
+                prefix)
+
+    if request.GET.get('sort') in SORT_KEYS:
+        return await sorted_objectview(request, container, prefix)
+
+    try:
+        meta, objects, prev_marker, next_marker = await swift(
+            get_listing_page, storage_url, auth_token, container,
+            prefix=prefix, marker=request.GET.get('marker'),
+            end_marker=request.GET.get('end_marker'))
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, _("Access denied."))
+        return redirect('containerview')
+
+    # Rendering may request object details from Swift
+    return await swift(views.render_objectview, request, container, prefix,
+                       meta, objects, prev_marker, next_marker)
+
+
+async def sorted_objectview(request, container, prefix=None):
+    """ Returns a page of all objects below prefix in the requested order """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    sorting = views.sorting_params(request)
+    try:
+        meta = await swift(call, client.head_container, storage_url,
+                           auth_token, container)
+        objects, more = await swift(
+            get_sorted_page, storage_url, auth_token, container,
+            prefix=prefix, sort=sorting['sort'],
+            reverse=sorting['order'] == 'desc', offset=sorting['offset'],
+            limit=sorting['limit'])
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, _("Access denied."))
+        return redirect('containerview')
+
+    return await swift(views.render_objectview, request, container, prefix,
+                       meta, objects, None, None,
+                       views.sorting_context(sorting, more))
+
+
+async def public_objectview(request, account, container, prefix=None):
+    """ Returns list of all objects in current container.
+
+    The shared page cache is revalidated using blocking cache and Swift
+    calls, thus the whole view runs in the executor. """
+    return await swift(views.public_objectview, request, account, container,
+                       prefix)
+
+
+async def download(request, container, objectname):
+    """ Download an object from Swift """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    if getattr(settings, 'DOWNLOAD_PROXY', False):
+        response = await swift(views.proxy_download, request, storage_url,
+                               auth_token, container, objectname)
+        if response.streaming and django.VERSION >= (4, 2):
+            # Older versions iterate the body in the event loop
+            response.streaming_content = iterate(response.streaming_content)
+        return response
+
+    url = await swift(swiftbrowser.utils.get_temp_url, storage_url,
+                      auth_token, container, objectname)
+    if not url:
+        messages.add_message(request, messages.ERROR, _("Access denied."))
+        return redirect('objectview', container=container)
+
+    return redirect(url)
@@ -0,0 +1,145 @@
+""" Keystone v3 authentication with tokens shared between processes. """
+# -*- coding: utf-8 -*-
+import hmac
+import threading
+import time
+from hashlib import sha256
+
+import requests
+from swiftclient import client
+
+from django.conf import settings
+from django.core.cache import cache
+
+from swiftbrowser.metrics import trace
+from swiftbrowser.utils import parse_timestamp
+
+_local = threading.local()
+
+
+def get_session():
+    """ Returns the requests session of the current thread.
+
+    Sessions keep the connection to Keystone alive between logins. """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def credentials_key(auth_url, username, password):
+    """ Cache key of the token issued for a set of credentials.
+
+    The key is a HMAC using SECRET_KEY, thus cached tokens are only found
+    using the right password and the password can't be recovered from
+    cache keys. """
+    digest = hmac.new(
+        settings.SECRET_KEY.encode('utf-8'),
+        repr((auth_url, username, password)).encode('utf-8'),
+        sha256).hexdigest()
+    return 'swiftbrowser:auth:%s' % digest
+
+
+def split_username(username):
+    """ Splits a 'project:user' login into (project, user). """
+    if ':' in username:
+        project, user = username.split(':', 1)
+        return project, user
+    return None, username
+
+
+def select_endpoint(catalog, service_type='object-store', interface=None,
+                    region=None):
+    """ Returns the url of a service endpoint from a v3 catalog.
+
+    Raises ClientException if the catalog has no matching endpoint. """
+    interface = interface or getattr(settings, 'SWIFT_ENDPOINT_TYPE',
+                                     'public')
+    region = region or getattr(settings, 'SWIFT_REGION_NAME', None)
+    for service in catalog:
+        if service.get('type') != service_type:
+            continue
+        for endpoint in service.get('endpoints', []):
+            if endpoint.get('interface') != interface:
+                continue
+            if region and region not in (endpoint.get('region_id'),
+                                         endpoint.get('region')):
+                continue
+            return endpoint['url']
+    raise client.ClientException(
+        'No %s endpoint for %s in region %s' % (
+            interface, service_type, region or 'any'))
+
+
+def authenticate(auth_url, username, password):
+    """ Requests a project scoped token from Keystone v3.
+
+    Returns a dict with the token, its expiry as timestamp, the service
+    catalog and the storage url selected from it. """
+    project, user = split_username(username)
+    user_domain = getattr(settings, 'SWIFT_USER_DOMAIN_NAME', 'Default')
+    project_domain = getattr(settings, 'SWIFT_PROJECT_DOMAIN_NAME',
+                             'Default')
+    auth = {'identity': {
+        'methods': ['password'],
+        'password': {'user': {'name': user, 'password': password,
+                              'domain': {'name': user_domain}}}}}
+    if project:
+        auth['scope'] = {'project': {'name': project,
+                                     'domain': {'name': project_domain}}}
+
+    url = auth_url.rstrip('/')
+    if not url.endswith('/auth/tokens'):
+        url += '/auth/tokens'
+    with trace('keystone_auth'):
+        try:
+            resp = get_session().post(url, json={'auth': auth}, timeout=30)
+        except requests.RequestException as exc:
+            raise client.ClientException('Keystone request failed: %s' % exc)
+        if resp.status_code != 201:
+            raise client.ClientException(
+                'Authorization failure', http_status=resp.status_code,
+                http_reason=resp.reason)
+
+    token = resp.json()['token']
+    expires = parse_timestamp(token.get('expires_at'))
+    catalog = token.get('catalog', [])
+    return {
+        'token': resp.headers['X-Subject-Token'],
+        'expires': expires.timestamp() if expires else time.time() + 3600,
+        'catalog': catalog,
+        'storage_url': select_endpoint(catalog),
+    }
+
+
+def get_auth(auth_url, username, password):
+    """ Returns a (storage url, token, expires) tuple for the credentials.
+
+    Tokens and catalogs are shared between processes using the Django
+    cache, see CACHE_URL; Keystone is only asked again if the cached token
+    expires within TOKEN_REFRESH_MARGIN seconds. While one process refreshes
+    a token the others keep using the still valid cached token. """
+    key = credentials_key(auth_url, username, password)
+    margin = getattr(settings, 'TOKEN_REFRESH_MARGIN', 300)
+    now = time.time()
+    auth = cache.get(key)
+    if auth and auth['expires'] - now > margin:
+        return auth['storage_url'], auth['token'], auth['expires']
+    cached = auth if auth and auth['expires'] > now else None
+    if cached and not cache.add(key + ':refreshing', True, 60):
+        return cached['storage_url'], cached['token'], cached['expires']
+
+    try:
+        auth = authenticate(auth_url, username, password)
+    except client.ClientException:
+        # Keep using a valid token if Keystone is unavailable
+        if cached and cached['expires'] > time.time():
+            return cached['storage_url'], cached['token'], cached['expires']
+        raise
+    finally:
+        if cached:
+            cache.delete(key + ':refreshing')
+    timeout = int(auth['expires'] - time.time())
+    if timeout > 0:
+        cache.set(key, auth, timeout)
+    return auth['storage_url'], auth['token'], auth['expires']
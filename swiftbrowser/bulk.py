@@ -0,0 +1,345 @@
+""" Bulk operations on many objects at once. """
+# -*- coding: utf-8 -*-
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
+from swiftclient import client
+
+from django.conf import settings
+from django.core.cache import cache
+
+from swiftbrowser.connection import call, pool
+from swiftbrowser.metrics import trace
+from swiftbrowser.utils import iter_listing_pages
+
+
+class BulkResult(object):
+    """ Outcome of a bulk operation.
+
+    errors is a list of (object name, http status) tuples. """
+
+    def __init__(self):
+        self.succeeded = 0
+        self.not_found = 0
+        self.errors = []
+        self.started = time.time()
+        self.finished = None
+
+    @property
+    def processed(self):
+        return self.succeeded + self.not_found + len(self.errors)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rate(self):
+        """ Processed objects per second. """
+        elapsed = self.elapsed
+        if not elapsed:
+            return 0.0
+        return self.processed / elapsed
+
+
+def get_capabilities(storage_url):
+    """ Returns the capabilities a cluster advertises in /info.
+
+    Results are cached per cluster; an empty dict is returned if the
+    capabilities can't be read. """
+    scheme, netloc = pool.endpoint(storage_url)
+    cache_key = 'swiftbrowser:capabilities:%s://%s' % (scheme, netloc)
+    capabilities = cache.get(cache_key)
+    if capabilities is None:
+        info_url = '%s://%s/info' % (scheme, netloc)
+        try:
+            with trace('get_capabilities'), \
+                    pool.connection(info_url) as http_conn:
+                capabilities = {}
+                if http_conn:
+                    capabilities = client.get_capabilities(http_conn)
+        except client.ClientException:
+            capabilities = {}
+        # Retry soon if the capabilities could not be read
+        cache.set(cache_key, capabilities, 3600 if capabilities else 60)
+    return capabilities
+
+
+def temp_url_methods(capabilities):
+    """ Returns the methods temp urls can be signed for. """
+    return capabilities.get('tempurl', {}).get(
+        'methods', ['GET', 'HEAD', 'PUT', 'POST', 'DELETE'])
+
+
+def temp_url_prefix_supported(capabilities):
+    """ Returns True if the cluster accepts prefix based temp urls.
+
+    temp_url_prefix is not advertised separately, it is supported by the
+    tempurl middleware since Swift 2.12. """
+    if 'tempurl' not in capabilities:
+        return False
+    version = capabilities.get('swift', {}).get('version', '')
+    try:
+        major, minor = [int(part) for part in version.split('.')[:2]]
+    except ValueError:
+        return False
+    return (major, minor) >= (2, 12)
+
+
+def bulk_delete(storage_url, auth_token, paths):
+    """ Deletes a list of /container/object paths in a single request.
+
+    Requires the bulk middleware; returns its parsed JSON response. """
+    body = '\n'.join(quote(path) for path in paths).encode('utf-8')
+    headers = {'X-Auth-Token': auth_token,
+               'Accept': 'application/json',
+               'Content-Type': 'text/plain'}
+    with trace('bulk_delete'), pool.connection(storage_url) as http_conn:
+        if not http_conn:
+            raise client.ClientException(
+                'Invalid storage url "%s"' % storage_url)
+        parsed, conn = http_conn
+        conn.request('DELETE', parsed.path + '?bulk-delete', body, headers)
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status < 200 or resp.status >= 300:
+            raise client.ClientException.from_response(
+                resp, 'Bulk delete failed', body)
+    return json.loads(body.decode('utf-8'))
+
+
+ARCHIVE_FORMATS = (
+    ('.tar', 'tar'),
+    ('.tar.gz', 'tar.gz'),
+    ('.tgz', 'tar.gz'),
+    ('.tar.bz2', 'tar.bz2'),
+    ('.tbz2', 'tar.bz2'),
+)
+
+
+def archive_format(filename):
+    """ Returns the extract-archive format for filename or None. """
+    for suffix, fmt in ARCHIVE_FORMATS:
+        if filename.lower().endswith(suffix):
+            return fmt
+    return None
+
+
+def extract_archive(storage_url, auth_token, container, prefix, archive,
+                    fmt, size):
+    """ Uploads a tar archive and lets Swift create one object per file.
+
+    archive is a file-like object of size bytes; it is streamed to the bulk
+    middleware, which creates its files below container/prefix. Returns the
+    parsed JSON summary with the number of files created and errors. """
+    path = '/' + container
+    if prefix:
+        path += '/' + prefix.rstrip('/')
+    headers = {'X-Auth-Token': auth_token,
+               'Accept': 'application/json',
+               'Content-Length': str(size)}
+    with trace('extract_archive'), pool.connection(storage_url) as http_conn:
+        if not http_conn:
+            raise client.ClientException(
+                'Invalid storage url "%s"' % storage_url)
+        parsed, conn = http_conn
+        conn.request('PUT', '%s%s?extract-archive=%s' % (
+            parsed.path, quote(path), fmt), archive, headers)
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status < 200 or resp.status >= 300:
+            raise client.ClientException.from_response(
+                resp, 'Archive extraction failed', body)
+    # The middleware may send whitespace to keep the connection alive
+    return json.loads(body.decode('utf-8'))
+
+
+def _delete_object(storage_url, auth_token, container, name):
+    """ Deletes a single object, returns the http status on failure. """
+    try:
+        call(client.delete_object, storage_url, auth_token, container, name)
+    except client.ClientException as exc:
+        return exc.http_status or 0
+    return None
+
+
+def delete_objects(storage_url, auth_token, container, prefix=None,
+                   progress=None):
+    """ Deletes all objects in a container, or all objects below prefix.
+
+    The listing is walked page by page. If the cluster supports bulk
+    deletes, objects are deleted in batches of up to max_deletes_per_request;
+    otherwise up to BULK_CONCURRENCY single DELETEs run concurrently.
+    progress is called with the BulkResult after every batch. Returns the
+    BulkResult. """
+    result = BulkResult()
+    bulk = get_capabilities(storage_url).get('bulk_delete')
+    concurrency = getattr(settings, 'BULK_CONCURRENCY', 10)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for page in iter_listing_pages(storage_url, auth_token, container,
+                                       prefix=prefix):
+            names = [obj['name'] for obj in page]
+            if bulk:
+                batch_size = bulk.get('max_deletes_per_request', 10000)
+                for start in range(0, len(names), batch_size):
+                    batch = names[start:start + batch_size]
+                    _bulk_delete_batch(storage_url, auth_token, container,
+                                       batch, result)
+                    if progress:
+                        progress(result)
+            else:
+                statuses = executor.map(
+                    lambda name: _delete_object(
+                        storage_url, auth_token, container, name),
+                    names)
+                for name, status in zip(names, statuses):
+                    if status is None:
+                        result.succeeded += 1
+                    elif status == 404:
+                        result.not_found += 1
+                    else:
+                        result.errors.append((name, status))
+                if progress:
+                    progress(result)
+
+    result.finished = time.time()
+    return result
+
+
+def _bulk_delete_batch(storage_url, auth_token, container, names, result):
+    """ Deletes a batch of objects and updates result. """
+    paths = ['/%s/%s' % (container, name) for name in names]
+    try:
+        response = bulk_delete(storage_url, auth_token, paths)
+    except client.ClientException as exc:
+        result.errors.extend((name, exc.http_status) for name in names)
+        return
+
+    deleted = response.get('Number Deleted', 0)
+    not_found = response.get('Number Not Found', 0)
+    result.succeeded += deleted
+    result.not_found += not_found
+    prefix_len = len(container) + 2
+    failed = set()
+    for path, status in response.get('Errors', []):
+        # Errors are reported as ['/container/object', '409 Conflict']
+        name = unquote(path)[prefix_len:]
+        failed.add(name)
+        result.errors.append((name, int(status.split()[0])))
+
+    # The middleware always answers 200, a failed batch (eg. 401 or 503) is
+    # only reported in the body, without errors for unprocessed objects
+    status = int(response.get('Response Status', '200').split()[0])
+    unprocessed = len(names) - deleted - not_found - len(failed)
+    if not 200 <= status < 300 and unprocessed > 0:
+        remaining = [name for name in names if name not in failed]
+        # Objects are processed in order, thus the last ones are left
+        result.errors.extend(
+            (name, status) for name in remaining[-unprocessed:])
+
+
+def _copy_object(storage_url, auth_token, container, name, dest_container,
+                 dest_name):
+    """ Copies an object server-side, returns the http status on failure.
+
+    Manifests of large objects are copied as manifests, not as the
+    concatenated segments. """
+    headers = {'X-Copy-From': quote('/%s/%s' % (container, name))}
+    try:
+        call(client.put_object, storage_url, auth_token, dest_container,
+             dest_name, contents=b'', headers=headers,
+             query_string='multipart-manifest=get')
+    except client.ClientException as exc:
+        return exc.http_status or 0
+    return None
+
+
+def _iter_sources(storage_url, auth_token, container, names):
+    """ Yields pages of object names; names ending in / are pseudofolders
+    whose objects are listed. """
+    objects = [name for name in names if not name.endswith('/')]
+    if objects:
+        yield objects
+    for prefix in names:
+        if prefix.endswith('/'):
+            for page in iter_listing_pages(storage_url, auth_token,
+                                           container, prefix=prefix):
+                yield [obj['name'] for obj in page]
+
+
+def copy_target(name, source_base, dest_base):
+    """ Returns the name of the copy of name. """
+    return dest_base + name[len(source_base):]
+
+
+def copy_objects(storage_url, auth_token, container, names, source_base,
+                 dest_container, dest_base, move=False, progress=None):
+    """ Copies or moves objects and pseudofolders using server-side copies.
+
+    Every object name in names (or below a pseudofolder in names, ending in
+    /) starting with source_base is copied to dest_container, replacing
+    source_base by dest_base. Up to BULK_CONCURRENCY copies run
+    concurrently. Moved objects are deleted once copied, using bulk deletes
+    if available. progress is called with the BulkResult after every page.
+    Raises ValueError if a pseudofolder would be copied into itself. """
+    for name in names:
+        if name.endswith('/') and dest_container == container and \
+                copy_target(name, source_base, dest_base).startswith(name):
+            raise ValueError('Can not copy %s into itself' % name)
+
+    result = BulkResult()
+    bulk = get_capabilities(storage_url).get('bulk_delete') if move \
+        else None
+    concurrency = getattr(settings, 'BULK_CONCURRENCY', 10)
+
+    def copy(name):
+        target = copy_target(name, source_base, dest_base)
+        if (dest_container, target) == (container, name):
+            # Copying an object onto itself, never delete it
+            return False
+        return _copy_object(storage_url, auth_token, container, name,
+                            dest_container, target)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for page in _iter_sources(storage_url, auth_token, container,
+                                  names):
+            copied = []
+            for name, status in zip(page, executor.map(copy, page)):
+                if status is None:
+                    copied.append(name)
+                elif status is False:
+                    result.succeeded += 1
+                elif status == 404:
+                    result.not_found += 1
+                else:
+                    result.errors.append((name, status))
+
+            if move and copied:
+                deleted = BulkResult()
+                if bulk:
+                    batch_size = bulk.get('max_deletes_per_request', 10000)
+                    for start in range(0, len(copied), batch_size):
+                        _bulk_delete_batch(
+                            storage_url, auth_token, container,
+                            copied[start:start + batch_size], deleted)
+                else:
+                    statuses = executor.map(
+                        lambda name: _delete_object(
+                            storage_url, auth_token, container, name),
+                        copied)
+                    deleted.errors = [
+                        (name, status) for name, status in
+                        zip(copied, statuses)
+                        if status is not None and status != 404]
+                result.errors.extend(deleted.errors)
+                result.succeeded += len(copied) - len(deleted.errors)
+            else:
+                result.succeeded += len(copied)
+            if progress:
+                progress(result)
+
+    result.finished = time.time()
+    return result
@@ -0,0 +1,137 @@
+""" Pooled, persistent connections to the Swift proxy. """
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from swiftclient import client
+
+from django.conf import settings
+
+from swiftbrowser.metrics import trace
+
+
+class ConnectionPool(object):
+    """ Keeps idle swiftclient connections per storage endpoint.
+
+    Each connection wraps a requests session, thus keeping the underlying
+    TCP/TLS connection alive between requests. A connection is handed out
+    to only one caller at a time; at most `maxsize` idle connections are
+    kept per endpoint and idle ones older than `idle_timeout` seconds are
+    dropped. """
+
+    def __init__(self, maxsize=10, idle_timeout=60):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    @staticmethod
+    def endpoint(url):
+        """ Returns the (scheme, netloc) pair connections are shared by. """
+        parsed = urlparse(url)
+        return (parsed.scheme, parsed.netloc)
+
+    def acquire(self, url):
+        """ Returns a (parsed url, connection) tuple for the given url. """
+        endpoint = self.endpoint(url)
+        now = time.time()
+        stale = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(endpoint)
+            while idle:
+                last_used, candidate = idle.pop()
+                if now - last_used < self.idle_timeout:
+                    conn = candidate
+                    break
+                stale.append(candidate)
+            self.discarded += len(stale)
+            if conn:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        for old in stale:
+            old.close()
+
+        if conn is None:
+            conn = client.HTTPConnection(url)
+        # Connections are shared by endpoint, paths may differ per account
+        conn.url = url
+        conn.parsed_url = urlparse(url)
+        return (conn.parsed_url, conn)
+
+    def release(self, http_conn, reusable=True):
+        """ Returns a connection to the pool or closes it. """
+        parsed, conn = http_conn
+        endpoint = (parsed.scheme, parsed.netloc)
+        with self._lock:
+            idle = self._idle.setdefault(endpoint, deque())
+            if reusable and len(idle) < self.maxsize:
+                idle.append((time.time(), conn))
+                return
+            self.discarded += 1
+        conn.close()
+
+    def clear(self):
+        """ Closes all idle connections. """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _last_used, conn in connections:
+                conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'discarded': self.discarded,
+                'idle': sum(len(c) for c in self._idle.values()),
+            }
+
+    @contextmanager
+    def connection(self, url):
+        """ Context manager yielding a pooled connection for url.
+
+        Yields None if url can't be used to connect; swiftclient will then
+        raise the appropriate ClientException itself. """
+        if urlparse(url).scheme not in ('http', 'https'):
+            yield None
+            return
+
+        http_conn = self.acquire(url)
+        reusable = False
+        try:
+            yield http_conn
+            reusable = True
+        except client.ClientException as exc:
+            # Swift answered and the response has been read completely
+            reusable = exc.http_status is not None
+            raise
+        finally:
+            self.release(http_conn, reusable)
+
+
+pool = ConnectionPool(
+    maxsize=getattr(settings, 'SWIFT_POOL_SIZE', 10),
+    idle_timeout=getattr(settings, 'SWIFT_POOL_IDLE_TIMEOUT', 60))
+
+
+def call(func, url, *args, **kwargs):
+    """ Calls a swiftclient.client function using a pooled connection.
+
+    Example: call(client.head_container, storage_url, auth_token, name)
+
+    Every call is traced using the name of func as operation. """
+    operation = getattr(func, '__name__', 'swift')
+    with trace(operation), pool.connection(url) as http_conn:
+        if http_conn:
+            kwargs['http_conn'] = http_conn
+        return func(url, *args, **kwargs)
@@ -15,6 +15,21 @@ class AddACLForm(forms.Form):
     write = forms.BooleanField(required=False)
 
 
+class BatchACLForm(forms.Form):
+    """ Grants or revokes ACL entries on several containers """
+    containers = forms.MultipleChoiceField()
+    username = forms.CharField(max_length=1000)
+    read = forms.BooleanField(required=False)
+    write = forms.BooleanField(required=False)
+    action = forms.ChoiceField(choices=(('grant', 'grant'),
+                                        ('revoke', 'revoke')))
+
+    def __init__(self, *args, **kwargs):
+        containers = kwargs.pop('containers', ())
+        super(BatchACLForm, self).__init__(*args, **kwargs)
+        self.fields['containers'].choices = [(c, c) for c in containers]
+
+
 class PseudoFolderForm(forms.Form):
     """ Upload form """
     foldername = forms.CharField(max_length=100)
@@ -24,3 +39,51 @@ class LoginForm(forms.Form):
     """ Login form """
     username = forms.CharField(max_length=100)
     password = forms.CharField(widget=forms.PasswordInput)
+
+
+class SegmentedUploadForm(forms.Form):
+    """ Starts a segmented upload """
+    name = forms.CharField(max_length=1024)
+    size = forms.IntegerField(min_value=1)
+
+
+class ManifestForm(SegmentedUploadForm):
+    """ Finishes a segmented upload """
+    segment_size = forms.IntegerField(min_value=1)
+    timestamp = forms.RegexField(regex=r'^[0-9]+\.[0-9]+$', max_length=32)
+    content_type = forms.CharField(max_length=256, required=False)
+
+
+class CopyForm(forms.Form):
+    """ Copies or moves objects and pseudofolders """
+    action = forms.ChoiceField(choices=(('copy', 'copy'), ('move', 'move')))
+    container = forms.CharField(max_length=256)
+    folder = forms.CharField(max_length=1024, required=False)
+
+
+class RenameForm(forms.Form):
+    """ Renames an object or pseudofolder """
+    name = forms.CharField(max_length=1024)
+
+
+class TempURLsForm(forms.Form):
+    """ Signs temporary URLs for all objects below a prefix """
+    expires = forms.IntegerField(min_value=1, initial=7 * 24 * 3600)
+    method = forms.ChoiceField(initial='GET')
+    format = forms.ChoiceField(choices=(('csv', 'CSV'), ('json', 'JSON')))
+    scope = forms.ChoiceField(choices=(('objects', 'objects'),
+                                       ('prefix', 'prefix')),
+                              required=False)
+
+    def __init__(self, *args, **kwargs):
+        methods = kwargs.pop('methods', ('GET', ))
+        prefix_scope = kwargs.pop('prefix_scope', False)
+        super(TempURLsForm, self).__init__(*args, **kwargs)
+        self.fields['method'].choices = [(m, m) for m in methods]
+        if not prefix_scope:
+            self.fields['scope'].choices = [('objects', 'objects')]
+
+
+class ArchiveUploadForm(forms.Form):
+    """ Upload of a tar archive to extract """
+    archive = forms.FileField()
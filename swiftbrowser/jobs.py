@@ -0,0 +1,103 @@
+""" Background jobs for long-running operations. """
+# -*- coding: utf-8 -*-
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """ Returns the process-wide worker pool, created on first use. """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'JOB_WORKERS', 4))
+        return _executor
+
+
+class Job(object):
+    """ State of a background job.
+
+    Jobs are stored in the Django cache, thus progress can be polled from
+    every worker process sharing the cache. """
+
+    def __init__(self, owner, description, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.owner = owner
+        self.description = description
+        self.status = 'queued'
+        self.processed = 0
+        self.failed = 0
+        self.message = ''
+        self.updated = 0
+
+    @staticmethod
+    def cache_key(job_id):
+        return 'swiftbrowser:job:%s' % job_id
+
+    @classmethod
+    def get(cls, job_id):
+        """ Returns the job with the given id or None. """
+        data = cache.get(cls.cache_key(job_id))
+        if data is None:
+            return None
+        job = cls(data['owner'], data['description'], job_id=job_id)
+        for key in ('status', 'processed', 'failed', 'message'):
+            setattr(job, key, data[key])
+        return job
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'owner': self.owner,
+            'description': self.description,
+            'status': self.status,
+            'processed': self.processed,
+            'failed': self.failed,
+            'message': self.message,
+        }
+
+    def save(self):
+        self.updated = time.time()
+        cache.set(self.cache_key(self.id), self.as_dict(),
+                  getattr(settings, 'JOB_TIMEOUT', 24 * 3600))
+
+    def progress(self, processed, failed=0):
+        """ Records progress; saved at most once per second. """
+        self.processed = processed
+        self.failed = failed
+        if time.time() - self.updated >= 1:
+            self.save()
+
+    def run(self, func, *args, **kwargs):
+        """ Runs func(job, *args, **kwargs), its result is the message. """
+        self.status = 'running'
+        self.save()
+        try:
+            self.message = func(self, *args, **kwargs) or ''
+            self.status = 'done'
+        except Exception as exc:
+            self.message = str(exc)
+            self.status = 'failed'
+        self.save()
+
+
+def submit(owner, description, func, *args, **kwargs):
+    """ Runs func(job, *args, **kwargs) in the background.
+
+    With JOB_WORKERS set to 0 the job is run immediately instead. Returns
+    the Job. """
+    job = Job(owner, description)
+    job.save()
+    if getattr(settings, 'JOB_WORKERS', 4):
+        get_executor().submit(job.run, func, *args, **kwargs)
+    else:
+        job.run(func, *args, **kwargs)
+    return job
@@ -0,0 +1,242 @@
+""" Tracing of Swift requests and Prometheus metrics. """
+# -*- coding: utf-8 -*-
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from swiftclient import client
+
+from django.conf import settings
+from django.utils.cache import cc_delim_re
+
+try:
+    from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+except ImportError:  # asgiref < 3.6, used by Django < 4.2
+    iscoroutinefunction = asyncio.iscoroutinefunction
+
+    def markcoroutinefunction(func):
+        func._is_coroutine = asyncio.coroutines._is_coroutine
+        return func
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                    10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+# Swift requests of the current request as (operation, seconds, status)
+_swift_calls = contextvars.ContextVar('swiftbrowser_swift_calls',
+                                      default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace(
+        '"', r'\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _escape(value)) for name, value in labels)
+
+
+class Histogram(object):
+    """ A Prometheus histogram with labels, safe to use from threads. """
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Counts per bucket, sum and count
+                series = self._series[labelvalues] = [
+                    [0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def collect(self):
+        """ Returns the lines of the Prometheus text format. """
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s histogram' % self.name]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for
+                      labels, (counts, total, count) in self._series.items()]
+        for labelvalues, counts, total, count in series:
+            labels = list(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket%s %d' % (
+                    self.name, _format_labels(
+                        labels + [('le', _format_value(bound))]), cumulative))
+            lines.append('%s_bucket%s %d' % (
+                self.name, _format_labels(labels + [('le', '+Inf')]), count))
+            lines.append('%s_sum%s %s' % (
+                self.name, _format_labels(labels), _format_value(total)))
+            lines.append('%s_count%s %d' % (
+                self.name, _format_labels(labels), count))
+        return lines
+
+
+VIEW_DURATION = Histogram(
+    'swiftbrowser_view_duration_seconds',
+    'Time spent handling requests per view and response status.',
+    ('view', 'status'), DURATION_BUCKETS)
+VIEW_SWIFT_REQUESTS = Histogram(
+    'swiftbrowser_view_swift_requests',
+    'Swift requests sent while handling a request per view.',
+    ('view', ), COUNT_BUCKETS)
+SWIFT_DURATION = Histogram(
+    'swiftbrowser_swift_request_duration_seconds',
+    'Duration of Swift requests per operation and response status.',
+    ('operation', 'status'), DURATION_BUCKETS)
+
+HISTOGRAMS = (VIEW_DURATION, VIEW_SWIFT_REQUESTS, SWIFT_DURATION)
+
+
+def record(operation, duration, status):
+    """ Records a Swift request in its histogram and the current request.
+    """
+    SWIFT_DURATION.observe(duration, operation, status)
+    calls = _swift_calls.get()
+    if calls is not None:
+        calls.append((operation, duration, status))
+
+
+@contextmanager
+def trace(operation):
+    """ Context manager timing a Swift request.
+
+    The status is "ok" on success, the HTTP status of a ClientException or
+    "error" if Swift did not answer. """
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except client.ClientException as exc:
+        status = str(exc.http_status or 'error')
+        raise
+    except Exception:
+        status = 'error'
+        raise
+    finally:
+        record(operation, time.perf_counter() - start, status)
+
+
+def server_timing(calls, duration):
+    """ Returns a Server-Timing header value for the given Swift requests.
+
+    Contains the total Swift time and time per operation, the remaining
+    time spent in Django and the total duration in milliseconds. """
+    operations = OrderedDict()
+    for operation, seconds, status in calls:
+        entry = operations.setdefault(operation, [0, 0.0, set()])
+        entry[0] += 1
+        entry[1] += seconds
+        if status != 'ok':
+            entry[2].add(status)
+    swift = sum(seconds for _operation, seconds, _status in calls)
+    metrics = ['swift;dur=%.1f;desc="%d requests"' % (
+        swift * 1000, len(calls))]
+    for operation, (count, seconds, failed) in operations.items():
+        desc = '%dx' % count
+        if failed:
+            desc += ' %s' % ' '.join(sorted(failed))
+        metrics.append('swift.%s;dur=%.1f;desc="%s"' % (
+            operation, seconds * 1000, desc))
+    # Swift requests of concurrent threads may exceed the duration
+    metrics.append('app;dur=%.1f' % (max(duration - swift, 0) * 1000))
+    metrics.append('total;dur=%.1f' % (duration * 1000))
+    return ', '.join(metrics)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.url_name or match.view_name
+
+
+class MetricsMiddleware(object):
+    """ Traces the Swift requests sent while handling a request.
+
+    Records the duration per view and the number of Swift requests, and
+    adds a Server-Timing header unless SERVER_TIMING is disabled or the
+    response is public, thus stored by shared caches. Supports sync and
+    async requests, thus async views aren't run in a thread. """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        calls = []
+        token = _swift_calls.set(calls)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _swift_calls.reset(token)
+        return self.process_response(request, response, calls, start)
+
+    async def __acall__(self, request):
+        calls = []
+        token = _swift_calls.set(calls)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _swift_calls.reset(token)
+        return self.process_response(request, response, calls, start)
+
+    def process_response(self, request, response, calls, start):
+        duration = time.perf_counter() - start
+        view = view_name(request)
+        VIEW_DURATION.observe(duration, view, str(response.status_code))
+        VIEW_SWIFT_REQUESTS.observe(len(calls), view)
+        public = 'public' in cc_delim_re.split(
+            response.get('Cache-Control', ''))
+        if getattr(settings, 'SERVER_TIMING', True) and not public:
+            response['Server-Timing'] = server_timing(calls, duration)
+        return response
+
+
+def export(extra=()):
+    """ Returns all metrics in the Prometheus text format.
+
+    extra are additional (name, type, documentation, value) tuples. """
+    lines = []
+    for name, metric_type, documentation, value in extra:
+        lines.extend(['# HELP %s %s' % (name, documentation),
+                      '# TYPE %s %s' % (name, metric_type),
+                      '%s %s' % (name, _format_value(value))])
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.collect())
+    return '\n'.join(lines) + '\n'
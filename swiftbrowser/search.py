@@ -0,0 +1,234 @@
+""" Local index of object names for substring searches in containers. """
+# -*- coding: utf-8 -*-
+import re
+import sqlite3
+import threading
+import time
+from hashlib import sha1
+
+from django.conf import settings
+
+from swiftbrowser.utils import iter_listing_pages
+
+# Runs of literal characters in a glob pattern
+GLOB_LITERALS_RE = re.compile(r'[^*?\[\]]+')
+
+
+class NameIndex(object):
+    """ SQLite database of the object names in containers.
+
+    Names are stored in a FTS5 table using the trigram tokenizer if SQLite
+    supports it, thus substring searches don't scan all names; a plain
+    table is used otherwise. Every container index is built once from the
+    complete listing and then extended with the names listed after the last
+    indexed name. Deleted objects or objects created with a name sorting
+    before the marker are only noticed by comparing the number of indexed
+    names with the object count, or by rebuilding the index once it is older
+    than SEARCH_INDEX_MAX_AGE. """
+
+    def __init__(self, path):
+        self.path = path
+        self.fts = None
+        self._local = threading.local()
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def connect(self):
+        """ Returns the connection of the current thread. """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._create_tables(conn)
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self, conn):
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS indexes ('
+                'id INTEGER PRIMARY KEY, storage_url TEXT, container TEXT, '
+                'marker TEXT, count INTEGER, built REAL, refreshed REAL, '
+                'active INTEGER)')
+            try:
+                conn.execute(
+                    'CREATE VIRTUAL TABLE IF NOT EXISTS names USING '
+                    'fts5(name, index_id UNINDEXED, tokenize="trigram")')
+            except sqlite3.OperationalError:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS names ('
+                    'name TEXT, index_id INTEGER)')
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS names_index_id '
+                    'ON names (index_id)')
+            sql = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'names'"
+            ).fetchone()[0]
+            self.fts = 'fts5' in sql.lower()
+
+    def lock(self, storage_url, container):
+        """ Returns the lock serializing updates of one container index. """
+        with self._locks_lock:
+            return self._locks.setdefault(
+                (storage_url, container), threading.Lock())
+
+    def status(self, storage_url, container):
+        """ Returns the active index of a container as dict or None. """
+        row = self.connect().execute(
+            'SELECT id, marker, count, built, refreshed FROM indexes '
+            'WHERE storage_url = ? AND container = ? AND active = 1',
+            (storage_url, container)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'marker', 'count', 'built', 'refreshed'), row))
+
+    def is_stale(self, status, object_count=None):
+        """ Returns True if an index needs to be rebuilt. """
+        max_age = getattr(settings, 'SEARCH_INDEX_MAX_AGE', 24 * 3600)
+        age = time.time() - status['built'] if status else None
+        if status is None or age > max_age:
+            return True
+        # Don't rebuild continuously while objects are being uploaded
+        interval = getattr(settings, 'SEARCH_INDEX_REFRESH', 60)
+        changed = object_count is not None and status['count'] != object_count
+        return changed and age > interval
+
+    def needs_refresh(self, status):
+        """ Returns True if new names should be fetched. """
+        interval = getattr(settings, 'SEARCH_INDEX_REFRESH', 60)
+        return time.time() - status['refreshed'] > interval
+
+    def _add_names(self, conn, index_id, objects):
+        names = [obj['name'] for obj in objects]
+        with conn:
+            conn.executemany(
+                'INSERT INTO names (name, index_id) VALUES (?, ?)',
+                [(name, index_id) for name in names])
+            conn.execute(
+                'UPDATE indexes SET marker = ?, count = count + ?, '
+                'refreshed = ? WHERE id = ?',
+                (names[-1], len(names), time.time(), index_id))
+
+    def build(self, storage_url, auth_token, container, progress=None):
+        """ Indexes all names of a container, replacing a previous index.
+
+        The previous index is used for searches until the new one is
+        complete. progress is called with the number of indexed names. """
+        conn = self.connect()
+        now = time.time()
+        with conn:
+            index_id = conn.execute(
+                'INSERT INTO indexes (storage_url, container, marker, count, '
+                'built, refreshed, active) VALUES (?, ?, NULL, 0, ?, ?, 0)',
+                (storage_url, container, now, now)).lastrowid
+        count = 0
+        try:
+            for page in iter_listing_pages(storage_url, auth_token,
+                                           container):
+                self._add_names(conn, index_id, page)
+                count += len(page)
+                if progress:
+                    progress(count)
+        except Exception:
+            self._drop(conn, [index_id])
+            raise
+
+        with conn:
+            old = [row[0] for row in conn.execute(
+                'SELECT id FROM indexes WHERE storage_url = ? AND '
+                'container = ? AND id != ?',
+                (storage_url, container, index_id))]
+            conn.execute('UPDATE indexes SET active = 1 WHERE id = ?',
+                         (index_id, ))
+            conn.execute(
+                'UPDATE indexes SET active = 0 WHERE storage_url = ? AND '
+                'container = ? AND id != ?',
+                (storage_url, container, index_id))
+        self._drop(conn, old)
+        return count
+
+    def _drop(self, conn, index_ids):
+        with conn:
+            for index_id in index_ids:
+                conn.execute('DELETE FROM names WHERE index_id = ?',
+                             (index_id, ))
+                conn.execute('DELETE FROM indexes WHERE id = ?', (index_id, ))
+
+    def refresh(self, storage_url, auth_token, container, status):
+        """ Adds the names listed after the last indexed name. """
+        conn = self.connect()
+        added = 0
+        for page in iter_listing_pages(storage_url, auth_token, container,
+                                       marker=status['marker']):
+            self._add_names(conn, status['id'], page)
+            added += len(page)
+        if not added:
+            with conn:
+                conn.execute('UPDATE indexes SET refreshed = ? WHERE id = ?',
+                             (time.time(), status['id']))
+        return added
+
+    def search(self, index_id, query, limit=1000):
+        """ Returns names containing query, or matching a glob pattern.
+
+        Patterns containing *, ? or [ are matched against the whole name
+        (case-sensitive), other queries match anywhere in the name ignoring
+        case. """
+        conn = self.connect()
+        sql = 'SELECT name FROM names WHERE index_id = ?'
+        args = [index_id]
+        if any(c in query for c in '*?['):
+            sql += ' AND name GLOB ?'
+            args.append(query)
+            literals = GLOB_LITERALS_RE.findall(query)
+            term = max(literals, key=len) if literals else ''
+        else:
+            sql += ' AND instr(lower(name), lower(?)) > 0'
+            args.append(query)
+            term = query
+        if self.fts and len(term) >= 3:
+            # Narrows the candidates down using the trigram index
+            sql += ' AND names MATCH ?'
+            args.append('"%s"' % term.replace('"', '""'))
+        sql += ' ORDER BY name LIMIT ?'
+        args.append(limit)
+        return [row[0] for row in conn.execute(sql, args)]
+
+
+def building_key(storage_url, container):
+    """ Cache key marking an index build in progress. """
+    return 'swiftbrowser:indexing:%s' % sha1(
+        ('%s/%s' % (storage_url, container)).encode('utf-8')).hexdigest()
+
+
+def update_index(storage_url, auth_token, container, object_count):
+    """ Adds new names to the index of a container if it is due.
+
+    Returns a tuple (index status or None, True if a rebuild is needed).
+    Building an index may take long and is left to the caller. """
+    index = get_index()
+    status = index.status(storage_url, container)
+    if status is None:
+        return None, True
+    if index.needs_refresh(status):
+        lock = index.lock(storage_url, container)
+        if lock.acquire(False):
+            try:
+                index.refresh(storage_url, auth_token, container, status)
+            finally:
+                lock.release()
+            status = index.status(storage_url, container)
+    return status, index.is_stale(status, object_count)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index():
+    """ Returns the NameIndex stored at SEARCH_INDEX_PATH. """
+    path = settings.SEARCH_INDEX_PATH
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = NameIndex(path)
+        return _indexes[path]
@@ -1,5 +1,6 @@
 """ Settings for Django project """
 import os
+import tempfile
 
 DEBUG = os.environ.get("DEBUG", False)
 
@@ -17,6 +18,7 @@ PROJECT_PATH = os.path.realpath(os.path.dirname(__file__))
 TEMPLATE_DIRS = (os.path.join(PROJECT_PATH, 'templates'),)
 
 MIDDLEWARE = (
+    'swiftbrowser.metrics.MetricsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -24,7 +26,7 @@ MIDDLEWARE = (
     'django.middleware.csrf.CsrfViewMiddleware',
 )
 
-ROOT_URLCONF = 'swiftbrowser.urls'
+ROOT_URLCONF = os.environ.get('ROOT_URLCONF', 'swiftbrowser.urls')
 
 INSTALLED_APPS = (
     'django.contrib.auth',
@@ -57,12 +59,129 @@ TEMPLATES = [
     },
 ]
 
+# Cache shared by all processes, eg. memcached://127.0.0.1:11211 (requires
+# pymemcache) or redis://127.0.0.1:6379 (requires Django 4.0 and redis).
+# Otherwise each process has its own cache, thus Keystone tokens, listing
+# invalidations, job progress and thumbnail locks are not shared.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL.startswith('memcached://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': CACHE_URL[len('memcached://'):].split(',')}}
+elif CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL}}
+
 SWIFT_AUTH_URL = os.environ.get(
     'SWIFT_AUTH_URL', 'http://127.0.0.1:8080/auth/v1.0')
-SWIFT_AUTH_VERSION = os.environ.get('SWIFT_AUTH_VERSION', 1)  # 2 for keystone
+SWIFT_AUTH_VERSION = os.environ.get('SWIFT_AUTH_VERSION', 1)  # 2/3 keystone
+
+# Keystone v3: domains of users and projects, the endpoint interface and
+# region used from the catalog and the seconds before a token expires it is
+# renewed on login. Tokens are shared between processes using CACHE_URL.
+SWIFT_USER_DOMAIN_NAME = os.environ.get('SWIFT_USER_DOMAIN_NAME', 'Default')
+SWIFT_PROJECT_DOMAIN_NAME = os.environ.get(
+    'SWIFT_PROJECT_DOMAIN_NAME', 'Default')
+SWIFT_ENDPOINT_TYPE = os.environ.get('SWIFT_ENDPOINT_TYPE', 'public')
+SWIFT_REGION_NAME = os.environ.get('SWIFT_REGION_NAME')
+TOKEN_REFRESH_MARGIN = int(os.environ.get('TOKEN_REFRESH_MARGIN', 300))
 STORAGE_URL = os.environ.get('STORAGE_URL', 'http://127.0.0.1:8080/v1/')
 BASE_URL = os.environ.get('BASE_URL', 'http://127.0.0.1:8000')
 
+# Persistent connections kept per Swift endpoint and their idle lifetime
+SWIFT_POOL_SIZE = int(os.environ.get('SWIFT_POOL_SIZE', 10))
+SWIFT_POOL_IDLE_TIMEOUT = int(os.environ.get('SWIFT_POOL_IDLE_TIMEOUT', 60))
+
+# Number of entries shown per page in object listings
+LISTING_PAGE_SIZE = int(os.environ.get('LISTING_PAGE_SIZE', 1000))
+
+# Seconds account and container listings are cached, 0 disables caching
+LISTING_CACHE_TIMEOUT = int(os.environ.get('LISTING_CACHE_TIMEOUT', 30))
+
+# Seconds public listings may be cached by browsers, proxies and CDNs, and
+# rendered public pages are kept; 0 disables the public page cache
+PUBLIC_CACHE_MAX_AGE = int(os.environ.get('PUBLIC_CACHE_MAX_AGE', 60))
+PUBLIC_PAGE_CACHE_TIMEOUT = int(
+    os.environ.get('PUBLIC_PAGE_CACHE_TIMEOUT', 3600))
+
+# Request the real size of large objects, their expiry and metadata using
+# concurrent HEAD requests for the objects shown, cached for some seconds
+ENRICH_LISTINGS = os.environ.get('ENRICH_LISTINGS', '').lower() in (
+    '1', 'true', 'yes')
+ENRICH_CONCURRENCY = int(os.environ.get('ENRICH_CONCURRENCY', 10))
+ENRICH_CACHE_TIMEOUT = int(os.environ.get('ENRICH_CACHE_TIMEOUT', 86400))
+
+# Seconds an account temp url key is cached before it is read again
+TEMP_KEY_CACHE_TIMEOUT = int(os.environ.get('TEMP_KEY_CACHE_TIMEOUT', 300))
+
+# Stream downloads through swiftbrowser instead of redirecting to temp urls
+# Under ASGI this requires Django 4.2, older versions read the objects in the
+# event loop; serve downloads using swiftbrowser.wsgi then
+DOWNLOAD_PROXY = os.environ.get('DOWNLOAD_PROXY', '').lower() in (
+    '1', 'true', 'yes')
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_CHUNK_SIZE', 65536))
+
+# Objects opened ahead and bytes read ahead of each while streaming archives
+ARCHIVE_CONCURRENCY = int(os.environ.get('ARCHIVE_CONCURRENCY', 4))
+ARCHIVE_PREFETCH_SIZE = int(
+    os.environ.get('ARCHIVE_PREFETCH_SIZE', 1024 * 1024))
+
+# Segment size and parallel segment uploads for large file uploads
+SEGMENT_SIZE = int(os.environ.get('SEGMENT_SIZE', 100 * 1024 * 1024))
+UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', 4))
+
+# Objects sorted in memory at once when sorting listings by size or date;
+# larger sorts are merged from sorted runs in temporary files
+SORT_BUFFER_SIZE = int(os.environ.get('SORT_BUFFER_SIZE', 100000))
+
+# SQLite database indexing object names for searches, the interval new names
+# are added and the age after which an index is rebuilt completely
+SEARCH_INDEX_PATH = os.environ.get(
+    'SEARCH_INDEX_PATH',
+    os.path.join(tempfile.gettempdir(), 'swiftbrowser-search.sqlite3'))
+SEARCH_INDEX_REFRESH = int(os.environ.get('SEARCH_INDEX_REFRESH', 60))
+SEARCH_INDEX_MAX_AGE = int(os.environ.get('SEARCH_INDEX_MAX_AGE', 86400))
+
+# Thumbnails of images (requires Pillow): maximum width and height in pixels
+# (0 disables thumbnails), local disk cache and its size in bytes, and the
+# hidden container thumbnails are shared in
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', 128))
+THUMBNAIL_CACHE_PATH = os.environ.get(
+    'THUMBNAIL_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'swiftbrowser-thumbnails'))
+THUMBNAIL_CACHE_SIZE = int(
+    os.environ.get('THUMBNAIL_CACHE_SIZE', 100 * 1024 * 1024))
+THUMBNAIL_CONTAINER = os.environ.get(
+    'THUMBNAIL_CONTAINER', 'swiftbrowser_thumbnails')
+
+# Bytes read to create a thumbnail and largest image read completely
+THUMBNAIL_READ_SIZE = int(os.environ.get('THUMBNAIL_READ_SIZE', 256 * 1024))
+THUMBNAIL_MAX_SOURCE_SIZE = int(
+    os.environ.get('THUMBNAIL_MAX_SOURCE_SIZE', 20 * 1024 * 1024))
+
+# Seconds space usage reports are cached and the minimum interval between
+# complete rescans of a container whose totals don't match its report
+USAGE_CACHE_TIMEOUT = int(os.environ.get('USAGE_CACHE_TIMEOUT', 604800))
+USAGE_REBUILD_INTERVAL = int(os.environ.get('USAGE_REBUILD_INTERVAL', 3600))
+
+# Concurrent requests used by bulk operations, eg. deleting containers
+BULK_CONCURRENCY = int(os.environ.get('BULK_CONCURRENCY', 10))
+
+# Worker threads per process running background jobs; 0 runs jobs inline
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+
+# Threads per process running Swift requests for the async (ASGI) views
+ASYNC_SWIFT_THREADS = int(os.environ.get('ASYNC_SWIFT_THREADS', 64))
+
+# Add Server-Timing headers with the time spent in Swift requests
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'true').lower() in (
+    '1', 'true', 'yes')
+
+# Client addresses allowed to read /metrics, * allows everyone
+METRICS_ALLOWED_IPS = os.environ.get(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
 TIME_ZONE = 'Europe/Berlin'
 LANGUAGE_CODE = 'de-de'
 SECRET_KEY = os.environ.get("SECRET_KEY")
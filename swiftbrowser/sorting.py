@@ -0,0 +1,120 @@
+""" Sorted views of complete container listings. """
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import json
+import tempfile
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import cache
+
+from swiftbrowser.utils import iter_listing_pages, get_listing_generations, \
+    tree_generation_key
+
+SORT_KEYS = {
+    'name': lambda obj: obj['name'],
+    'size': lambda obj: (obj.get('bytes', 0), obj['name']),
+    'last_modified': lambda obj: (obj.get('last_modified', ''), obj['name']),
+    'content_type': lambda obj: (obj.get('content_type') or '', obj['name']),
+}
+
+DIRECTORY_TYPES = ('application/directory', 'application/x-directory')
+
+
+def iter_objects(storage_url, auth_token, container, prefix=None):
+    """ Yields all objects below prefix, skipping pseudofolder markers. """
+    for page in iter_listing_pages(storage_url, auth_token, container,
+                                   prefix=prefix):
+        for obj in page:
+            if obj.get('content_type') not in DIRECTORY_TYPES:
+                yield obj
+
+
+def top_objects(objects, sort, reverse=False, count=100):
+    """ Returns the first count objects in sort order.
+
+    Only count objects are kept in memory at a time. """
+    if reverse:
+        return heapq.nlargest(count, objects, key=SORT_KEYS[sort])
+    return heapq.nsmallest(count, objects, key=SORT_KEYS[sort])
+
+
+def _write_run(objects, key, reverse):
+    """ Writes a sorted run to a temporary file and returns the file. """
+    objects.sort(key=key, reverse=reverse)
+    run = tempfile.TemporaryFile(mode='w+')
+    for obj in objects:
+        run.write(json.dumps(obj))
+        run.write('\n')
+    run.seek(0)
+    return run
+
+
+def sorted_objects(objects, sort, reverse=False, buffer_size=None):
+    """ Yields all objects in sort order using an external merge sort.
+
+    At most buffer_size objects are sorted in memory at once; larger
+    listings are written as sorted runs to temporary files, which are then
+    merged. """
+    buffer_size = buffer_size or getattr(settings, 'SORT_BUFFER_SIZE', 100000)
+    key = SORT_KEYS[sort]
+    runs = []
+    try:
+        while True:
+            chunk = list(itertools.islice(objects, buffer_size))
+            if len(chunk) < buffer_size and not runs:
+                # Fits into memory, no runs required
+                chunk.sort(key=key, reverse=reverse)
+                for obj in chunk:
+                    yield obj
+                return
+            if chunk:
+                runs.append(_write_run(chunk, key, reverse))
+            if len(chunk) < buffer_size:
+                break
+
+        streams = [(json.loads(line) for line in run) for run in runs]
+        for obj in heapq.merge(*streams, key=key, reverse=reverse):
+            yield obj
+    finally:
+        for run in runs:
+            run.close()
+
+
+def get_sorted_page(storage_url, auth_token, container, prefix=None,
+                    sort='name', reverse=False, offset=0, limit=None):
+    """ Returns a page of all objects below prefix in sort order.
+
+    Pages within the first SORT_BUFFER_SIZE objects are selected using a
+    bounded heap, later pages using an external merge sort. Returns a tuple
+    (objects, more) and caches results like listings. """
+    limit = limit or getattr(settings, 'LISTING_PAGE_SIZE', 1000)
+    timeout = getattr(settings, 'LISTING_CACHE_TIMEOUT', 30)
+    cache_key = None
+    if timeout:
+        generations = get_listing_generations(
+            [tree_generation_key(storage_url, container)])
+        token = auth_token
+        if isinstance(token, bytes):
+            token = token.decode('utf-8')
+        cache_key = 'swiftbrowser:sorted:%s' % sha1(repr((
+            storage_url, token, container, prefix, sort, reverse, offset,
+            limit, generations)).encode('utf-8')).hexdigest()
+        result = cache.get(cache_key)
+        if result is not None:
+            return result
+
+    objects = iter_objects(storage_url, auth_token, container, prefix)
+    # One more object tells if there is a next page
+    end = offset + limit + 1
+    if end <= getattr(settings, 'SORT_BUFFER_SIZE', 100000):
+        page = top_objects(objects, sort, reverse, end)[offset:]
+    else:
+        page = list(itertools.islice(
+            sorted_objects(objects, sort, reverse), offset, end))
+
+    result = (page[:limit], len(page) > limit)
+    if cache_key:
+        cache.set(cache_key, result, timeout)
+    return result
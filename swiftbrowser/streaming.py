@@ -0,0 +1,296 @@
+""" Streaming object contents through swiftbrowser. """
+# -*- coding: utf-8 -*-
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from swiftclient import client
+
+from django.conf import settings
+
+from swiftbrowser.connection import pool
+from swiftbrowser.metrics import trace
+from swiftbrowser.sorting import DIRECTORY_TYPES
+from swiftbrowser.utils import iter_listing_pages, parse_timestamp
+
+# Oldest date a zip archive can store, 1980-01-02
+ZIP_EPOCH = 315619200
+
+
+class ObjectStream(object):
+    """ Iterates over an object body in chunks.
+
+    The pooled connection is held until the body has been read or the
+    stream is closed; closing is done by Django once the response is sent
+    or the client disconnected. """
+
+    def __init__(self, body, http_conn):
+        self.body = body
+        self.http_conn = http_conn
+
+    def __iter__(self):
+        try:
+            for chunk in self.body:
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self.body is not None:
+            self.body.close()
+            self.body = None
+        if self.http_conn is not None:
+            pool.release(self.http_conn)
+            self.http_conn = None
+
+
+def open_object(storage_url, auth_token, container, name, headers=None,
+                chunk_size=None):
+    """ Starts reading an object without buffering its body.
+
+    Returns a tuple (status, response headers, ObjectStream). Raises
+    ClientException on failures, including 304, 412 and 416 responses to
+    conditional or range requests. """
+    chunk_size = chunk_size or getattr(settings, 'DOWNLOAD_CHUNK_SIZE', 65536)
+    http_conn = None
+    if urlparse(storage_url).scheme in ('http', 'https'):
+        http_conn = pool.acquire(storage_url)
+
+    response_dict = {}
+    try:
+        # Traces the time until the response headers are read
+        with trace('get_object'):
+            resp_headers, body = client.get_object(
+                storage_url, auth_token, container, name,
+                http_conn=http_conn, resp_chunk_size=chunk_size,
+                headers=headers, response_dict=response_dict)
+    except client.ClientException as exc:
+        if http_conn:
+            pool.release(http_conn, exc.http_status is not None)
+        raise
+    except Exception:
+        if http_conn:
+            pool.release(http_conn, False)
+        raise
+    return (response_dict.get('status', 200), resp_headers,
+            ObjectStream(body, http_conn))
+
+
+class Member(object):
+    """ An archive member whose body has been read ahead up to a limit.
+
+    Iterating yields the chunks read ahead followed by the rest of the
+    body. Directory markers have no body. """
+
+    def __init__(self, name, size, mtime, head=(), chunks=None,
+                 stream=None, directory=False):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.head = head
+        self.chunks = chunks
+        self.stream = stream
+        self.directory = directory
+
+    def __iter__(self):
+        try:
+            for chunk in self.head:
+                yield chunk
+            if self.chunks is not None:
+                for chunk in self.chunks:
+                    yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+def fetch_member(storage_url, auth_token, container, obj, name, prefetch):
+    """ Opens an object and reads up to prefetch bytes of its body.
+
+    Returns a Member, or None if the object has been deleted since it was
+    listed. """
+    modified = parse_timestamp(obj.get('last_modified'))
+    mtime = modified.timestamp() if modified else time.time()
+    if obj.get('content_type') in DIRECTORY_TYPES:
+        return Member(name.rstrip('/') + '/', 0, mtime, directory=True)
+
+    try:
+        _status, headers, stream = open_object(storage_url, auth_token,
+                                               container, obj['name'])
+    except client.ClientException as exc:
+        if exc.http_status == 404:
+            return None
+        raise
+    # Manifests are listed with their own size, the body has the real one
+    size = int(headers.get('content-length', obj.get('bytes', 0)))
+    chunks = iter(stream)
+    head = []
+    read = 0
+    try:
+        while read < prefetch:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            head.append(chunk)
+            read += len(chunk)
+    except Exception:
+        stream.close()
+        raise
+    return Member(name, size, mtime, head, chunks, stream)
+
+
+def _discard(future):
+    """ Closes the member of a fetch that is no longer needed. """
+    if not future.cancelled() and future.exception() is None and \
+            future.result() is not None:
+        future.result().close()
+
+
+class _Sink(object):
+    """ Unseekable file collecting what zipfile writes. """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ZipWriter(object):
+    """ Writes members to a zip archive without seeking.
+
+    Members are stored uncompressed with data descriptors; ZIP64 records
+    are used for large members and archives. """
+
+    def __init__(self):
+        self.sink = _Sink()
+        self.zip = zipfile.ZipFile(self.sink, 'w', zipfile.ZIP_STORED,
+                                   allowZip64=True)
+
+    def write(self, member):
+        info = zipfile.ZipInfo(member.name, date_time=time.localtime(
+            max(member.mtime, ZIP_EPOCH))[:6])
+        if member.directory:
+            info.external_attr = (0o40755 << 16) | 0x10
+            self.zip.writestr(info, b'')
+            yield self.sink.take()
+            return
+        info.external_attr = 0o644 << 16
+        info.file_size = member.size
+        written = 0
+        with self.zip.open(info, 'w') as dest:
+            for chunk in member:
+                dest.write(chunk)
+                written += len(chunk)
+                yield self.sink.take()
+            if written != member.size:
+                raise IOError('%s: read %d of %d bytes' % (
+                    member.name, written, member.size))
+        yield self.sink.take()
+
+    def close(self):
+        self.zip.close()
+        yield self.sink.take()
+
+
+class TarWriter(object):
+    """ Writes members to a POSIX (pax) tar archive. """
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, member):
+        info = tarfile.TarInfo(member.name)
+        info.mtime = int(member.mtime)
+        if member.directory:
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+        else:
+            info.size = member.size
+            info.mode = 0o644
+        header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+        self.size += len(header)
+        yield header
+        if member.directory:
+            return
+        written = 0
+        for chunk in member:
+            chunk = chunk[:member.size - written]
+            written += len(chunk)
+            yield chunk
+        if written != member.size:
+            raise IOError('%s: read %d of %d bytes' % (
+                member.name, written, member.size))
+        self.size += written
+        remainder = written % tarfile.BLOCKSIZE
+        if remainder:
+            padding = tarfile.BLOCKSIZE - remainder
+            self.size += padding
+            yield b'\0' * padding
+
+    def close(self):
+        # Two empty blocks, padded to a full record
+        size = self.size + 2 * tarfile.BLOCKSIZE
+        size += -size % tarfile.RECORDSIZE
+        yield b'\0' * (size - self.size)
+
+
+def stream_archive(storage_url, auth_token, container, prefix, root, fmt):
+    """ Yields a zip or tar archive of all objects below prefix.
+
+    Member names are the object names with prefix replaced by root. Up to
+    ARCHIVE_CONCURRENCY following objects are opened and read ahead by up
+    to ARCHIVE_PREFETCH_SIZE bytes while a member is written, thus memory
+    use doesn't depend on the size of objects or the archive. """
+    concurrency = max(getattr(settings, 'ARCHIVE_CONCURRENCY', 4), 1)
+    prefetch = getattr(settings, 'ARCHIVE_PREFETCH_SIZE', 1024 * 1024)
+    writer = ZipWriter() if fmt == 'zip' else TarWriter()
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending = deque()
+
+    def written(future):
+        member = future.result()
+        if member is None:
+            return ()
+        return writer.write(member)
+
+    try:
+        for page in iter_listing_pages(storage_url, auth_token, container,
+                                       prefix=prefix):
+            for obj in page:
+                pending.append(executor.submit(
+                    fetch_member, storage_url, auth_token, container, obj,
+                    root + obj['name'][len(prefix):], prefetch))
+                while len(pending) > concurrency:
+                    for data in written(pending.popleft()):
+                        if data:
+                            yield data
+        while pending:
+            for data in written(pending.popleft()):
+                if data:
+                    yield data
+        for data in writer.close():
+            yield data
+    finally:
+        # The download failed or was aborted by the client
+        for future in pending:
+            if not future.cancel():
+                future.add_done_callback(_discard)
+        executor.shutdown(wait=False)
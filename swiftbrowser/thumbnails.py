@@ -0,0 +1,291 @@
+""" Thumbnails of image objects, cached on disk and in Swift. """
+# -*- coding: utf-8 -*-
+import io
+import os
+import threading
+import time
+from hashlib import sha1
+
+from swiftclient import client
+
+from django.conf import settings
+from django.core.cache import cache
+
+from swiftbrowser.connection import call
+from swiftbrowser.streaming import open_object
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, see extras_require
+    Image = None
+
+# Seconds other processes wait for a thumbnail being generated
+LOCK_TIMEOUT = 10
+
+# Transpositions undoing the EXIF orientation, like PIL.ImageOps
+ORIENTATIONS = {2: 'FLIP_LEFT_RIGHT', 3: 'ROTATE_180', 4: 'FLIP_TOP_BOTTOM',
+                5: 'TRANSPOSE', 6: 'ROTATE_270', 7: 'TRANSVERSE',
+                8: 'ROTATE_90'}
+
+
+def available():
+    """ Returns True if thumbnails can be generated. """
+    return Image is not None and getattr(settings, 'THUMBNAIL_SIZE', 128) > 0
+
+
+def thumbnail_key(storage_url, container, name, etag):
+    """ Returns the name of a thumbnail, unique per object version. """
+    return sha1(repr((storage_url, container, name, etag,
+                      getattr(settings, 'THUMBNAIL_SIZE', 128))).encode(
+        'utf-8')).hexdigest()
+
+
+class DiskCache(object):
+    """ Least recently used files in a directory up to a total size.
+
+    Reads update the modification time of a file; once the estimated size
+    exceeds max_size the oldest files are removed until 90% of it are
+    left. Files are written atomically, thus processes can share a
+    directory. """
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self.size = None
+        self.lock = threading.Lock()
+
+    def filename(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        filename = self.filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            os.utime(filename, None)
+        except OSError:
+            return None
+        return data
+
+    def set(self, key, data):
+        filename = self.filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp = '%s.%d.%d.tmp' % (filename, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, filename)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _mtime, size, _f in self.files())
+            else:
+                self.size += len(data)
+            if self.size > self.max_size:
+                self.evict()
+
+    def files(self):
+        """ Returns (mtime, size, filename) of all cached files. """
+        files = []
+        for root, _dirs, names in os.walk(self.path):
+            for name in names:
+                filename = os.path.join(root, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, filename))
+        return files
+
+    def evict(self):
+        files = sorted(self.files())
+        size = sum(f[1] for f in files)
+        for _mtime, file_size, filename in files:
+            if size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                continue
+            size -= file_size
+        self.size = size
+
+
+_disk_cache = None
+
+
+def get_disk_cache():
+    """ Returns the DiskCache at THUMBNAIL_CACHE_PATH. """
+    global _disk_cache
+    path = settings.THUMBNAIL_CACHE_PATH
+    if _disk_cache is None or _disk_cache.path != path:
+        _disk_cache = DiskCache(path, getattr(
+            settings, 'THUMBNAIL_CACHE_SIZE', 100 * 1024 * 1024))
+    return _disk_cache
+
+
+def exif_thumbnail(data):
+    """ Returns the JPEG thumbnail embedded in the EXIF header of a JPEG.
+
+    The header is at the start of a file, thus a partial read suffices.
+    Returns None if there is no embedded thumbnail. """
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xff:
+        marker = data[pos + 1]
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        if marker == 0xe1 and data[pos + 4:pos + 10] == b'Exif\x00\x00':
+            segment = data[pos + 10:pos + 2 + length]
+            start = segment.find(b'\xff\xd8\xff')
+            end = segment.rfind(b'\xff\xd9')
+            if start >= 0 and end > start:
+                return segment[start:end + 2]
+            return None
+        if marker == 0xda:
+            # Start of the image data, no more headers
+            return None
+        pos += 2 + length
+    return None
+
+
+def read_range(storage_url, auth_token, container, name, start, end=None):
+    """ Returns (data, total size) of a byte range of an object. """
+    if end is None:
+        headers = {'Range': 'bytes=%d-' % start}
+    else:
+        headers = {'Range': 'bytes=%d-%d' % (start, end)}
+    _status, resp_headers, body = open_object(
+        storage_url, auth_token, container, name, headers=headers)
+    data = b''.join(body)
+    total = resp_headers.get('content-range', '').rpartition('/')[2]
+    if not total.isdigit():
+        total = resp_headers.get('content-length', len(data))
+    return data, int(total)
+
+
+def resize(data, orientation=None):
+    """ Returns a JPEG thumbnail of an image, None if it can't be read. """
+    size = getattr(settings, 'THUMBNAIL_SIZE', 128)
+    try:
+        image = Image.open(io.BytesIO(data))
+        if orientation is None:
+            orientation = image.getexif().get(0x0112)
+        # JPEGs are decoded scaled down, which is much faster
+        image.draft('RGB', (size, size))
+        image.thumbnail((size, size))
+    except (IOError, SyntaxError, ValueError, Image.DecompressionBombError):
+        return None
+    if orientation in ORIENTATIONS:
+        image = image.transpose(getattr(Image, ORIENTATIONS[orientation]))
+    if image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.split()[3])
+        image = background
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=85)
+    return output.getvalue()
+
+
+def generate(storage_url, auth_token, container, name):
+    """ Creates the thumbnail of an object.
+
+    The first THUMBNAIL_READ_SIZE bytes are read; larger JPEGs use the
+    thumbnail embedded in their EXIF header if there is one. Otherwise the
+    rest is read if the image is at most THUMBNAIL_MAX_SOURCE_SIZE bytes.
+    Returns None if no thumbnail can be created; raises ClientException if
+    the object can't be read. """
+    read_size = getattr(settings, 'THUMBNAIL_READ_SIZE', 256 * 1024)
+    data, total = read_range(storage_url, auth_token, container, name, 0,
+                             read_size - 1)
+    if len(data) >= total:
+        return resize(data)
+
+    embedded = exif_thumbnail(data)
+    if embedded:
+        try:
+            orientation = Image.open(io.BytesIO(data)).getexif().get(0x0112)
+        except (IOError, SyntaxError, ValueError):
+            orientation = None
+        thumbnail = resize(embedded, orientation or 1)
+        if thumbnail:
+            return thumbnail
+
+    if total > getattr(settings, 'THUMBNAIL_MAX_SOURCE_SIZE',
+                       20 * 1024 * 1024):
+        return None
+    rest, _total = read_range(storage_url, auth_token, container, name,
+                              len(data))
+    return resize(data + rest)
+
+
+def load(storage_url, auth_token, key):
+    """ Returns a thumbnail stored in the thumbnails container or None. """
+    try:
+        _headers, data = call(client.get_object, storage_url, auth_token,
+                              settings.THUMBNAIL_CONTAINER, key + '.jpg')
+    except client.ClientException:
+        return None
+    return data
+
+
+def store(storage_url, auth_token, key, data):
+    """ Saves a thumbnail to the thumbnails container, creating it once.
+
+    Thumbnails are not saved if the user may not write to the account. """
+    container = settings.THUMBNAIL_CONTAINER
+    for attempt in range(2):
+        try:
+            call(client.put_object, storage_url, auth_token, container,
+                 key + '.jpg', contents=data, content_type='image/jpeg')
+            return
+        except client.ClientException as exc:
+            if exc.http_status != 404 or attempt:
+                return
+        try:
+            call(client.put_container, storage_url, auth_token, container)
+        except client.ClientException:
+            return
+
+
+def get_thumbnail(storage_url, auth_token, container, name, etag):
+    """ Returns the JPEG thumbnail of an object version or None.
+
+    Thumbnails are looked up in the local disk cache, then in the hidden
+    THUMBNAIL_CONTAINER of the account and only generated if both miss. A
+    lock in the Django cache lets other processes wait for a thumbnail
+    being generated instead of resizing the same image. """
+    key = thumbnail_key(storage_url, container, name, etag)
+    disk_cache = get_disk_cache()
+    data = disk_cache.get(key)
+    if data is not None:
+        return data
+
+    lock = 'swiftbrowser:thumbnail:%s' % key
+    if cache.get(lock + ':failed'):
+        return None
+    deadline = time.time() + LOCK_TIMEOUT
+    while True:
+        data = load(storage_url, auth_token, key)
+        if data is not None:
+            break
+        if cache.add(lock, True, LOCK_TIMEOUT):
+            try:
+                data = generate(storage_url, auth_token, container, name)
+            except client.ClientException:
+                return None
+            else:
+                if data is not None:
+                    store(storage_url, auth_token, key, data)
+                else:
+                    # Not an image Pillow can read, or too large
+                    cache.set(lock + ':failed', True, 24 * 3600)
+            finally:
+                cache.delete(lock)
+            break
+        if time.time() > deadline:
+            return None
+        time.sleep(0.5)
+
+    if data is not None:
+        disk_cache.set(key, data)
+    return data
@@ -0,0 +1,110 @@
+""" Segmented uploads of objects larger than a single Swift object. """
+# -*- coding: utf-8 -*-
+import json
+import re
+import time
+
+from swiftclient import client
+
+from django.conf import settings
+
+from swiftbrowser.bulk import get_capabilities
+from swiftbrowser.connection import call
+from swiftbrowser.utils import get_temp_url
+
+# Signed segment urls must stay valid until the whole upload finished
+SEGMENT_URL_EXPIRES = 24 * 3600
+
+ETAG_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+def segments_container(container):
+    """ Returns the container segments are stored in, like the swift CLI """
+    return container + '_segments'
+
+
+def get_segment_size(storage_url, size):
+    """ Returns the segment size used to upload size bytes.
+
+    SEGMENT_SIZE is raised if the object would need more segments than a
+    manifest may reference, and to the cluster's minimum segment size. """
+    slo = get_capabilities(storage_url).get('slo', {})
+    max_segments = slo.get('max_manifest_segments', 1000)
+    segment_size = max(
+        getattr(settings, 'SEGMENT_SIZE', 100 * 1024 * 1024),
+        slo.get('min_segment_size', 1),
+        -(-size // max_segments))
+    return segment_size
+
+
+def segment_sizes(size, segment_size):
+    """ Returns a list of (offset, length) tuples covering size bytes. """
+    return [(offset, min(segment_size, size - offset))
+            for offset in range(0, size, segment_size)]
+
+
+def segment_prefix(name, size, segment_size, timestamp):
+    """ Returns the common name prefix of all segments of one upload. """
+    return '%s/slo/%s/%d/%d/' % (name, timestamp, size, segment_size)
+
+
+def start_upload(storage_url, auth_token, container, name, size, origin):
+    """ Prepares a segmented upload of size bytes to container/name.
+
+    Creates the segments container, allowing cross-origin requests from
+    origin, and returns a dict with a signed PUT url for every segment. """
+    headers = {
+        'X-Container-Meta-Access-Control-Allow-Origin': origin,
+        'X-Container-Meta-Access-Control-Expose-Headers': 'etag',
+    }
+    call(client.put_container, storage_url, auth_token,
+         segments_container(container), headers=headers)
+
+    segment_size = get_segment_size(storage_url, size)
+    timestamp = '%.6f' % time.time()
+    prefix = segment_prefix(name, size, segment_size, timestamp)
+    segments = []
+    for index, (offset, length) in enumerate(
+            segment_sizes(size, segment_size)):
+        url = get_temp_url(
+            storage_url, auth_token, segments_container(container),
+            '%s%08d' % (prefix, index), expires=SEGMENT_URL_EXPIRES,
+            method='PUT')
+        if not url:
+            return None
+        segments.append({'url': url, 'offset': offset, 'size': length})
+
+    return {
+        'segment_size': segment_size,
+        'timestamp': timestamp,
+        'concurrency': getattr(settings, 'UPLOAD_CONCURRENCY', 4),
+        'segments': segments,
+    }
+
+
+def finish_upload(storage_url, auth_token, container, name, size,
+                  segment_size, timestamp, etags, content_type=None):
+    """ Creates the Static Large Object manifest for an uploaded object.
+
+    etags are the checksums Swift returned for each segment, in order; Swift
+    verifies them and the segment sizes when the manifest is stored. """
+    sizes = segment_sizes(size, segment_size)
+    if len(etags) != len(sizes):
+        raise ValueError('Expected %d segments, got %d' % (
+            len(sizes), len(etags)))
+    if not all(ETAG_RE.match(etag) for etag in etags):
+        raise ValueError('Invalid segment checksum')
+
+    prefix = segment_prefix(name, size, segment_size, timestamp)
+    manifest = []
+    for index, ((_offset, length), etag) in enumerate(zip(sizes, etags)):
+        manifest.append({
+            'path': '/%s/%s%08d' % (
+                segments_container(container), prefix, index),
+            'etag': etag,
+            'size_bytes': length,
+        })
+
+    call(client.put_object, storage_url, auth_token, container, name,
+         contents=json.dumps(manifest), content_type=content_type,
+         query_string='multipart-manifest=put')
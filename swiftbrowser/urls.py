@@ -2,7 +2,9 @@ from django.conf.urls import url
 from swiftbrowser.views import containerview, objectview, download,\
     delete_object, login, tempurl, upload, create_pseudofolder,\
     create_container, delete_container, public_objectview, toggle_public,\
-    edit_acl
+    edit_acl, job_status, upload_large, upload_segments, upload_manifest,\
+    upload_archive, search, listing_api, metrics_view, usage, batch_acl,\
+    copy_objects, rename_object, tempurls, download_archive, thumbnail
 
 urlpatterns = (
     url(r'^login/$', login, name="login"),
@@ -13,7 +15,17 @@ urlpatterns = (
         name="toggle_public"),
     url(r'^tempurl/(?P<container>.+?)/(?P<objectname>.+?)$', tempurl,
         name="tempurl"),
+    url(r'^tempurls/(?P<container>.+?)/(?P<prefix>.+)?$', tempurls,
+        name="tempurls"),
     url(r'^upload/(?P<container>.+?)/(?P<prefix>.+)?$', upload, name="upload"),
+    url(r'^upload_large/(?P<container>.+?)/(?P<prefix>.+)?$', upload_large,
+        name="upload_large"),
+    url(r'^upload_archive/(?P<container>.+?)/(?P<prefix>.+)?$',
+        upload_archive, name="upload_archive"),
+    url(r'^upload_segments/(?P<container>.+?)/$', upload_segments,
+        name="upload_segments"),
+    url(r'^upload_manifest/(?P<container>.+?)/$', upload_manifest,
+        name="upload_manifest"),
     url(r'^create_pseudofolder/(?P<container>.+?)/(?P<prefix>.+)?$',
         create_pseudofolder, name="create_pseudofolder"),
     url(r'^create_container$', create_container, name="create_container"),
@@ -21,9 +33,26 @@ urlpatterns = (
         name="delete_container"),
     url(r'^download/(?P<container>.+?)/(?P<objectname>.+?)$', download,
         name="download"),
+    url(r'^archive/(?P<container>.+?)/(?P<prefix>.+)?$', download_archive,
+        name="download_archive"),
+    url(r'^thumbnail/(?P<container>.+?)/(?P<objectname>.+?)$', thumbnail,
+        name="thumbnail"),
     url(r'^delete/(?P<container>.+?)/(?P<objectname>.+?)$', delete_object,
         name="delete_object"),
+    url(r'^copy/(?P<container>.+?)/(?P<prefix>.+)?$', copy_objects,
+        name="copy_objects"),
+    url(r'^rename/(?P<container>.+?)/(?P<objectname>.+?)$', rename_object,
+        name="rename_object"),
     url(r'^objects/(?P<container>.+?)/(?P<prefix>(.+)+)?$', objectview,
         name="objectview"),
+    url(r'^search/(?P<container>.+?)/$', search, name="search"),
+    url(r'^usage/(?P<container>.+?)/(?P<prefix>(.+)+)?$', usage,
+        name="usage"),
+    url(r'^api/containers/$', listing_api, name="api_containers"),
+    url(r'^api/objects/(?P<container>.+?)/$', listing_api,
+        name="api_objects"),
+    url(r'^acls/$', batch_acl, name="batch_acl"),
     url(r'^acls/(?P<container>.+?)/$', edit_acl, name="edit_acl"),
+    url(r'^jobs/(?P<job_id>[0-9a-f]+)/$', job_status, name="job_status"),
+    url(r'^metrics$', metrics_view, name="metrics"),
 )
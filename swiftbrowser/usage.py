@@ -0,0 +1,155 @@
+""" Space usage of the pseudofolders in a container. """
+# -*- coding: utf-8 -*-
+import heapq
+import time
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import cache
+
+from swiftbrowser.utils import iter_listing_pages
+
+# Seconds between saving the progress of a scan
+CHECKPOINT_INTERVAL = 30
+
+
+def usage_key(storage_url, container):
+    """ Cache key of the usage report of a container. """
+    return 'swiftbrowser:usage:%s' % sha1(
+        ('%s/%s' % (storage_url, container)).encode('utf-8')).hexdigest()
+
+
+def building_key(storage_url, container):
+    """ Cache key marking an update of a report in progress. """
+    return usage_key(storage_url, container) + ':building'
+
+
+def new_report():
+    now = time.time()
+    return {'prefixes': {}, 'marker': None, 'count': 0, 'bytes': 0,
+            'built': now, 'updated': now}
+
+
+def add_objects(report, objects):
+    """ Adds listed objects to the totals of all their pseudofolders. """
+    prefixes = report['prefixes']
+    total = 0
+    for obj in objects:
+        name = obj['name']
+        size = obj.get('bytes', 0)
+        total += size
+        pos = name.find('/')
+        while pos >= 0:
+            prefix = name[:pos + 1]
+            entry = prefixes.get(prefix)
+            if entry is None:
+                prefixes[prefix] = [1, size]
+            else:
+                entry[0] += 1
+                entry[1] += size
+            pos = name.find('/', pos + 1)
+    report['count'] += len(objects)
+    report['bytes'] += total
+    report['marker'] = objects[-1]['name']
+    report['updated'] = time.time()
+
+
+def scan(storage_url, auth_token, container, report, progress=None,
+         checkpoint=None):
+    """ Adds all objects listed after the marker of report.
+
+    progress is called with the number of objects added so far; checkpoint
+    is called with the report every CHECKPOINT_INTERVAL seconds. Returns
+    the number of added objects. """
+    added = 0
+    saved = time.time()
+    for page in iter_listing_pages(storage_url, auth_token, container,
+                                   marker=report['marker']):
+        add_objects(report, page)
+        added += len(page)
+        if progress:
+            progress(added)
+        if checkpoint and time.time() - saved > CHECKPOINT_INTERVAL:
+            checkpoint(report)
+            saved = time.time()
+    return added
+
+
+def get_report(storage_url, container):
+    """ Returns the cached report of a container or None. """
+    return cache.get(usage_key(storage_url, container))
+
+
+def save_report(storage_url, container, report):
+    cache.set(usage_key(storage_url, container), report,
+              getattr(settings, 'USAGE_CACHE_TIMEOUT', 7 * 24 * 3600))
+
+
+def is_current(report, headers):
+    """ Returns True if a report matches the container totals. """
+    return report is not None and \
+        report['count'] == int(headers.get('x-container-object-count', 0)) \
+        and report['bytes'] == int(headers.get('x-container-bytes-used', 0))
+
+
+def update_report(storage_url, auth_token, container, headers,
+                  progress=None):
+    """ Updates the report of a container to match its HEAD totals.
+
+    Objects listed after the last scanned name are added first. If the
+    totals still differ, objects have been deleted or created before the
+    marker and the report is rebuilt by a complete pass over the listing,
+    but at most once per USAGE_REBUILD_INTERVAL as container totals are
+    updated eventually. An interrupted rebuild is resumed from its last
+    checkpoint. Returns the report. """
+    report = get_report(storage_url, container)
+    if report is not None:
+        scan(storage_url, auth_token, container, report, progress)
+        age = time.time() - report['built']
+        interval = getattr(settings, 'USAGE_REBUILD_INTERVAL', 3600)
+        if is_current(report, headers) or age < interval:
+            save_report(storage_url, container, report)
+            return report
+
+    partial_key = usage_key(storage_url, container) + ':partial'
+    report = cache.get(partial_key) or new_report()
+
+    def checkpoint(report):
+        cache.set(partial_key, report, 3600)
+
+    scan(storage_url, auth_token, container, report, progress, checkpoint)
+    save_report(storage_url, container, report)
+    cache.delete(partial_key)
+    return report
+
+
+def folder_usage(report, prefix=''):
+    """ Returns the usage of the pseudofolders directly below prefix.
+
+    Returns a tuple (folders, objects) with a list of (prefix, count,
+    bytes) tuples sorted by size and a (count, bytes) tuple of the objects
+    directly in prefix. """
+    prefixes = report['prefixes']
+    if prefix:
+        count, total = prefixes.get(prefix, (0, 0))
+    else:
+        count, total = report['count'], report['bytes']
+    folders = []
+    start = len(prefix)
+    for name, (folder_count, folder_bytes) in prefixes.items():
+        if name.startswith(prefix) and name.find('/', start) == \
+                len(name) - 1 and name != prefix:
+            folders.append((name, folder_count, folder_bytes))
+            count -= folder_count
+            total -= folder_bytes
+    folders.sort(key=lambda folder: (-folder[2], folder[0]))
+    return folders, (count, total)
+
+
+def largest_folders(report, prefix='', count=20):
+    """ Returns the largest pseudofolders at any depth below prefix. """
+    return heapq.nlargest(
+        count, ((name, entry[0], entry[1])
+                for name, entry in report['prefixes'].items()
+                if name.startswith(prefix) and name != prefix),
+        key=lambda folder: (folder[2], folder[0]))
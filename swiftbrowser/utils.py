@@ -1,15 +1,28 @@
 """ Standalone webinterface for Openstack Swift. """
 # -*- coding: utf-8 -*-
+import contextvars
+import functools
 import time
 import hmac
 import string
 import random
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from hashlib import sha1
-from urllib.parse import urlparse
+from urllib.parse import urlparse, quote
 
 from swiftclient import client
 
 from django.conf import settings
+from django.core.cache import cache
+from django.template.defaultfilters import filesizeformat
+from django.utils import formats
+from django.utils.timezone import get_current_timezone
+
+from swiftbrowser.connection import call
 
 
 def get_base_url(request):
@@ -48,11 +61,110 @@ def prefix_list(prefix):
     return prefixes
 
 
+def parse_timestamp(value):
+    """ Parses a listing timestamp like 2020-01-31T12:00:00.123456 (UTC).
+
+    Slicing the fixed-width format is much faster than strptime. Returns an
+    aware datetime or None if value can't be parsed. """
+    try:
+        return datetime(
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19]),
+            int(value[20:26].ljust(6, '0')), tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+class Folder(namedtuple('Folder', ('prefix', 'subdir'))):
+    """ A pseudofolder row, equal to a (prefix, subdir) tuple. """
+    __slots__ = ()
+
+    @property
+    def display_name(self):
+        return self.prefix.rstrip('/').rsplit('/', 1)[-1]
+
+
+class RowFormatter(object):
+    """ Formats sizes and dates like the filesizeformat and date filters.
+
+    Sizes are shown rounded to one decimal place and dates usually with
+    minute precision, thus many rows share the same output and results are
+    memoized; formatting is comparatively slow. """
+
+    date_format = 'SHORT_DATETIME_FORMAT'
+
+    def __init__(self):
+        self.sizes = {}
+        self.dates = {}
+        self.timezone = get_current_timezone() if settings.USE_TZ else None
+        # Memoize by minute unless the format shows seconds
+        fmt = formats.get_format(self.date_format)
+        self.by_minute = not set(fmt) & set('crsuU')
+
+    def size(self, value):
+        try:
+            magnitude = abs(int(value))
+        except (TypeError, ValueError):
+            return filesizeformat(value)
+        unit = 1
+        while magnitude >= unit << 10 and unit < 1 << 50:
+            unit <<= 10
+        key = (value < 0, unit, round(magnitude / unit, 1))
+        if key not in self.sizes:
+            self.sizes[key] = filesizeformat(value)
+        return self.sizes[key]
+
+    def date(self, value):
+        if value is None:
+            return ''
+        if self.timezone:
+            value = value.astimezone(self.timezone)
+        key = value.replace(second=0, microsecond=0) \
+            if self.by_minute else value
+        if key not in self.dates:
+            self.dates[key] = formats.date_format(value, self.date_format)
+        return self.dates[key]
+
+
+# Content types of objects shown with a thumbnail
+IMAGE_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp',
+                       'image/bmp', 'image/tiff')
+
+
+class ObjectRow(object):
+    """ An object row with the values shown in listings precomputed. """
+    __slots__ = ('name', 'display_name', 'last_modified', 'modified',
+                 'bytes', 'size', 'content_type', 'hash', 'manifest',
+                 'delete_at', 'expires', 'metadata')
+
+    def __init__(self, obj, formatter=None):
+        formatter = formatter or RowFormatter()
+        self.name = obj['name']
+        self.display_name = self.name.strip('/').rsplit('/', 1)[-1]
+        self.last_modified = parse_timestamp(obj.get('last_modified'))
+        self.modified = formatter.date(self.last_modified)
+        self.bytes = obj.get('bytes', 0)
+        self.size = formatter.size(self.bytes)
+        self.content_type = obj.get('content_type')
+        self.hash = obj.get('hash')
+        # Set by enrich_rows
+        self.manifest = None
+        self.delete_at = None
+        self.expires = ''
+        self.metadata = ()
+
+    @property
+    def image(self):
+        return (self.content_type or '').split(';')[0].strip().lower() in \
+            IMAGE_CONTENT_TYPES
+
+
 def pseudofolder_object_list(objects, prefix):
     pseudofolders = []
     objs = []
 
-    duplist = []
+    seen = set()
+    formatter = RowFormatter()
 
     for obj in objects:
         # Rackspace Cloudfiles uses application/directory
@@ -65,50 +177,373 @@ def pseudofolder_object_list(objects, prefix):
             # make sure that there is a single slash at the end
             # Cyberduck appends a slash to the name of a pseudofolder
             entry = obj['subdir'].strip('/') + '/'
-            if entry != prefix and entry not in duplist:
-                duplist.append(entry)
-                pseudofolders.append((entry, obj['subdir']))
+            if entry != prefix and entry not in seen:
+                seen.add(entry)
+                pseudofolders.append(Folder(entry, obj['subdir']))
         else:
-            objs.append(obj)
+            objs.append(ObjectRow(obj, formatter))
 
     return (pseudofolders, objs)
 
 
-def get_temp_key(storage_url, auth_token):
+def object_details(headers):
+    """ Returns the details of an object shown in listings from its HEAD.
+
+    The content length of manifests is the size of all their segments. """
+    manifest = None
+    if headers.get('x-static-large-object', '').lower() == 'true':
+        manifest = 'slo'
+    elif 'x-object-manifest' in headers:
+        manifest = 'dlo'
+    try:
+        delete_at = int(headers['x-delete-at'])
+    except (KeyError, ValueError):
+        delete_at = None
+    metadata = sorted((name[len('x-object-meta-'):], value)
+                      for name, value in headers.items()
+                      if name.startswith('x-object-meta-'))
+    return {'bytes': int(headers.get('content-length', 0)),
+            'manifest': manifest, 'delete_at': delete_at,
+            'metadata': metadata}
+
+
+def enrich_rows(storage_url, auth_token, container, rows):
+    """ Adds details only returned by HEAD requests to object rows.
+
+    Up to ENRICH_CONCURRENCY objects are requested at once. Details are
+    cached by object name, ETag and last modification for
+    ENRICH_CACHE_TIMEOUT seconds; dynamic large objects change size with
+    their segments and are cached for LISTING_CACHE_TIMEOUT seconds only.
+    Rows of objects that can't be requested are left unchanged. """
+    keys = [('swiftbrowser:object_head:%s' % sha1(repr(
+        (storage_url, container, row.name, row.hash,
+         row.last_modified)).encode('utf-8')).hexdigest()) for row in rows]
+    details = cache.get_many(keys)
+    missing = [(key, row) for key, row in zip(keys, rows)
+               if key not in details]
+
+    def head(row):
+        try:
+            return object_details(call(client.head_object, storage_url,
+                                       auth_token, container, row.name))
+        except client.ClientException:
+            return None
+
+    if missing:
+        concurrency = getattr(settings, 'ENRICH_CONCURRENCY', 10)
+        with ThreadPoolExecutor(
+                max_workers=min(concurrency, len(missing))) as executor:
+            # Requests are traced as part of the current request
+            results = [executor.submit(contextvars.copy_context().run,
+                                       head, row) for _key, row in missing]
+        static = {}
+        dynamic = {}
+        for (key, _row), result in zip(missing, results):
+            result = result.result()
+            if result is not None:
+                details[key] = result
+                if result['manifest'] == 'dlo':
+                    dynamic[key] = result
+                else:
+                    static[key] = result
+        timeout = getattr(settings, 'ENRICH_CACHE_TIMEOUT', 86400)
+        if static and timeout:
+            cache.set_many(static, timeout)
+        timeout = getattr(settings, 'LISTING_CACHE_TIMEOUT', 30)
+        if dynamic and timeout:
+            cache.set_many(dynamic, timeout)
+
+    formatter = RowFormatter()
+    for key, row in zip(keys, rows):
+        if key not in details:
+            continue
+        row.bytes = details[key]['bytes']
+        row.size = formatter.size(row.bytes)
+        row.manifest = details[key]['manifest']
+        row.metadata = details[key]['metadata']
+        if details[key]['delete_at'] is not None:
+            row.delete_at = datetime.fromtimestamp(
+                details[key]['delete_at'], timezone.utc)
+            row.expires = formatter.date(row.delete_at)
+
+
+def listing_generation_keys(storage_url, container=None, prefix=None):
+    """ Returns the cache keys of the generations a listing depends on.
+
+    Account listings depend on the account generation, object listings on
+    the generations of the container and of the listed prefix. """
+    if container is None:
+        scopes = [storage_url]
+    else:
+        scopes = ['%s/%s' % (storage_url, container)]
+        if prefix is not None:
+            scopes.append('%s/%s/%s' % (storage_url, container, prefix))
+    return ['swiftbrowser:listing_gen:%s' % sha1(
+        scope.encode('utf-8')).hexdigest() for scope in scopes]
+
+
+def tree_generation_key(storage_url, container):
+    """ Returns the cache key of a generation covering a whole container.
+
+    It changes whenever any listing of the container is invalidated, eg. for
+    results computed from all objects below a prefix. """
+    scope = '%s/%s/*' % (storage_url, container)
+    return 'swiftbrowser:listing_gen:%s' % sha1(
+        scope.encode('utf-8')).hexdigest()
+
+
+def get_listing_generations(keys):
+    """ Returns the current generations, creating missing ones. """
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, uuid.uuid4().hex, 24 * 3600)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def invalidate_listings(storage_url, container=None, prefix=None):
+    """ Invalidates cached listings after a modification.
+
+    Without container only the account listing is invalidated, without
+    prefix all listings of the container; '' is the container root. Listings
+    of the parent prefixes are invalidated too, as pseudofolders appear or
+    disappear with their first or last object. """
+    keys = listing_generation_keys(storage_url, container, prefix)[-1:]
+    if prefix:
+        parents = [''] + [prefix[:pos + 1] for pos, char in enumerate(
+            prefix[:-1]) if char == '/']
+        for parent in parents:
+            keys += listing_generation_keys(storage_url, container, parent)[1:]
+    if container is not None:
+        keys.append(tree_generation_key(storage_url, container))
+    for key in keys:
+        cache.set(key, uuid.uuid4().hex, 24 * 3600)
+
+
+def cached_listing(storage_url, auth_token, container=None, **kwargs):
+    """ Returns client.get_account, or get_container if container is given.
+
+    Results are cached for LISTING_CACHE_TIMEOUT seconds per token and are
+    invalidated using invalidate_listings. """
+    if container is None:
+        func, args = client.get_account, ()
+    else:
+        func, args = client.get_container, (container, )
+    timeout = getattr(settings, 'LISTING_CACHE_TIMEOUT', 30)
+    if not timeout:
+        return call(func, storage_url, auth_token, *args, **kwargs)
+
+    generations = get_listing_generations(listing_generation_keys(
+        storage_url, container, kwargs.get('prefix') or ''))
+    token = auth_token
+    if isinstance(token, bytes):
+        token = token.decode('utf-8')
+    key = repr((storage_url, token, container, sorted(kwargs.items()),
+                generations))
+    key = 'swiftbrowser:listing:%s' % sha1(key.encode('utf-8')).hexdigest()
+
+    result = cache.get(key)
+    if result is None:
+        result = call(func, storage_url, auth_token, *args, **kwargs)
+        cache.set(key, result, timeout)
+    return result
+
+
+# HEAD response headers an account or container listing depends on
+LISTING_ETAG_HEADERS = (
+    'x-account-container-count', 'x-account-object-count',
+    'x-account-bytes-used', 'x-container-object-count',
+    'x-container-bytes-used', 'last-modified', 'x-timestamp',
+    'x-put-timestamp')
+
+
+def listing_etag(storage_url, headers, *args):
+    """ Returns a strong ETag for a listing, derived from HEAD headers.
+
+    The listing counts, bytes used and timestamps change whenever an entry
+    is added, removed or replaced; args identify the listed range. """
+    values = [(name, headers.get(name)) for name in LISTING_ETAG_HEADERS]
+    key = repr((storage_url, values, args))
+    return '"%s"' % sha1(key.encode('utf-8')).hexdigest()
+
+
+def listing_cursor(obj):
+    """ Returns the name used as marker for a listing entry. """
+    return obj.get('name', obj.get('subdir'))
+
+
+def get_listing_page(storage_url, auth_token, container, prefix=None,
+                     marker=None, end_marker=None, limit=None, cached=True):
+    """ Returns a single page of a container listing.
+
+    A page either starts after marker or, when paging backwards, ends before
+    end_marker. Returns a tuple (meta, objects, prev_marker, next_marker);
+    prev_marker is the end_marker and next_marker the marker for the
+    adjacent pages, or None if there is no such page. Unless cached is
+    True the listing cache is bypassed. """
+    limit = limit or getattr(settings, 'LISTING_PAGE_SIZE', 1000)
+    listing = cached_listing
+    if not cached:
+        listing = functools.partial(call, client.get_container)
+
+    if end_marker and not marker:
+        # Reverse listings return entries before the marker, newest first
+        meta, objects = listing(
+            storage_url, auth_token, container,
+            marker=end_marker, limit=limit + 1, prefix=prefix,
+            delimiter='/', query_string='reverse=on')
+        if len(objects) > limit:
+            objects = objects[:limit]
+            objects.reverse()
+            # The end_marker itself is the first entry of the next page
+            return (meta, objects, listing_cursor(objects[0]),
+                    listing_cursor(objects[-1]))
+        # Reached the beginning of the listing, show a full first page
+        marker = None
+
+    meta, objects = listing(
+        storage_url, auth_token, container,
+        marker=marker, limit=limit + 1, prefix=prefix, delimiter='/')
+
+    prev_marker = next_marker = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        next_marker = listing_cursor(objects[-1])
+    if marker and objects:
+        prev_marker = listing_cursor(objects[0])
+    return (meta, objects, prev_marker, next_marker)
+
+
+def iter_listing_pages(storage_url, auth_token, container, prefix=None,
+                       delimiter=None, page_size=10000, marker=None):
+    """ Yields a complete container listing page by page.
+
+    Every page is fetched with its own marker based request, thus the listing
+    may be modified (eg. objects deleted) while iterating. If marker is given
+    only entries sorted after it are listed. """
+    while True:
+        _meta, objects = call(
+            client.get_container, storage_url, auth_token, container,
+            marker=marker, limit=page_size, prefix=prefix,
+            delimiter=delimiter)
+        if objects:
+            yield objects
+        if len(objects) < page_size:
+            return
+        marker = listing_cursor(objects[-1])
+
+
+# Process-wide tier of the temp url key cache: {cache key: (key, expires)}
+_temp_keys = {}
+_temp_keys_lock = threading.Lock()
+
+
+def temp_key_cache_key(storage_url, auth_token):
+    """ Returns the cache key for the temp url key of an account.
+
+    The token is part of the cache key, so a key is only handed out to
+    credentials that were allowed to read it from the account. """
+    if isinstance(auth_token, bytes):
+        auth_token = auth_token.decode('utf-8')
+    digest = sha1(
+        ('%s\n%s' % (storage_url, auth_token)).encode('utf-8')).hexdigest()
+    return 'swiftbrowser:temp_key:%s' % digest
+
+
+def get_temp_key(storage_url, auth_token, fresh=False):
     """ Tries to get meta-temp-url key from account.
     If not set, generate tempurl and save it to acocunt.
-    This requires at least account owner rights. """
+    This requires at least account owner rights.
 
-    try:
-        account = client.get_account(storage_url, auth_token)
-    except client.ClientException:
-        return None
+    Keys are cached in the process and in the Django cache for
+    TEMP_KEY_CACHE_TIMEOUT seconds. If fresh is True the key is read from
+    the account and the caches are updated, eg. after the key was rotated;
+    Swift rejects outdated signatures without telling swiftbrowser. """
+
+    cache_key = temp_key_cache_key(storage_url, auth_token)
+    timeout = getattr(settings, 'TEMP_KEY_CACHE_TIMEOUT', 300)
+    now = time.time()
 
-    key = account[0].get('x-account-meta-temp-url-key')
+    if not fresh:
+        with _temp_keys_lock:
+            key, expires = _temp_keys.get(cache_key, (None, 0))
+        if key and expires > now:
+            return key
 
+    key = None if fresh else cache.get(cache_key)
     if not key:
-        chars = string.ascii_lowercase + string.digits
-        key = ''.join(random.choice(chars) for x in range(32))
-        headers = {'x-account-meta-temp-url-key': key}
         try:
-            client.post_account(storage_url, auth_token, headers)
+            headers = call(client.head_account, storage_url, auth_token)
         except client.ClientException:
             return None
+
+        key = headers.get('x-account-meta-temp-url-key')
+
+        if not key:
+            chars = string.ascii_lowercase + string.digits
+            key = ''.join(random.choice(chars) for x in range(32))
+            headers = {'x-account-meta-temp-url-key': key}
+            try:
+                call(client.post_account, storage_url, auth_token, headers)
+            except client.ClientException:
+                return None
+        cache.set(cache_key, key, timeout)
+
+    with _temp_keys_lock:
+        if len(_temp_keys) > 1000:
+            for expired in [k for k, v in _temp_keys.items() if v[1] < now]:
+                del _temp_keys[expired]
+        _temp_keys[cache_key] = (key, now + timeout)
     return key
 
 
-def get_temp_url(storage_url, auth_token, container, objectname, expires=600):
+class TempURLSigner(object):
+    """ Signs temp urls for objects of a container using a single key.
+
+    The HMAC state after method, expiry and container path is computed once
+    and copied for every signed object. expires is in seconds from now. """
+
+    def __init__(self, key, storage_url, container, expires=600,
+                 method='GET'):
+        self.method = method
+        self.expires = int(time.time()) + expires
+        url_parts = urlparse(storage_url)
+        self.base = "%s://%s" % (url_parts.scheme, url_parts.netloc)
+        self.path = "%s/%s/" % (url_parts.path, container)
+        self.key = bytes(key, "utf-8")
+        self.hmac = hmac.new(self.key, bytes('%s\n%s\n%s' % (
+            method, self.expires, self.path), "utf-8"), sha1)
+
+    def sign(self, objectname):
+        """ Returns the temp url of an object. """
+        sig = self.hmac.copy()
+        sig.update(bytes(objectname, "utf-8"))
+        # The signature covers the plain path, Swift unquotes it before
+        # checking
+        return '%s%s?temp_url_sig=%s&temp_url_expires=%s' % (
+            self.base, quote(self.path + objectname), sig.hexdigest(),
+            self.expires)
+
+    def sign_prefix(self, prefix):
+        """ Returns a temp url valid for all objects below prefix.
+
+        The object name below prefix is appended to the path of the url
+        (requires temp_url_prefix support, Swift 2.12 or later). """
+        hmac_body = '%s\n%s\nprefix:%s%s' % (
+            self.method, self.expires, self.path, prefix)
+        sig = hmac.new(self.key, bytes(hmac_body, "utf-8"), sha1).hexdigest()
+        return '%s%s?temp_url_sig=%s&temp_url_expires=%s&' \
+            'temp_url_prefix=%s' % (self.base, quote(self.path + prefix), sig,
+                                    self.expires, quote(prefix, safe=''))
+
+
+def get_temp_url(storage_url, auth_token, container, objectname, expires=600,
+                 method='GET'):
+    """ Returns a temp url allowing method on an object for expires seconds.
+    """
     key = get_temp_key(storage_url, auth_token)
     if not key:
         return None
-
-    expires += int(time.time())
-    url_parts = urlparse(storage_url)
-    path = "%s/%s/%s" % (url_parts.path, container, objectname)
-    base = "%s://%s" % (url_parts.scheme, url_parts.netloc)
-    hmac_body = 'GET\n%s\n%s' % (expires, path)
-    sig = hmac.new(
-        bytes(key, "utf-8"), bytes(hmac_body, "utf-8"), sha1).hexdigest()
-    url = '%s%s?temp_url_sig=%s&temp_url_expires=%s' % (
-        base, path, sig, expires)
-    return url
+    return TempURLSigner(key, storage_url, container, expires,
+                         method).sign(objectname)
@@ -1,23 +1,51 @@
 """ Standalone webinterface for Openstack Swift. """
 # -*- coding: utf-8 -*-
+import csv
+import itertools
+import json
 import os
 import time
 import hmac
+from datetime import datetime, timezone
 from hashlib import sha1
-from urllib.parse import urlparse
+from urllib.parse import urlparse, quote
 
 from swiftclient import client
 
+from django.http import HttpResponse, HttpResponseNotModified, \
+    JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import ugettext as _
 from django.urls import reverse
-
+from django.utils.cache import add_never_cache_headers, patch_cache_control, \
+    patch_vary_headers
+from django.utils.http import parse_etags
+
+from swiftbrowser import auth as keystone, jobs, metrics
+from swiftbrowser.acl import get_acl, split_entries, update_acl, \
+    update_acls
+from swiftbrowser.bulk import delete_objects, archive_format, \
+    extract_archive, get_capabilities, copy_objects as bulk_copy, \
+    copy_target, temp_url_methods, temp_url_prefix_supported
+from swiftbrowser.connection import call, pool
 from swiftbrowser.forms import CreateContainerForm, PseudoFolderForm, \
-    LoginForm, AddACLForm
+    LoginForm, AddACLForm, SegmentedUploadForm, ManifestForm, \
+    ArchiveUploadForm, BatchACLForm, CopyForm, RenameForm, TempURLsForm
+from swiftbrowser.search import building_key, get_index, update_index
+from swiftbrowser.sorting import DIRECTORY_TYPES, SORT_KEYS, get_sorted_page
+from swiftbrowser.streaming import open_object, stream_archive
+from swiftbrowser.uploads import start_upload, finish_upload
+from swiftbrowser import thumbnails
+from swiftbrowser import usage as space_usage
 from swiftbrowser.utils import replace_hyphens, prefix_list, \
-    pseudofolder_object_list, get_temp_key, get_base_url, get_temp_url
+    pseudofolder_object_list, get_temp_key, get_base_url, get_temp_url, \
+    get_listing_page, cached_listing, \
+    invalidate_listings, listing_cursor, listing_etag, \
+    get_listing_generations, listing_generation_keys, tree_generation_key, \
+    iter_listing_pages, TempURLSigner, enrich_rows
 
 import swiftbrowser
 
@@ -31,13 +59,20 @@ def login(request):
         password = form.cleaned_data['password']
         try:
             auth_version = settings.SWIFT_AUTH_VERSION or 1
-            (storage_url, auth_token) = client.get_auth(
-                settings.SWIFT_AUTH_URL, username, password,
-                auth_version=auth_version)
+            if str(auth_version) == '3':
+                (storage_url, auth_token, expires) = keystone.get_auth(
+                    settings.SWIFT_AUTH_URL, username, password)
+                # The session ends with the token
+                request.session.set_expiry(int(expires - time.time()))
+            else:
+                with metrics.trace('get_auth'):
+                    (storage_url, auth_token) = client.get_auth(
+                        settings.SWIFT_AUTH_URL, username, password,
+                        auth_version=auth_version)
             request.session['auth_token'] = auth_token
             request.session['storage_url'] = storage_url
             request.session['username'] = username
-            return redirect(containerview)
+            return redirect('containerview')
 
         except client.ClientException:
             messages.add_message(request, messages.ERROR, _("Login failed."))
@@ -52,28 +87,107 @@ def containerview(request):
     auth_token = request.session.get('auth_token', '')
 
     try:
-        account_stat, containers = client.get_account(storage_url, auth_token)
+        account_stat, containers = cached_listing(storage_url, auth_token)
     except client.ClientException as exc:
-        if exc.http_status == 403:
-            account_stat = {}
-            containers = []
-            base_url = get_base_url(request)
-            msg = 'Container listing failed. You can manually choose a known '
-            msg += 'container by appending the name to the URL, for example: '
-            msg += '<a href="%s/objects/containername">' % base_url
-            msg += '%s/objects/containername</a>' % base_url
-            messages.add_message(request, messages.ERROR, msg)
-        else:
-            return redirect(login)
+        return containerview_failed(request, exc)
+
+    return render_containerview(request, account_stat, containers)
+
+
+def containerview_failed(request, exc):
+    """ Handles a failed account listing """
+    if exc.http_status != 403:
+        return redirect(login)
 
+    base_url = get_base_url(request)
+    msg = 'Container listing failed. You can manually choose a known '
+    msg += 'container by appending the name to the URL, for example: '
+    msg += '<a href="%s/objects/containername">' % base_url
+    msg += '%s/objects/containername</a>' % base_url
+    messages.add_message(request, messages.ERROR, msg)
+    return render_containerview(request, {}, [])
+
+
+def render_containerview(request, account_stat, containers):
+    """ Renders the container listing """
     account_stat = replace_hyphens(account_stat)
 
+    # The thumbnails container is managed by swiftbrowser
+    hidden = getattr(settings, 'THUMBNAIL_CONTAINER', None)
+    containers = [c for c in containers if c.get('name') != hidden]
+
     return render(request, 'containerview.html', {
         'account_stat': account_stat,
         'containers': containers,
         'session': request.session})
 
 
+def listing_api(request, container=None):
+    """ Returns an account or container listing as JSON.
+
+    Accepts marker, prefix, delimiter and limit parameters; next_marker is
+    the marker of the following page. A strong ETag is derived from a HEAD
+    request and the listing generation, thus unchanged listings are answered
+    with 304 Not Modified without listing them again. """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    params = {}
+    for name in ('marker', 'prefix', 'delimiter'):
+        if request.GET.get(name):
+            params[name] = request.GET[name]
+    try:
+        limit = int(request.GET.get(
+            'limit', getattr(settings, 'LISTING_PAGE_SIZE', 1000)))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit.'}, status=400)
+    limit = min(max(limit, 1), 10000)
+
+    try:
+        if container is None:
+            headers = call(client.head_account, storage_url, auth_token)
+        else:
+            headers = call(client.head_container, storage_url, auth_token,
+                           container)
+    except client.ClientException as exc:
+        status = 404 if exc.http_status == 404 else 403
+        return JsonResponse({'error': _("Access denied.")}, status=status)
+
+    # Renames and overwrites may keep counts, bytes and timestamps
+    if container is None:
+        keys = listing_generation_keys(storage_url)
+    else:
+        keys = [tree_generation_key(storage_url, container)]
+    etag = listing_etag(storage_url, headers, container,
+                        sorted(params.items()), limit,
+                        get_listing_generations(keys))
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        # Listed without the cache, the body must match the ETag
+        try:
+            if container is None:
+                _headers, items = call(client.get_account, storage_url,
+                                       auth_token, limit=limit + 1, **params)
+            else:
+                _headers, items = call(client.get_container, storage_url,
+                                       auth_token, container,
+                                       limit=limit + 1, **params)
+        except client.ClientException:
+            return JsonResponse({'error': _("Access denied.")}, status=403)
+
+        next_marker = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_marker = listing_cursor(items[-1])
+        response = JsonResponse({'items': items, 'next_marker': next_marker})
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 def create_container(request):
     """ Creates a container (empty object of type application/directory) """
 
@@ -84,34 +198,82 @@ def create_container(request):
     if form.is_valid():
         container = form.cleaned_data['containername']
         try:
-            client.put_container(storage_url, auth_token, container)
+            call(client.put_container, storage_url, auth_token, container)
+            invalidate_listings(storage_url)
             messages.add_message(request, messages.INFO,
                                  _("Container created."))
         except client.ClientException:
             messages.add_message(request, messages.ERROR, _("Access denied."))
 
-        return redirect(containerview)
+        return redirect('containerview')
 
     return render(request, 'create_container.html', {})
 
 
+def job_owner(request):
+    """ Returns the identity background jobs of a session belong to. """
+    return '%s %s' % (request.session.get('storage_url', ''),
+                      request.session.get('username', ''))
+
+
+def start_job(request, description, func, *args):
+    """ Starts a background job and remembers it in the session. """
+    job = jobs.submit(job_owner(request), description, func, *args)
+    session_jobs = request.session.get('jobs', [])[-9:]
+    session_jobs.append(job.id)
+    request.session['jobs'] = session_jobs
+    return job
+
+
+def job_status(request, job_id):
+    """ Returns the progress of a background job as JSON """
+    job = jobs.Job.get(job_id)
+    if not job or job.owner != job_owner(request):
+        return JsonResponse({'error': 'Job not found.'}, status=404)
+
+    if job.status in ('done', 'failed'):
+        session_jobs = request.session.get('jobs', [])
+        if job_id in session_jobs:
+            session_jobs.remove(job_id)
+            request.session['jobs'] = session_jobs
+
+    status = job.as_dict()
+    del status['owner']
+    return JsonResponse(status)
+
+
+def delete_container_job(job, storage_url, auth_token, container):
+    """ Deletes all objects and finally the container itself """
+    result = delete_objects(
+        storage_url, auth_token, container,
+        progress=lambda r: job.progress(r.processed, len(r.errors)))
+    job.progress(result.processed, len(result.errors))
+
+    if result.errors:
+        failed = ', '.join(name for name, _s in result.errors[:10])
+        raise client.ClientException(
+            _("%(count)d objects could not be deleted: %(names)s") % {
+                'count': len(result.errors), 'names': failed})
+
+    call(client.delete_container, storage_url, auth_token, container)
+    invalidate_listings(storage_url, container)
+    invalidate_listings(storage_url)
+    return _("Container deleted (%(count)d objects, %(rate).0f/s).") % {
+        'count': result.succeeded, 'rate': result.rate}
+
+
 def delete_container(request, container):
-    """ Deletes a container """
+    """ Deletes a container in the background """
 
     storage_url = request.session.get('storage_url', '')
     auth_token = request.session.get('auth_token', '')
 
-    try:
-        _m, objects = client.get_container(storage_url, auth_token, container)
-        for obj in objects:
-            client.delete_object(storage_url, auth_token,
-                                 container, obj['name'])
-        client.delete_container(storage_url, auth_token, container)
-        messages.add_message(request, messages.INFO, _("Container deleted."))
-    except client.ClientException:
-        messages.add_message(request, messages.ERROR, _("Access denied."))
+    start_job(request, _("Deleting container %s") % container,
+              delete_container_job, storage_url, auth_token, container)
+    messages.add_message(request, messages.INFO,
+                         _("Container deletion started."))
 
-    return redirect(containerview)
+    return redirect('containerview')
 
 
 def objectview(request, container, prefix=None):
@@ -120,17 +282,91 @@ def objectview(request, container, prefix=None):
     storage_url = request.session.get('storage_url', '')
     auth_token = request.session.get('auth_token', '')
 
+    formpost_status(request, storage_url, container, prefix)
+
+    if request.GET.get('sort') in SORT_KEYS:
+        return sorted_objectview(request, container, prefix)
+
+    try:
+        meta, objects, prev_marker, next_marker = get_listing_page(
+            storage_url, auth_token, container, prefix=prefix,
+            marker=request.GET.get('marker'),
+            end_marker=request.GET.get('end_marker'))
+
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, _("Access denied."))
+        return redirect('containerview')
+
+    return render_objectview(request, container, prefix, meta, objects,
+                             prev_marker, next_marker)
+
+
+def sorting_params(request):
+    """ Returns sort, order, offset and limit of a sorted listing request """
     try:
-        meta, objects = client.get_container(storage_url, auth_token,
-                                             container, delimiter='/',
-                                             prefix=prefix)
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        offset = 0
+    return {
+        'sort': request.GET['sort'],
+        'order': 'desc' if request.GET.get('order') == 'desc' else 'asc',
+        'offset': offset,
+        'limit': getattr(settings, 'LISTING_PAGE_SIZE', 1000)}
+
+
+def sorting_context(sorting, more):
+    """ Returns the template context of a sorted page """
+    offset, limit = sorting['offset'], sorting['limit']
+    return {
+        'sort': sorting['sort'],
+        'order': sorting['order'],
+        'prev_offset': max(offset - limit, 0) if offset else None,
+        'next_offset': offset + limit if more else None,
+    }
+
+
+def sorted_objectview(request, container, prefix=None):
+    """ Returns a page of all objects below prefix in the requested order """
 
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    sorting = sorting_params(request)
+    try:
+        meta = call(client.head_container, storage_url, auth_token,
+                    container)
+        objects, more = get_sorted_page(
+            storage_url, auth_token, container, prefix=prefix,
+            sort=sorting['sort'], reverse=sorting['order'] == 'desc',
+            offset=sorting['offset'], limit=sorting['limit'])
     except client.ClientException:
         messages.add_message(request, messages.ERROR, _("Access denied."))
-        return redirect(containerview)
+        return redirect('containerview')
+
+    return render_objectview(request, container, prefix, meta, objects,
+                             None, None, sorting_context(sorting, more))
 
+
+def formpost_status(request, storage_url, container, prefix):
+    """ Handles the upload status Swift formpost redirects back with """
+    if request.GET.get('status'):
+        invalidate_listings(storage_url, container, prefix or '')
+        invalidate_listings(storage_url)
+
+
+def render_objectview(request, container, prefix, meta, objects,
+                      prev_marker, next_marker, sorting=None):
+    """ Renders a page of the object listing """
+    storage_url = request.session.get('storage_url', '')
     prefixes = prefix_list(prefix)
     pseudofolders, objs = pseudofolder_object_list(objects, prefix)
+    if getattr(settings, 'ENRICH_LISTINGS', False):
+        enrich_rows(storage_url, request.session.get('auth_token', ''),
+                    container, objs)
+    if sorting:
+        # Sorted pages contain objects of all pseudofolders below prefix
+        for obj in objs:
+            obj.display_name = obj.name[len(prefix or ''):]
     base_url = get_base_url(request)
     account = storage_url.split('/')[-1]
 
@@ -149,7 +385,11 @@ def objectview(request, container, prefix=None):
         'prefixes': prefixes,
         'base_url': base_url,
         'account': account,
-        'public': public})
+        'public': public,
+        'prev_marker': prev_marker,
+        'next_marker': next_marker,
+        'sorting': sorting,
+        'thumbnails': thumbnails.available()})
 
 
 def upload(request, container, prefix=None):
@@ -172,13 +412,16 @@ def upload(request, container, prefix=None):
     max_file_size = 5 * 1024 * 1024 * 1024
     max_file_count = 1
     expires = int(time.time() + 15 * 60)
-    key = get_temp_key(storage_url, auth_token)
+    # Rejected signatures aren't redirected back, thus the cached key can't
+    # be invalidated then
+    key = get_temp_key(storage_url, auth_token, fresh=True)
     if not key:
         messages.add_message(request, messages.ERROR, _("Access denied."))
         if prefix:
-            return redirect(objectview, container=container, prefix=prefix)
+            return redirect('objectview', container=container,
+                            prefix=prefix)
         else:
-            return redirect(objectview, container=container)
+            return redirect('objectview', container=container)
 
     hmac_body = '%s\n%s\n%s\n%s\n%s' % (
         path, redirect_url, max_file_size, max_file_count, expires)
@@ -199,36 +442,409 @@ def upload(request, container, prefix=None):
         'prefixes': prefixes})
 
 
+def upload_large(request, container, prefix=None):
+    """ Display upload form for large files, uploaded in segments """
+
+    return render(request, 'upload_large.html', {
+        'container': container,
+        'prefix': prefix,
+        'prefixes': prefix_list(prefix),
+        'session': request.session})
+
+
+def upload_segments(request, container):
+    """ Returns signed urls to upload the segments of a large file """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    form = SegmentedUploadForm(request.POST or None)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+
+    url_parts = urlparse(get_base_url(request))
+    origin = '%s://%s' % (url_parts.scheme, url_parts.netloc)
+    try:
+        plan = start_upload(storage_url, auth_token, container,
+                            form.cleaned_data['name'],
+                            form.cleaned_data['size'], origin)
+    except client.ClientException:
+        plan = None
+    if not plan:
+        return JsonResponse({'error': _("Access denied.")}, status=403)
+
+    invalidate_listings(storage_url)
+    return JsonResponse(plan)
+
+
+def upload_manifest(request, container):
+    """ Creates the manifest once all segments are uploaded """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    form = ManifestForm(request.POST or None)
+    if not form.is_valid():
+        return JsonResponse({'error': form.errors}, status=400)
+
+    name = form.cleaned_data['name']
+    try:
+        finish_upload(storage_url, auth_token, container, name,
+                      form.cleaned_data['size'],
+                      form.cleaned_data['segment_size'],
+                      form.cleaned_data['timestamp'],
+                      request.POST.getlist('etag'),
+                      form.cleaned_data['content_type'] or None)
+    except (ValueError, client.ClientException):
+        return JsonResponse({'error': _("Upload failed.")}, status=400)
+
+    prefix = name[:name.rfind('/') + 1]
+    invalidate_listings(storage_url, container, prefix)
+    invalidate_listings(storage_url)
+    messages.add_message(request, messages.INFO, _("Object uploaded."))
+
+    if prefix:
+        url = reverse('objectview', kwargs={
+            'container': container, 'prefix': prefix})
+    else:
+        url = reverse('objectview', kwargs={'container': container})
+    return JsonResponse({'redirect': url})
+
+
+def upload_archive(request, container, prefix=None):
+    """ Uploads a tar archive and extracts its files into Swift """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    form = ArchiveUploadForm(request.POST or None, request.FILES or None)
+    result = None
+    if form.is_valid():
+        archive = form.cleaned_data['archive']
+        fmt = archive_format(archive.name)
+        capabilities = get_capabilities(storage_url)
+        if not fmt:
+            messages.add_message(
+                request, messages.ERROR,
+                _("Please upload a .tar, .tar.gz or .tar.bz2 archive."))
+        elif capabilities and 'bulk_upload' not in capabilities:
+            messages.add_message(
+                request, messages.ERROR,
+                _("Archive extraction is not supported by this cluster."))
+        else:
+            try:
+                result = extract_archive(storage_url, auth_token, container,
+                                         prefix, archive, fmt, archive.size)
+            except (ValueError, client.ClientException):
+                messages.add_message(request, messages.ERROR,
+                                     _("Access denied."))
+            invalidate_listings(storage_url, container)
+            invalidate_listings(storage_url)
+
+    summary = None
+    if result is not None:
+        summary = {
+            'created': result.get('Number Files Created', 0),
+            'status': result.get('Response Status', ''),
+            'body': result.get('Response Body', ''),
+            'errors': result.get('Errors', []),
+        }
+
+    return render(request, 'upload_archive.html', {
+        'form': form,
+        'summary': summary,
+        'container': container,
+        'prefix': prefix,
+        'prefixes': prefix_list(prefix),
+        'session': request.session})
+
+
 def download(request, container, objectname):
     """ Download an object from Swift """
 
     storage_url = request.session.get('storage_url', '')
     auth_token = request.session.get('auth_token', '')
+
+    if getattr(settings, 'DOWNLOAD_PROXY', False):
+        return proxy_download(request, storage_url, auth_token,
+                              container, objectname)
+
     url = swiftbrowser.utils.get_temp_url(storage_url, auth_token,
                                           container, objectname)
     if not url:
         messages.add_message(request, messages.ERROR, _("Access denied."))
-        return redirect(objectview, container=container)
+        return redirect('objectview', container=container)
 
     return redirect(url)
 
 
-def delete_object(request, container, objectname):
-    """ Deletes an object """
+def proxy_download(request, storage_url, auth_token, container, objectname):
+    """ Streams an object from Swift through Django
+
+    Range and conditional request headers are passed to Swift, thus partial
+    and resumed downloads work as well. """
+    headers = {}
+    for header in ('Range', 'If-Range', 'If-Match', 'If-None-Match',
+                   'If-Modified-Since', 'If-Unmodified-Since'):
+        value = request.META.get('HTTP_' + header.upper().replace('-', '_'))
+        if value:
+            headers[header] = value
+
+    try:
+        status, obj_headers, body = open_object(
+            storage_url, auth_token, container, objectname, headers=headers)
+    except client.ClientException as exc:
+        if exc.http_status == 304:
+            return HttpResponseNotModified()
+        if exc.http_status in (412, 416):
+            response = HttpResponse(status=exc.http_status)
+            exc_headers = getattr(exc, 'http_response_headers', None) or {}
+            if 'content-range' in exc_headers:
+                response['Content-Range'] = exc_headers['content-range']
+            return response
+        messages.add_message(request, messages.ERROR, _("Access denied."))
+        return redirect('objectview', container=container)
+
+    response = StreamingHttpResponse(
+        body, status=status, content_type=obj_headers.get(
+            'content-type', 'application/octet-stream'))
+    for header in ('content-length', 'content-range', 'accept-ranges',
+                   'etag', 'last-modified'):
+        if header in obj_headers:
+            response[header] = obj_headers[header]
+    filename = objectname.rstrip('/').split('/')[-1]
+    response['Content-Disposition'] = "attachment; filename*=UTF-8''%s" % (
+        quote(filename))
+    return response
+
+
+def download_archive(request, container, prefix=None):
+    """ Streams all objects below a pseudofolder as zip or tar archive """
 
     storage_url = request.session.get('storage_url', '')
     auth_token = request.session.get('auth_token', '')
+    prefix = prefix or ''
+    fmt = 'tar' if request.GET.get('format') == 'tar' else 'zip'
+
+    # Errors are reported before the response is started
     try:
-        client.delete_object(storage_url, auth_token, container, objectname)
-        messages.add_message(request, messages.INFO, _("Object deleted."))
+        call(client.head_container, storage_url, auth_token, container)
     except client.ClientException:
         messages.add_message(request, messages.ERROR, _("Access denied."))
+        return redirect('objectview', container=container)
+
+    if prefix:
+        root = prefix[len(parent_prefix(prefix)):]
+    else:
+        root = container + '/'
+    response = StreamingHttpResponse(
+        stream_archive(storage_url, auth_token, container, prefix, root,
+                       fmt),
+        content_type='application/zip' if fmt == 'zip' else
+        'application/x-tar')
+    response['Content-Disposition'] = "attachment; filename*=UTF-8''%s" % (
+        quote('%s.%s' % (root.rstrip('/'), fmt)))
+    return response
+
+
+def thumbnail(request, container, objectname):
+    """ Returns a JPEG thumbnail of an image object.
+
+    The object version is passed as v, thus thumbnails can be cached by
+    browsers. Access to the shared thumbnail caches is checked with a HEAD
+    on the container, which is remembered for a few minutes. """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+    if not thumbnails.available():
+        return HttpResponse(status=404)
+
+    access_key = 'swiftbrowser:thumbnail_access:%s' % sha1(repr(
+        (storage_url, auth_token, container)).encode('utf-8')).hexdigest()
+    if not cache.get(access_key):
+        try:
+            call(client.head_container, storage_url, auth_token, container)
+        except client.ClientException:
+            return HttpResponse(status=403)
+        cache.set(access_key, True, 300)
+
+    data = thumbnails.get_thumbnail(storage_url, auth_token, container,
+                                    objectname, request.GET.get('v', ''))
+    if data is None:
+        return HttpResponse(status=404)
+    response = HttpResponse(data, content_type='image/jpeg')
+    patch_cache_control(response, private=True, max_age=365 * 24 * 3600)
+    return response
+
+
+def delete_pseudofolder_job(job, storage_url, auth_token, container,
+                            prefix):
+    """ Deletes all objects below prefix, including the pseudofolder """
+    result = delete_objects(
+        storage_url, auth_token, container, prefix=prefix,
+        progress=lambda r: job.progress(r.processed, len(r.errors)))
+    job.progress(result.processed, len(result.errors))
+    invalidate_listings(storage_url, container)
+    invalidate_listings(storage_url)
+
+    if result.errors:
+        failed = ', '.join(name for name, _s in result.errors[:10])
+        raise client.ClientException(
+            _("%(count)d objects could not be deleted: %(names)s") % {
+                'count': len(result.errors), 'names': failed})
+    return _("Pseudofolder deleted (%(count)d objects).") % {
+        'count': result.succeeded}
+
+
+def delete_object(request, container, objectname):
+    """ Deletes an object or, in the background, a pseudofolder """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
     if objectname[-1] == '/':  # deleting a pseudofolder, move one level up
-        objectname = objectname[:-1]
-    prefix = '/'.join(objectname.split('/')[:-1])
+        prefix = objectname[:-1]
+    else:
+        prefix = objectname
+    prefix = '/'.join(prefix.split('/')[:-1])
     if prefix:
         prefix += '/'
-    return redirect(objectview, container=container, prefix=prefix)
+
+    if objectname[-1] == '/':
+        start_job(request, _("Deleting %s") % objectname,
+                  delete_pseudofolder_job, storage_url, auth_token,
+                  container, objectname)
+        messages.add_message(request, messages.INFO,
+                             _("Pseudofolder deletion started."))
+    else:
+        try:
+            call(client.delete_object, storage_url, auth_token,
+                 container, objectname)
+            invalidate_listings(storage_url, container, prefix)
+            invalidate_listings(storage_url)
+            messages.add_message(request, messages.INFO,
+                                 _("Object deleted."))
+        except client.ClientException:
+            messages.add_message(request, messages.ERROR,
+                                 _("Access denied."))
+    return redirect('objectview', container=container,
+                    prefix=prefix)
+
+
+def parent_prefix(objectname):
+    """ Returns the pseudofolder containing an object or pseudofolder """
+    return objectname[:objectname.rstrip('/').rfind('/') + 1]
+
+
+def copy_job(job, storage_url, auth_token, container, names, source_base,
+             dest_container, dest_base, move):
+    """ Copies or moves objects and pseudofolders server-side """
+    result = bulk_copy(
+        storage_url, auth_token, container, names, source_base,
+        dest_container, dest_base, move=move,
+        progress=lambda r: job.progress(r.processed, len(r.errors)))
+    job.progress(result.processed, len(result.errors))
+    invalidate_listings(storage_url, dest_container)
+    if move:
+        invalidate_listings(storage_url, container)
+    invalidate_listings(storage_url)
+
+    if result.errors:
+        failed = ', '.join(name for name, _s in result.errors[:10])
+        raise client.ClientException(
+            _("%(count)d objects could not be copied: %(names)s") % {
+                'count': len(result.errors), 'names': failed})
+    if move:
+        message = _("%(count)d objects moved (%(rate).0f/s).")
+    else:
+        message = _("%(count)d objects copied (%(rate).0f/s).")
+    return message % {'count': result.succeeded, 'rate': result.rate}
+
+
+def start_copy(request, container, names, source_base, dest_container,
+               dest_base, move):
+    """ Starts a copy job; returns False if names can't be copied there """
+    for name in names:
+        if name.endswith('/') and dest_container == container and \
+                copy_target(name, source_base, dest_base).startswith(name):
+            messages.add_message(
+                request, messages.ERROR,
+                _("A pseudofolder can not be copied into itself."))
+            return False
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+    description = _("Moving %s") if move else _("Copying %s")
+    start_job(request, description % ', '.join(names), copy_job,
+              storage_url, auth_token, container, names, source_base,
+              dest_container, dest_base, move)
+    messages.add_message(request, messages.INFO, _("Copying started."))
+    return True
+
+
+def copy_objects(request, container, prefix=None):
+    """ Copies or moves the selected objects and pseudofolders """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+    prefix = prefix or ''
+    # Only objects in the current folder can be selected
+    names = [name for name in (request.POST or request.GET).getlist('name')
+             if name.startswith(prefix) and name != prefix]
+    if not names:
+        messages.add_message(request, messages.ERROR,
+                             _("No objects selected."))
+        return redirect('objectview', container=container, prefix=prefix)
+
+    form = CopyForm(request.POST or None,
+                    initial={'container': container, 'folder': prefix})
+    if form.is_valid():
+        folder = form.cleaned_data['folder'].strip('/')
+        if start_copy(request, container, names, prefix,
+                      form.cleaned_data['container'],
+                      folder + '/' if folder else '',
+                      form.cleaned_data['action'] == 'move'):
+            return redirect('objectview', container=container,
+                            prefix=prefix)
+
+    try:
+        _account_stat, containers = cached_listing(storage_url, auth_token)
+    except client.ClientException as exc:
+        return containerview_failed(request, exc)
+
+    return render(request, 'copy_objects.html', {
+        'container': container,
+        'prefix': prefix,
+        'prefixes': prefix_list(prefix),
+        'names': names,
+        'containers': [c['name'] for c in containers],
+        'form': form,
+        'session': request.session})
+
+
+def rename_object(request, container, objectname):
+    """ Renames an object or pseudofolder within its container """
+
+    prefix = parent_prefix(objectname)
+    folder = objectname.endswith('/')
+    form = RenameForm(request.POST or None, initial={
+        'name': objectname[len(prefix):].rstrip('/')})
+    if form.is_valid():
+        new_name = prefix + form.cleaned_data['name'].strip('/')
+        if folder:
+            new_name += '/'
+        if new_name == objectname or start_copy(
+                request, container, [objectname], objectname, container,
+                new_name, True):
+            return redirect('objectview', container=container,
+                            prefix=prefix)
+
+    return render(request, 'rename_object.html', {
+        'container': container,
+        'objectname': objectname,
+        'prefix': prefix,
+        'prefixes': prefix_list(prefix),
+        'form': form,
+        'session': request.session})
 
 
 def toggle_public(request, container):
@@ -238,40 +854,97 @@ def toggle_public(request, container):
     auth_token = request.session.get('auth_token', '')
 
     try:
-        meta = client.head_container(storage_url, auth_token, container)
+        update_acl(storage_url, auth_token, container,
+                   lambda acl: acl.set_public(not acl.public))
     except client.ClientException:
         messages.add_message(request, messages.ERROR, _("Access denied."))
-        return redirect(containerview)
+        return redirect('containerview')
 
-    read_acl = meta.get('x-container-read', '')
-    if '.rlistings' and '.r:*' in read_acl:
-        read_acl = read_acl.replace('.r:*', '')
-        read_acl = read_acl.replace('.rlistings', '')
-        read_acl = read_acl.replace(',,', ',')
-    else:
-        read_acl += '.r:*,.rlistings'
-    headers = {'X-Container-Read': read_acl, }
+    return redirect('objectview', container=container)
 
-    try:
-        client.post_container(storage_url, auth_token, container, headers)
-    except client.ClientException:
-        messages.add_message(request, messages.ERROR, _("Access denied."))
 
-    return redirect(objectview, container=container)
+def public_container_headers(storage_url, container):
+    """ Returns (HEAD headers, listing generation) of a public container.
+
+    Headers are shared for PUBLIC_CACHE_MAX_AGE seconds, thus bursts of
+    requests only revalidate once; changes made using swiftbrowser are
+    visible immediately. The generation changes on these changes too, even
+    if they don't change the headers, eg. renames. """
+    generation = get_listing_generations(
+        [tree_generation_key(storage_url, container)])
+    key = 'swiftbrowser:public_head:%s' % sha1(repr(
+        (storage_url, container, generation)).encode('utf-8')).hexdigest()
+    headers = cache.get(key)
+    if headers is None:
+        headers = call(client.head_container, storage_url, b'', container)
+        cache.set(key, headers, getattr(settings, 'PUBLIC_CACHE_MAX_AGE', 60))
+    return headers, generation
+
+
+def public_response(response, etag):
+    """ Marks a response as cacheable by browsers and shared caches. """
+    response['ETag'] = etag
+    patch_cache_control(response, public=True,
+                        max_age=getattr(settings, 'PUBLIC_CACHE_MAX_AGE', 60))
+    # Caches may store compressed and uncompressed variants
+    patch_vary_headers(response, ('Accept-Encoding', ))
+    return response
 
 
 def public_objectview(request, account, container, prefix=None):
-    """ Returns list of all objects in current container. """
+    """ Returns list of all objects in current container.
+
+    Rendered pages are shared between all visitors, keyed by an ETag derived
+    from the container HEAD and listing generation, the prefix and the page.
+    Responses are public and don't vary on cookies, thus a CDN or reverse
+    proxy can answer most requests and revalidate using If-None-Match. """
     storage_url = settings.STORAGE_URL + account
     auth_token = b''
+    marker = request.GET.get('marker')
+    end_marker = request.GET.get('end_marker')
+    max_age = getattr(settings, 'PUBLIC_CACHE_MAX_AGE', 60)
+
+    # Pending messages are rendered for a single visitor only
+    shared = max_age and not len(messages.get_messages(request))
     try:
-        _meta, objects = client.get_container(
-            storage_url, auth_token, container, delimiter='/', prefix=prefix)
+        if shared:
+            headers, generation = public_container_headers(storage_url,
+                                                           container)
+            etag = listing_etag(storage_url, headers, container, prefix,
+                                marker, end_marker, get_base_url(request),
+                                generation)
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH',
+                                                    '')):
+                return public_response(HttpResponseNotModified(), etag)
+            key = 'swiftbrowser:public_page:%s' % etag.strip('"')
+            content = cache.get(key)
+            if content is not None:
+                return public_response(HttpResponse(content), etag)
+
+        # Listed without the cache, the page must match the ETag
+        _meta, objects, prev_marker, next_marker = get_listing_page(
+            storage_url, auth_token, container, prefix=prefix,
+            marker=marker, end_marker=end_marker, cached=not shared)
 
     except client.ClientException:
         messages.add_message(request, messages.ERROR, _("Access denied."))
-        return redirect(containerview)
-
+        return redirect('containerview')
+
+    response = render_public_objectview(request, storage_url, container,
+                                        prefix, objects, prev_marker,
+                                        next_marker)
+    if shared:
+        cache.set(key, response.content,
+                  getattr(settings, 'PUBLIC_PAGE_CACHE_TIMEOUT', 3600))
+        return public_response(response, etag)
+    if max_age:
+        add_never_cache_headers(response)
+    return response
+
+
+def render_public_objectview(request, storage_url, container, prefix,
+                             objects, prev_marker, next_marker):
+    """ Renders a page of a public object listing """
     prefixes = prefix_list(prefix)
     pseudofolders, objs = pseudofolder_object_list(objects, prefix)
     base_url = get_base_url(request)
@@ -285,7 +958,140 @@ def public_objectview(request, account, container, prefix=None):
         'prefixes': prefixes,
         'base_url': base_url,
         'storage_url': storage_url,
-        'account': account})
+        'account': account,
+        'prev_marker': prev_marker,
+        'next_marker': next_marker})
+
+
+def build_index_job(job, storage_url, auth_token, container):
+    """ Builds the search index of a container """
+    try:
+        count = get_index().build(storage_url, auth_token, container,
+                                  progress=job.progress)
+    finally:
+        cache.delete(building_key(storage_url, container))
+    return _("Search index built (%(count)d objects).") % {'count': count}
+
+
+def search(request, container):
+    """ Searches object names in a container using the local index """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+    query = request.GET.get('q', '').strip()
+
+    # The index is shared, thus access is checked using the session token
+    try:
+        headers = call(client.head_container, storage_url, auth_token,
+                       container)
+        status, stale = update_index(
+            storage_url, auth_token, container,
+            int(headers.get('x-container-object-count', 0)))
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, _("Access denied."))
+        return redirect('containerview')
+
+    if stale and cache.add(building_key(storage_url, container), True,
+                           3600):
+        start_job(request, _("Indexing container %s") % container,
+                  build_index_job, storage_url, auth_token, container)
+        status = get_index().status(storage_url, container)
+    if status is None:
+        messages.add_message(
+            request, messages.INFO,
+            _("The container is being indexed, please try again shortly."))
+
+    limit = getattr(settings, 'LISTING_PAGE_SIZE', 1000)
+    results = []
+    if status and query:
+        for name in get_index().search(status['id'], query, limit=limit):
+            results.append({'name': name,
+                            'prefix': name[:name.rfind('/') + 1]})
+
+    return render(request, 'search.html', {
+        'container': container,
+        'query': query,
+        'results': results,
+        'truncated': len(results) >= limit,
+        'indexed': status,
+        'session': request.session})
+
+
+def usage_job(job, storage_url, auth_token, container, headers):
+    """ Updates the usage report of a container """
+    try:
+        report = space_usage.update_report(
+            storage_url, auth_token, container, headers,
+            progress=job.progress)
+    finally:
+        cache.delete(space_usage.building_key(storage_url, container))
+    return _("Space usage computed (%(count)d objects).") % {
+        'count': report['count']}
+
+
+def usage(request, container, prefix=None):
+    """ Shows the space used by the pseudofolders below prefix """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+    prefix = prefix or ''
+
+    # Reports are shared, thus access is checked using the session token
+    try:
+        headers = call(client.head_container, storage_url, auth_token,
+                       container)
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR, _("Access denied."))
+        return redirect('containerview')
+
+    report = space_usage.get_report(storage_url, container)
+    current = space_usage.is_current(report, headers)
+    if not current and cache.add(
+            space_usage.building_key(storage_url, container), True, 3600):
+        start_job(request, _("Computing space usage of %s") % container,
+                  usage_job, storage_url, auth_token, container, headers)
+        report = space_usage.get_report(storage_url, container)
+        current = space_usage.is_current(report, headers)
+    if report is None:
+        messages.add_message(
+            request, messages.INFO,
+            _("The space usage is being computed, please try again "
+              "shortly."))
+        return render(request, 'usage.html', {
+            'container': container,
+            'prefix': prefix,
+            'prefixes': prefix_list(prefix),
+            'session': request.session})
+
+    folders, (object_count, object_bytes) = space_usage.folder_usage(
+        report, prefix)
+    if prefix:
+        total_count, total_bytes = report['prefixes'].get(prefix, (0, 0))
+    else:
+        total_count, total_bytes = report['count'], report['bytes']
+
+    rows = []
+    for name, count, size in folders:
+        rows.append({
+            'prefix': name,
+            'display_name': name[len(prefix):].rstrip('/'),
+            'count': count,
+            'bytes': size,
+            'percent': 100.0 * size / total_bytes if total_bytes else 0})
+
+    return render(request, 'usage.html', {
+        'container': container,
+        'prefix': prefix,
+        'prefixes': prefix_list(prefix),
+        'folders': rows,
+        'object_count': object_count,
+        'object_bytes': object_bytes,
+        'total_count': total_count,
+        'total_bytes': total_bytes,
+        'largest': space_usage.largest_folders(report, prefix),
+        'updated': datetime.fromtimestamp(report['updated'], timezone.utc),
+        'current': current,
+        'session': request.session})
 
 
 def tempurl(request, container, objectname):
@@ -299,7 +1105,7 @@ def tempurl(request, container, objectname):
 
     if not url:
         messages.add_message(request, messages.ERROR, _("Access denied."))
-        return redirect(objectview, container=container)
+        return redirect('objectview', container=container)
 
     prefix = '/'.join(objectname.split('/')[:-1])
     if prefix:
@@ -316,6 +1122,101 @@ def tempurl(request, container, objectname):
         'session': request.session})
 
 
+class Echo(object):
+    """ File-like object returning what is written, used to stream CSV """
+
+    def write(self, value):
+        return value
+
+
+def temp_url_rows(signer, pages):
+    """ Yields (name, temp url) of all objects in listing pages. """
+    for page in pages:
+        for obj in page:
+            if obj.get('content_type') not in DIRECTORY_TYPES:
+                yield obj['name'], signer.sign(obj['name'])
+
+
+def stream_csv(rows, signer):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['name', 'url', 'method', 'expires'])
+    for name, url in rows:
+        yield writer.writerow([name, url, signer.method, signer.expires])
+
+
+def stream_json(rows, signer):
+    yield '{"method": %s, "expires": %d, "objects": [' % (
+        json.dumps(signer.method), signer.expires)
+    separator = ''
+    for name, url in rows:
+        yield '%s\n{"name": %s, "url": %s}' % (
+            separator, json.dumps(name), json.dumps(url))
+        separator = ','
+    yield '\n]}\n'
+
+
+def tempurls(request, container, prefix=None):
+    """ Signs temporary URLs for all objects below a prefix.
+
+    URLs are streamed as CSV or JSON while the container is listed; the
+    account key is read once. If the cluster supports it a single URL
+    valid for the whole prefix can be signed instead. """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+    prefix = prefix or ''
+
+    capabilities = get_capabilities(storage_url)
+    prefix_supported = temp_url_prefix_supported(capabilities)
+    form = TempURLsForm(request.GET or None,
+                        methods=temp_url_methods(capabilities),
+                        prefix_scope=prefix_supported)
+    if form.is_valid():
+        data = form.cleaned_data
+        key = get_temp_key(storage_url, auth_token)
+        if not key:
+            messages.add_message(request, messages.ERROR,
+                                 _("Access denied."))
+            return redirect('objectview', container=container)
+        signer = TempURLSigner(key, storage_url, container, data['expires'],
+                               data['method'])
+
+        if data['scope'] == 'prefix':
+            rows = [(prefix, signer.sign_prefix(prefix))]
+        else:
+            pages = iter_listing_pages(storage_url, auth_token, container,
+                                       prefix=prefix)
+            # Errors are reported before the response is started
+            try:
+                first = next(pages, [])
+            except client.ClientException:
+                messages.add_message(request, messages.ERROR,
+                                     _("Access denied."))
+                return redirect('objectview', container=container)
+            rows = temp_url_rows(signer, itertools.chain([first], pages))
+
+        if data['format'] == 'csv':
+            response = StreamingHttpResponse(
+                stream_csv(rows, signer), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(
+                stream_json(rows, signer), content_type='application/json')
+        filename = '%s-tempurls.%s' % (
+            (container + '/' + prefix).rstrip('/').replace('/', '-'),
+            data['format'])
+        response['Content-Disposition'] = \
+            "attachment; filename*=UTF-8''%s" % quote(filename)
+        return response
+
+    return render(request, 'tempurls.html', {
+        'container': container,
+        'prefix': prefix,
+        'prefixes': prefix_list(prefix),
+        'form': form,
+        'prefix_supported': prefix_supported,
+        'session': request.session})
+
+
 def create_pseudofolder(request, container, prefix=None):
     """ Creates a pseudofolder (empty object of type application/directory) """
     storage_url = request.session.get('storage_url', '')
@@ -334,124 +1235,62 @@ def create_pseudofolder(request, container, prefix=None):
         obj = None
 
         try:
-            client.put_object(storage_url, auth_token,
-                              container, foldername, obj,
-                              content_type=content_type)
+            call(client.put_object, storage_url, auth_token,
+                 container, foldername, obj, content_type=content_type)
+            parent = foldername[:-1].rpartition('/')[0]
+            invalidate_listings(
+                storage_url, container, parent + '/' if parent else '')
+            invalidate_listings(storage_url)
             messages.add_message(request, messages.INFO,
                                  _("Pseudofolder created."))
         except client.ClientException:
             messages.add_message(request, messages.ERROR, _("Access denied."))
 
         if prefix:
-            return redirect(objectview, container=container, prefix=prefix)
-        return redirect(objectview, container=container)
+            return redirect('objectview', container=container,
+                            prefix=prefix)
+        return redirect('objectview', container=container)
 
     return render(request, 'create_pseudofolder.html', {
         'container': container, 'prefix': prefix})
 
 
-def get_acls(storage_url, auth_token, container):
-    """ Returns ACLs of given container. """
-    cont = client.head_container(storage_url, auth_token, container)
-    readers = cont.get('x-container-read', '')
-    writers = cont.get('x-container-write', '')
-    return (readers, writers)
-
-
-def remove_duplicates_from_acl(acls):
-    """ Removes possible duplicates from a comma-separated list. """
-    entries = acls.split(',')
-    cleaned_entries = list(set(entries))
-    acls = ','.join(cleaned_entries)
-    return acls
-
-
 def edit_acl(request, container):
     """ Edit ACLs on given container. """
 
     storage_url = request.session.get('storage_url', '')
     auth_token = request.session.get('auth_token', '')
 
-    if request.method == 'POST':
-        form = AddACLForm(request.POST)
-        if form.is_valid():
-            username = form.cleaned_data['username']
-
-            (readers, writers) = get_acls(
-                storage_url, auth_token, container)
-
-            readers = remove_duplicates_from_acl(readers)
-            writers = remove_duplicates_from_acl(writers)
-
-            if form.cleaned_data['read']:
-                readers += ",%s" % username
-
-            if form.cleaned_data['write']:
-                writers += ",%s" % username
-
-            headers = {'X-Container-Read': readers,
-                       'X-Container-Write': writers}
-            try:
-                client.post_container(
-                    storage_url, auth_token, container, headers)
-                message = "ACLs updated."
-                messages.add_message(request, messages.INFO, message)
-            except client.ClientException:
-                message = "ACL update failed"
-                messages.add_message(request, messages.ERROR, message)
-
-    if request.method == 'GET':
-        delete = request.GET.get('delete', None)
-        if delete:
-            users = delete.split(',')
-
-            (readers, writers) = get_acls(storage_url, auth_token, container)
-
-            new_readers = ""
-            for element in readers.split(','):
-                if element not in users:
-                    new_readers += element
-                    new_readers += ","
-
-            new_writers = ""
-            for element in writers.split(','):
-                if element not in users:
-                    new_writers += element
-                    new_writers += ","
-
-            headers = {'X-Container-Read': new_readers,
-                       'X-Container-Write': new_writers}
-            try:
-                client.post_container(storage_url, auth_token,
-                                      container, headers)
-                message = "ACL removed."
-                messages.add_message(request, messages.INFO, message)
-            except client.ClientException:
-                message = "ACL update failed."
-                messages.add_message(request, messages.ERROR, message)
-
-    (readers, writers) = get_acls(storage_url, auth_token, container)
-
-    acls = {}
-
-    if readers != "":
-        readers = remove_duplicates_from_acl(readers)
-        for entry in readers.split(','):
-            acls[entry] = {}
-            acls[entry]['read'] = True
-            acls[entry]['write'] = False
-
-    if writers != "":
-        writers = remove_duplicates_from_acl(writers)
-        for entry in writers.split(','):
-            if entry not in acls:
-                acls[entry] = {}
-                acls[entry]['read'] = False
-            acls[entry]['write'] = True
+    acl = None
+    try:
+        if request.method == 'POST':
+            form = AddACLForm(request.POST)
+            if form.is_valid():
+                entries = split_entries(form.cleaned_data['username'])
+                acl, _changed = update_acl(
+                    storage_url, auth_token, container,
+                    lambda acl: acl.grant(entries,
+                                          read=form.cleaned_data['read'],
+                                          write=form.cleaned_data['write']))
+                messages.add_message(request, messages.INFO,
+                                     _("ACLs updated."))
+
+        if request.method == 'GET' and request.GET.get('delete'):
+            entries = split_entries(request.GET['delete'])
+            acl, _changed = update_acl(storage_url, auth_token, container,
+                                       lambda acl: acl.revoke(entries))
+            messages.add_message(request, messages.INFO, _("ACL removed."))
+    except client.ClientException:
+        messages.add_message(request, messages.ERROR,
+                             _("ACL update failed."))
 
-    public = False
-    if acls.get('.r:*', False) and acls.get('.rlistings', False):
-        public = True
+    if acl is None:
+        try:
+            acl = get_acl(storage_url, auth_token, container)
+        except client.ClientException:
+            messages.add_message(request, messages.ERROR,
+                                 _("Access denied."))
+            return redirect('containerview')
 
     if request.is_secure():
         base_url = "https://%s" % request.get_host()
@@ -462,6 +1301,80 @@ def edit_acl(request, container):
         'container': container,
         'account': storage_url.split('/')[-1],
         'session': request.session,
-        'acls': acls,
-        'public': public,
+        'acls': acl.entries(),
+        'public': acl.public,
         'base_url': base_url})
+
+
+def batch_acl_job(job, storage_url, auth_token, containers, entries, read,
+                  write, revoke):
+    """ Grants or revokes ACL entries on several containers """
+    if revoke:
+        def change(acl):
+            acl.revoke(entries, read=read, write=write)
+    else:
+        def change(acl):
+            acl.grant(entries, read=read, write=write)
+
+    changed, failed = update_acls(storage_url, auth_token, containers,
+                                  change, progress=job.progress)
+    invalidate_listings(storage_url)
+    if failed:
+        raise client.ClientException(
+            _("ACL update failed for %(failed)s.") % {
+                'failed': ', '.join(sorted(failed))})
+    return _("ACLs of %(changed)d of %(count)d containers changed.") % {
+        'changed': len(changed), 'count': len(containers)}
+
+
+def batch_acl(request):
+    """ Edit ACLs of several containers at once. """
+
+    storage_url = request.session.get('storage_url', '')
+    auth_token = request.session.get('auth_token', '')
+
+    try:
+        _account_stat, containers = cached_listing(storage_url, auth_token)
+    except client.ClientException as exc:
+        return containerview_failed(request, exc)
+    names = [container['name'] for container in containers]
+
+    form = BatchACLForm(request.POST or None, containers=names)
+    if form.is_valid():
+        selected = form.cleaned_data['containers']
+        start_job(request,
+                  _("Updating ACLs of %d containers") % len(selected),
+                  batch_acl_job, storage_url, auth_token, selected,
+                  split_entries(form.cleaned_data['username']),
+                  form.cleaned_data['read'], form.cleaned_data['write'],
+                  form.cleaned_data['action'] == 'revoke')
+        return redirect('containerview')
+
+    return render(request, 'batch_acl.html', {
+        'form': form,
+        'containers': names,
+        'session': request.session})
+
+
+def metrics_view(request):
+    """ Returns Prometheus metrics of this process.
+
+    Only clients listed in METRICS_ALLOWED_IPS may read the metrics. """
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if '*' not in allowed and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponse(status=403)
+
+    stats = pool.stats()
+    extra = (
+        ('swiftbrowser_pool_hits_total', 'counter',
+         'Swift connections reused from the pool.', stats['hits']),
+        ('swiftbrowser_pool_misses_total', 'counter',
+         'New Swift connections.', stats['misses']),
+        ('swiftbrowser_pool_discarded_total', 'counter',
+         'Swift connections closed.', stats['discarded']),
+        ('swiftbrowser_pool_idle_connections', 'gauge',
+         'Idle Swift connections in the pool.', stats['idle']),
+    )
+    return HttpResponse(metrics.export(extra),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
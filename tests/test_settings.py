@@ -6,3 +6,6 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
     }
 }
+
+# Run background jobs inline
+JOB_WORKERS = 0
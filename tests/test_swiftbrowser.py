@@ -1,14 +1,45 @@
 #!/usr/bin/python
 # -*- coding: utf8 -*-
 
+import asyncio
+import csv
+import datetime
+import hashlib
+import hmac
+import io
+import json
 import mock
 import random
-
-from django.test import TestCase
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from unittest import skipUnless
+from urllib.parse import urlparse
+
+import django
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.template.defaultfilters import filesizeformat
+from django.utils.formats import date_format
+from django.utils.timezone import get_current_timezone
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 import swiftclient
 import swiftbrowser
+import swiftbrowser.async_views
+import swiftbrowser.bulk
+import swiftbrowser.connection
+import swiftbrowser.jobs
+import swiftbrowser.metrics
+import swiftbrowser.sorting
+import swiftbrowser.thumbnails
 
 
 class MockTest(TestCase):
@@ -16,6 +47,18 @@ class MockTest(TestCase):
 
     All calls using python-swiftclient.clients are replaced using mock """
 
+    def setUp(self):
+        cache.clear()
+        swiftbrowser.utils._temp_keys.clear()
+
+    def login(self, storage_url, auth_token):
+        session = self.client.session
+        session['storage_url'] = storage_url
+        session['auth_token'] = auth_token
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = \
+            session.session_key
+
     def test_container_view(self):
         swiftclient.client.get_account = mock.Mock(
             return_value=[{}, []],
@@ -33,7 +76,8 @@ class MockTest(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertTrue(b"Container listing failed" in resp.content)
 
-        swiftclient.client.get_account = mock.Mock(return_value=[{}, []])
+        swiftclient.client.get_account = mock.Mock(return_value=[{}, [
+            {'name': settings.THUMBNAIL_CONTAINER}]])
 
         resp = self.client.get(reverse('containerview'))
         self.assertEqual(resp.context['containers'], [])
@@ -79,6 +123,38 @@ class MockTest(TestCase):
         self.assertEqual(resp.status_code, 302)
         self.assertEqual(resp['Location'], '/')
 
+    def test_delete_pseudofolder_job(self):
+        self.login('http://127.0.0.1:8080/v1/AUTH_test', 'token')
+        objects = [{'name': 'pre/'}, {'name': 'pre/fix'}]
+        with mock.patch('swiftclient.client.get_capabilities',
+                        return_value={}), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)) as get_container, \
+                mock.patch('swiftclient.client.delete_object') as delete:
+            resp = self.client.get(reverse('delete_object', kwargs={
+                                           'container': 'container',
+                                           'objectname': 'pre/'}))
+            self.assertEqual(resp['Location'], '/objects/container/')
+            self.assertEqual(get_container.call_args[1]['prefix'], 'pre/')
+            self.assertEqual(delete.call_count, 2)
+
+            resp = self.client.get(resp['Location'])
+            self.assertContains(resp, 'data-job-url')
+
+        job_id = self.client.session['jobs'][0]
+        resp = self.client.get(reverse('job_status',
+                                       kwargs={'job_id': job_id}))
+        self.assertEqual(resp.json()['status'], 'done')
+        self.assertEqual(resp.json()['processed'], 2)
+        self.assertNotIn('owner', resp.json())
+        self.assertEqual(self.client.session['jobs'], [])
+
+        # Jobs are only visible to their owner
+        self.login('http://127.0.0.1:8080/v1/AUTH_other', 'token')
+        resp = self.client.get(reverse('job_status',
+                                       kwargs={'job_id': job_id}))
+        self.assertEqual(resp.status_code, 404)
+
     def test_objectview(self):
         swiftclient.client.get_container = mock.Mock(
             return_value=[{}, []],
@@ -98,6 +174,7 @@ class MockTest(TestCase):
                                kwargs={'container': 'container'}))
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.context['folders'], [('pre/', 'pre')])
+        self.assertContains(resp, 'Delete folder pre and all objects below')
 
         resp = self.client.get(reverse('objectview',
                                kwargs={'container': 'container',
@@ -107,26 +184,282 @@ class MockTest(TestCase):
         self.assertEqual(resp.context['folders'], [])
         self.assertEqual(resp.context['prefix'], 'pre/')
 
+    def test_pseudofolder_object_list(self):
+        objects = [{'subdir': 'pre/a/'},
+                   {'name': 'pre/a/', 'content_type': 'application/directory'},
+                   {'name': 'pre/obj', 'bytes': 2048,
+                    'last_modified': '2020-01-31T12:34:56.123456'},
+                   {'name': 'pre/old', 'last_modified': 'invalid'}]
+        folders, objs = swiftbrowser.utils.pseudofolder_object_list(
+            objects, 'pre/')
+        self.assertEqual(folders, [('pre/a/', 'pre/a/')])
+        self.assertEqual(folders[0].display_name, 'a')
+        self.assertEqual([o.display_name for o in objs], ['obj', 'old'])
+        self.assertEqual(objs[0].last_modified, datetime.datetime(
+            2020, 1, 31, 12, 34, 56, 123456, tzinfo=datetime.timezone.utc))
+        self.assertEqual(objs[0].size, filesizeformat(2048))
+        self.assertEqual(objs[0].modified, date_format(
+            objs[0].last_modified.astimezone(get_current_timezone()),
+            'SHORT_DATETIME_FORMAT'))
+        self.assertEqual(objs[1].modified, '')
+        self.assertIsNone(objs[1].last_modified)
+        self.assertEqual(swiftbrowser.utils.parse_timestamp(
+            '2020-01-31T12:34:56').microsecond, 0)
+
+    def test_objectview_pagination(self):
+        objects = [{'name': 'a'}, {'subdir': 'b/'}, {'name': 'c'}]
+        swiftclient.client.get_container = mock.Mock(
+            return_value=({}, objects))
+
+        with self.settings(LISTING_PAGE_SIZE=2):
+            resp = self.client.get(reverse('objectview',
+                                   kwargs={'container': 'container'}))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['objects']), 1)
+        self.assertIsNone(resp.context['prev_marker'])
+        self.assertEqual(resp.context['next_marker'], 'b/')
+        self.assertContains(resp, '?marker=b/')
+        swiftclient.client.get_container.assert_called_with(
+            '', '', 'container', marker=None, limit=3, prefix=None,
+            delimiter='/')
+
+        swiftclient.client.get_container = mock.Mock(
+            return_value=({}, [{'name': 'c'}]))
+        with self.settings(LISTING_PAGE_SIZE=2):
+            resp = self.client.get(reverse('objectview',
+                                   kwargs={'container': 'container'}),
+                                   {'marker': 'b/'})
+        self.assertEqual(resp.context['prev_marker'], 'c')
+        self.assertIsNone(resp.context['next_marker'])
+
+    def test_sorted_objectview(self):
+        objects = [{'name': 'pre/%d' % i, 'bytes': i % 7,
+                    'last_modified': '2020-01-01T00:00:%02d.000000' % i}
+                   for i in range(20)]
+        objects.append({'name': 'pre/dir/', 'bytes': 100,
+                        'content_type': 'application/directory'})
+        with mock.patch('swiftclient.client.head_container',
+                        return_value={}), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)) as get, \
+                self.settings(LISTING_PAGE_SIZE=3):
+            resp = self.client.get(
+                reverse('objectview', args=['c', 'pre/']),
+                {'sort': 'size', 'order': 'desc'})
+            self.assertEqual([o.name for o in resp.context['objects']],
+                             ['pre/6', 'pre/13', 'pre/5'])
+            self.assertEqual(resp.context['objects'][0].display_name, '6')
+            self.assertEqual(resp.context['sorting']['next_offset'], 3)
+            self.assertIsNone(resp.context['sorting']['prev_offset'])
+            self.assertEqual(get.call_args[1]['prefix'], 'pre/')
+            self.assertIsNone(get.call_args[1]['delimiter'])
+
+            # Pages beyond the heap size are merged from sorted runs
+            with self.settings(SORT_BUFFER_SIZE=4):
+                resp = self.client.get(
+                    reverse('objectview', args=['c', 'pre/']),
+                    {'sort': 'last_modified', 'offset': 18})
+            self.assertEqual([o.name for o in resp.context['objects']],
+                             ['pre/18', 'pre/19'])
+            self.assertEqual(resp.context['sorting']['prev_offset'], 15)
+            self.assertIsNone(resp.context['sorting']['next_offset'])
+
+    def test_sorted_objects(self):
+        objects = [{'name': str(i), 'content_type': 'type/%d' % (i % 3)}
+                   for i in range(10)]
+        expected = sorted(objects, key=lambda o: (o['content_type'],
+                                                  o['name']), reverse=True)
+        result = swiftbrowser.sorting.sorted_objects(
+            iter(objects), 'content_type', reverse=True, buffer_size=3)
+        self.assertEqual(list(result), expected)
+        self.assertEqual(swiftbrowser.sorting.top_objects(
+            iter(objects), 'content_type', reverse=True, count=4),
+            expected[:4])
+
+    def test_get_listing_page_backwards(self):
+        # Reverse listing returns entries before the end_marker
+        objects = [{'name': 'e'}, {'name': 'd'}, {'name': 'c'}]
+        swiftclient.client.get_container = mock.Mock(
+            return_value=({}, objects))
+        _meta, objs, prev_marker, next_marker = \
+            swiftbrowser.utils.get_listing_page(
+                '', '', 'container', end_marker='f', limit=2)
+        self.assertEqual(objs, [{'name': 'd'}, {'name': 'e'}])
+        self.assertEqual(prev_marker, 'd')
+        self.assertEqual(next_marker, 'e')
+        swiftclient.client.get_container.assert_called_with(
+            '', '', 'container', marker='f', limit=3, prefix=None,
+            delimiter='/', query_string='reverse=on')
+
+        # No more entries before the first page: list from the start
+        swiftclient.client.get_container = mock.Mock(
+            return_value=({}, [{'name': 'a'}]))
+        _meta, objs, prev_marker, next_marker = \
+            swiftbrowser.utils.get_listing_page(
+                '', '', 'container', end_marker='b', limit=2)
+        self.assertEqual(objs, [{'name': 'a'}])
+        self.assertIsNone(prev_marker)
+        self.assertIsNone(next_marker)
+
+    def test_listing_cache(self):
+        swiftclient.client.get_container = mock.Mock(
+            return_value=({}, [{'name': 'pre/fix'}]))
+        swiftclient.client.delete_object = mock.Mock()
+        swiftclient.client.put_object = mock.Mock()
+        url = reverse('objectview', kwargs={'container': 'container',
+                                            'prefix': 'pre/'})
+
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(swiftclient.client.get_container.call_count, 1)
+
+        # Modifying another prefix keeps the cached listing
+        self.client.post(reverse('create_pseudofolder',
+                                 kwargs={'container': 'container'}),
+                         {'foldername': 'other'})
+        self.client.get(url)
+        self.assertEqual(swiftclient.client.get_container.call_count, 1)
+
+        self.client.get(reverse('delete_object', kwargs={
+                                'container': 'container',
+                                'objectname': 'pre/fix'}))
+        self.client.get(url)
+        self.assertEqual(swiftclient.client.get_container.call_count, 2)
+
+        self.client.post(reverse('create_pseudofolder',
+                                 kwargs={'container': 'container',
+                                         'prefix': 'pre/'}),
+                         {'foldername': 'sub'})
+        self.client.get(url)
+        self.assertEqual(swiftclient.client.get_container.call_count, 3)
+
+        # Formpost redirects invalidate the listing of the upload prefix
+        self.client.get(url, {'status': '201'})
+        self.assertEqual(swiftclient.client.get_container.call_count, 4)
+
+    def test_listing_cache_parents(self):
+        swiftclient.client.get_container = mock.Mock(
+            return_value=({}, [{'subdir': 'a/b/'}]))
+        swiftclient.client.delete_object = mock.Mock()
+        url = reverse('objectview', kwargs={'container': 'container',
+                                            'prefix': 'a/'})
+
+        self.client.get(url)
+        self.assertEqual(swiftclient.client.get_container.call_count, 1)
+
+        # Deleting the last object removes the pseudofolder of the parent
+        swiftclient.client.get_container.return_value = ({}, [])
+        self.client.get(reverse('delete_object', kwargs={
+                                'container': 'container',
+                                'objectname': 'a/b/obj'}))
+        resp = self.client.get(url)
+        self.assertEqual(swiftclient.client.get_container.call_count, 2)
+        self.assertEqual(list(resp.context['objects']), [])
+
     def test_upload_form(self):
         swiftclient.client.get_container = mock.Mock(
             side_effect=swiftclient.client.ClientException(''))
         swiftclient.client.post_account = mock.Mock(
             side_effect=swiftclient.client.ClientException(''))
 
-        account = [{}, ]
-        swiftclient.client.get_account = mock.Mock(return_value=(account))
+        swiftclient.client.head_account = mock.Mock(return_value={})
 
         resp = self.client.get(reverse('upload',
                                kwargs={'container': 'container'}))
         self.assertEqual(resp['Location'], '/objects/container/')
 
-        account = [{'x-account-meta-temp-url-key': 'dummy'}, ]
-        swiftclient.client.get_account = mock.Mock(return_value=(account))
+        account = {'x-account-meta-temp-url-key': 'dummy'}
+        swiftclient.client.head_account = mock.Mock(return_value=account)
 
         resp = self.client.get(reverse('upload',
                                kwargs={'container': 'container'}))
         self.assertEqual(resp.status_code, 200)
 
+        # Forms are signed with the current key, even if another is cached
+        account['x-account-meta-temp-url-key'] = 'rotated'
+        resp = self.client.get(reverse('upload',
+                               kwargs={'container': 'container'}))
+        self.assertEqual(resp.context['signature'], hmac.new(
+            b'rotated', '\n'.join((
+                urlparse(resp.context['swift_url']).path,
+                resp.context['redirect_url'],
+                str(resp.context['max_file_size']), '1',
+                str(resp.context['expires']))).encode('utf-8'),
+            hashlib.sha1).hexdigest())
+
+    def test_upload_large(self):
+        self.login('http://swift/v1/AUTH_test', 'token')
+        account = {'x-account-meta-temp-url-key': 'dummy'}
+        mb = 1024 * 1024
+        with mock.patch('swiftclient.client.head_account',
+                        return_value=account), \
+                mock.patch('swiftclient.client.put_container') as put_c, \
+                mock.patch('swiftclient.client.put_object') as put_o, \
+                mock.patch('swiftbrowser.uploads.get_capabilities',
+                           return_value={'slo': {
+                               'max_manifest_segments': 2}}), \
+                self.settings(SEGMENT_SIZE=mb):
+            resp = self.client.get(reverse('upload_large', args=['c']))
+            self.assertContains(resp, reverse('upload_segments', args=['c']))
+
+            resp = self.client.post(
+                reverse('upload_segments', args=['c']),
+                {'name': 'dir/big file', 'size': 3 * mb})
+            self.assertEqual(resp.status_code, 200)
+            plan = resp.json()
+            # Two segments at most, thus the segment size is raised
+            self.assertEqual(plan['segment_size'], 3 * mb // 2)
+            self.assertEqual([(s['offset'], s['size'])
+                              for s in plan['segments']],
+                             [(0, 3 * mb // 2), (3 * mb // 2, 3 * mb // 2)])
+            self.assertIn('/v1/AUTH_test/c_segments/dir/big%20file/slo/',
+                          plan['segments'][0]['url'])
+            self.assertEqual(put_c.call_args[0][2], 'c_segments')
+
+            data = {'name': 'dir/big file', 'size': 3 * mb,
+                    'segment_size': plan['segment_size'],
+                    'timestamp': plan['timestamp'],
+                    'etag': ['a' * 32]}
+            resp = self.client.post(reverse('upload_manifest', args=['c']),
+                                    data)
+            self.assertEqual(resp.status_code, 400)
+            self.assertFalse(put_o.called)
+
+            data['etag'] = ['a' * 32, 'b' * 32]
+            resp = self.client.post(reverse('upload_manifest', args=['c']),
+                                    data)
+            self.assertEqual(resp.json()['redirect'], '/objects/c/dir/')
+            args, kwargs = put_o.call_args
+            self.assertEqual(args[2:4], ('c', 'dir/big file'))
+            self.assertEqual(kwargs['query_string'], 'multipart-manifest=put')
+            manifest = json.loads(kwargs['contents'])
+            self.assertEqual(manifest[1], {
+                'path': '/c_segments/dir/big file/slo/%s/%d/%d/00000001' % (
+                    plan['timestamp'], 3 * mb, 3 * mb // 2),
+                'etag': 'b' * 32,
+                'size_bytes': 3 * mb // 2})
+
+    def test_upload_archive(self):
+        result = {'Number Files Created': 2, 'Response Status': '201 Created',
+                  'Errors': []}
+        archive = SimpleUploadedFile('files.tar.gz', b'data')
+        with mock.patch('swiftbrowser.views.get_capabilities',
+                        return_value={'bulk_upload': {}}), \
+                mock.patch('swiftbrowser.views.extract_archive',
+                           return_value=result) as extract:
+            resp = self.client.post(
+                reverse('upload_archive', args=['c', 'dir/']),
+                {'archive': archive})
+            self.assertEqual(resp.context['summary']['created'], 2)
+            self.assertEqual(extract.call_args[0][2:4], ('c', 'dir/'))
+            self.assertEqual(extract.call_args[0][5:], ('tar.gz', 4))
+
+            resp = self.client.post(
+                reverse('upload_archive', args=['c']),
+                {'archive': SimpleUploadedFile('files.zip', b'data')})
+            self.assertIsNone(resp.context['summary'])
+            self.assertEqual(extract.call_count, 1)
+
     def test_download(self):
         swiftbrowser.utils.get_temp_url = mock.Mock(return_value="http://url")
 
@@ -142,6 +475,47 @@ class MockTest(TestCase):
         self.assertEqual(resp.status_code, 302)
         self.assertEqual(resp['Location'], '/objects/container/')
 
+    def test_proxy_download(self):
+        body = mock.MagicMock()
+        body.__iter__.return_value = iter([b'a', b'b'])
+
+        def get_object(url, token, container, name, **kwargs):
+            kwargs['response_dict']['status'] = 206
+            headers = {'content-type': 'text/plain', 'content-length': '2',
+                       'content-range': 'bytes 0-1/10', 'etag': 'abc'}
+            return headers, body
+
+        get_object = mock.Mock(side_effect=get_object)
+        with self.settings(DOWNLOAD_PROXY=True), \
+                mock.patch('swiftclient.client.get_object', get_object):
+            resp = self.client.get(reverse('download', kwargs={
+                                           'container': 'container',
+                                           'objectname': 'pre/tést'}),
+                                   HTTP_RANGE='bytes=0-1')
+            self.assertEqual(resp.status_code, 206)
+            self.assertEqual(b''.join(resp.streaming_content), b'ab')
+            self.assertTrue(body.close.called)
+            self.assertEqual(resp['Content-Range'], 'bytes 0-1/10')
+            self.assertEqual(resp['Content-Disposition'],
+                             "attachment; filename*=UTF-8''t%C3%A9st")
+            self.assertEqual(get_object.call_args[1]['headers'],
+                             {'Range': 'bytes=0-1'})
+
+            get_object.side_effect = swiftclient.client.ClientException(
+                '', http_status=304)
+            resp = self.client.get(reverse('download', kwargs={
+                                           'container': 'container',
+                                           'objectname': 'testfile'}),
+                                   HTTP_IF_NONE_MATCH='abc')
+            self.assertEqual(resp.status_code, 304)
+
+            get_object.side_effect = swiftclient.client.ClientException(
+                '', http_status=404)
+            resp = self.client.get(reverse('download', kwargs={
+                                           'container': 'container',
+                                           'objectname': 'testfile'}))
+            self.assertEqual(resp['Location'], '/objects/container/')
+
     def test_replace_hyphens(self):
         old = {'test-key': 'test-value'}
         new = swiftbrowser.utils.replace_hyphens(old)
@@ -166,6 +540,53 @@ class MockTest(TestCase):
         resp = self.client.get(reverse('login'))
         self.assertTemplateUsed(resp, 'login.html')
 
+    def test_login_keystone_v3(self):
+        expires = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        resp = mock.Mock(status_code=201, reason='Created',
+                         headers={'X-Subject-Token': 'token1'})
+        resp.json.return_value = {'token': {
+            'expires_at': expires.strftime('%Y-%m-%dT%H:%M:%S.000000Z'),
+            'catalog': [
+                {'type': 'identity', 'endpoints': [
+                    {'interface': 'public', 'url': 'http://keystone'}]},
+                {'type': 'object-store', 'endpoints': [
+                    {'interface': 'internal', 'region_id': 'one',
+                     'url': 'http://internal/v1/AUTH_p'},
+                    {'interface': 'public', 'region_id': 'one',
+                     'url': 'http://one/v1/AUTH_p'},
+                    {'interface': 'public', 'region_id': 'two',
+                     'url': 'http://two/v1/AUTH_p'}]}]}}
+        credentials = {'username': 'project:user', 'password': 'secret'}
+        with mock.patch('requests.Session.post',
+                        return_value=resp) as post, \
+                self.settings(SWIFT_AUTH_VERSION='3',
+                              SWIFT_AUTH_URL='http://keystone/v3',
+                              SWIFT_REGION_NAME='two'):
+            self.client.post(reverse('login'), credentials)
+            self.assertEqual(self.client.session['auth_token'], 'token1')
+            self.assertEqual(self.client.session['storage_url'],
+                             'http://two/v1/AUTH_p')
+            self.assertEqual(post.call_args[0][0],
+                             'http://keystone/v3/auth/tokens')
+            auth = post.call_args[1]['json']['auth']
+            self.assertEqual(auth['scope']['project']['name'], 'project')
+            self.assertEqual(
+                auth['identity']['password']['user']['name'], 'user')
+
+            # Tokens are reused until they are about to expire
+            self.client.post(reverse('login'), credentials)
+            self.assertEqual(post.call_count, 1)
+            with self.settings(TOKEN_REFRESH_MARGIN=7200):
+                self.client.post(reverse('login'), credentials)
+            self.assertEqual(post.call_count, 2)
+
+            # Other passwords are not served from the cache
+            resp.status_code = 401
+            resp = self.client.post(reverse('login'), {
+                'username': 'project:user', 'password': 'wrong'})
+            self.assertContains(resp, "Login failed")
+            self.assertEqual(post.call_count, 3)
+
     def test_delete(self):
         swiftclient.client.delete_object = mock.Mock(
             side_effect=swiftclient.client.ClientException(''))
@@ -206,9 +627,10 @@ class MockTest(TestCase):
         self.assertEqual(response.status_code, 302)
 
         swiftclient.client.post_container.assert_called_with(
-            '', '', 'container', {'X-Container-Read': 'x,'})
+            '', '', 'container', {'X-Container-Read': 'x'})
 
     def test_public_objectview(self):
+        swiftclient.client.head_container = mock.Mock(return_value={})
         swiftclient.client.get_container = mock.Mock(
             side_effect=swiftclient.client.ClientException(''))
         resp = self.client.get(reverse('public_objectview',
@@ -250,8 +672,7 @@ class MockTest(TestCase):
         self.assertIsNone(swiftbrowser.utils.get_temp_key("dummy", ''))
 
         # Authorized, no temp url key set
-        account = [{}, ]
-        swiftclient.client.get_account = mock.Mock(return_value=(account))
+        swiftclient.client.head_account = mock.Mock(return_value={})
         swiftclient.client.post_account = mock.Mock()
         random.choice = mock.Mock(return_value="a")
 
@@ -260,18 +681,47 @@ class MockTest(TestCase):
             'dummy', 'dummy', {'x-account-meta-temp-url-key': 'a' * 32})
 
         # Authorized, temp url key already set
-        account = [{'x-account-meta-temp-url-key': 'dummy'}, ]
-        swiftclient.client.get_account = mock.Mock(return_value=(account))
-        self.assertIsNotNone(swiftbrowser.utils.get_temp_key("dummy", "dummy"))
+        account = {'x-account-meta-temp-url-key': 'dummy'}
+        swiftclient.client.head_account = mock.Mock(return_value=account)
+        self.assertIsNotNone(swiftbrowser.utils.get_temp_key("other", "dummy"))
+
+    def test_get_temp_key_cached(self):
+        account = {'x-account-meta-temp-url-key': 'dummy'}
+        swiftclient.client.head_account = mock.Mock(return_value=account)
+
+        key = swiftbrowser.utils.get_temp_key("dummy", "dummy")
+        self.assertEqual(key, 'dummy')
+        self.assertEqual(swiftbrowser.utils.get_temp_key("dummy", "dummy"),
+                         key)
+        self.assertEqual(swiftclient.client.head_account.call_count, 1)
+
+        # Keys are not shared with other credentials
+        swiftbrowser.utils.get_temp_key("dummy", "other")
+        self.assertEqual(swiftclient.client.head_account.call_count, 2)
+
+        # Shared cache tier is used when the process tier is empty
+        swiftbrowser.utils._temp_keys.clear()
+        swiftbrowser.utils.get_temp_key("dummy", "dummy")
+        self.assertEqual(swiftclient.client.head_account.call_count, 2)
+
+        # Fresh keys are read from the account and replace cached ones
+        account['x-account-meta-temp-url-key'] = 'rotated'
+        self.assertEqual(
+            swiftbrowser.utils.get_temp_key("dummy", "dummy", fresh=True),
+            'rotated')
+        self.assertEqual(swiftclient.client.head_account.call_count, 3)
+        self.assertEqual(swiftbrowser.utils.get_temp_key("dummy", "dummy"),
+                         'rotated')
+        self.assertEqual(swiftclient.client.head_account.call_count, 3)
 
     def test_tempurl(self):
-        swiftclient.client.get_account = mock.Mock(
+        swiftclient.client.head_account = mock.Mock(
             side_effect=swiftclient.client.ClientException(''))
         response = self.client.get(reverse('tempurl', args=['c', 'o']))
         self.assertEqual(response.status_code, 302)
 
-        account = [{'x-account-meta-temp-url-key': 'dummy'}, ]
-        swiftclient.client.get_account = mock.Mock(return_value=(account))
+        account = {'x-account-meta-temp-url-key': 'dummy'}
+        swiftclient.client.head_account = mock.Mock(return_value=account)
 
         response = self.client.get(reverse('tempurl', args=['c', 'o']))
         self.assertEqual(response.status_code, 200)
@@ -281,6 +731,404 @@ class MockTest(TestCase):
         self.assertEqual(response.context['container'], u'ü')
         self.assertEqual(response.context['objectname'], u'ö')
 
+    def test_tempurls(self):
+        self.login('http://swift/v1/AUTH_test', 'token')
+        url = reverse('tempurls', kwargs={'container': 'c', 'prefix': 'pre/'})
+        objects = [{'name': 'pre/a'}, {'name': 'pre/b c'},
+                   {'name': 'pre/d/',
+                    'content_type': 'application/x-directory'}]
+        capabilities = {'tempurl': {'methods': ['GET', 'PUT']},
+                        'swift': {'version': '2.30.1'}}
+
+        def signature(path, expires):
+            body = 'PUT\n%s\n%s' % (expires, path)
+            return hmac.new(b'secret', body.encode('utf-8'),
+                            hashlib.sha1).hexdigest()
+
+        with mock.patch('swiftbrowser.views.get_capabilities',
+                        return_value=capabilities), \
+                mock.patch('swiftbrowser.views.get_temp_key',
+                           return_value='secret') as get_temp_key, \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)) as get_container:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertFalse(get_temp_key.called)
+
+            resp = self.client.get(url, {'expires': 60, 'method': 'PUT',
+                                         'format': 'csv'})
+            rows = list(csv.reader(
+                b''.join(resp.streaming_content).decode('utf-8').splitlines()))
+            self.assertEqual(rows[0], ['name', 'url', 'method', 'expires'])
+            self.assertEqual([row[0] for row in rows[1:]],
+                             ['pre/a', 'pre/b c'])
+            expires = rows[1][3]
+            self.assertEqual(rows[2][1], (
+                'http://swift/v1/AUTH_test/c/pre/b%%20c?temp_url_sig=%s&'
+                'temp_url_expires=%s' % (signature(
+                    '/v1/AUTH_test/c/pre/b c', expires), expires)))
+            self.assertEqual(get_temp_key.call_count, 1)
+            self.assertEqual(get_container.call_count, 1)
+
+            resp = self.client.get(url, {'expires': 60, 'method': 'PUT',
+                                         'format': 'json'})
+            result = json.loads(b''.join(resp.streaming_content))
+            self.assertEqual(result['method'], 'PUT')
+            self.assertEqual([obj['name'] for obj in result['objects']],
+                             ['pre/a', 'pre/b c'])
+
+            resp = self.client.get(url, {'expires': 60, 'method': 'PUT',
+                                         'format': 'json', 'scope': 'prefix'})
+            result = json.loads(b''.join(resp.streaming_content))
+            expires = result['expires']
+            self.assertEqual(result['objects'], [{
+                'name': 'pre/',
+                'url': 'http://swift/v1/AUTH_test/c/pre/?temp_url_sig=%s&'
+                       'temp_url_expires=%s&temp_url_prefix=pre%%2F' % (
+                           signature('prefix:/v1/AUTH_test/c/pre/', expires),
+                           expires)}])
+            self.assertEqual(get_container.call_count, 2)
+
+            # Methods and prefix urls are limited to the cluster capabilities
+            capabilities['swift']['version'] = '2.11.0'
+            for params in ({'scope': 'prefix'}, {'method': 'DELETE'}):
+                params.update({'expires': 60, 'format': 'csv'})
+                params.setdefault('method', 'GET')
+                resp = self.client.get(url, params)
+                self.assertEqual(resp.status_code, 200)
+                self.assertTrue(resp.context['form'].errors)
+
+    def test_download_archive(self):
+        objects = [
+            {'name': 'a/b/', 'content_type': 'application/x-directory',
+             'last_modified': '2020-01-31T12:00:00.000000'},
+            {'name': 'a/b/large', 'bytes': 10,
+             'last_modified': '2020-01-31T12:00:00.000000'},
+            {'name': 'a/b/deleted', 'bytes': 1},
+            {'name': 'a/b/c/small', 'bytes': 2}]
+        contents = {'a/b/large': b'0123456789', 'a/b/c/small': b'ab'}
+        bodies = []
+
+        def get_object(url, token, container, name, **kwargs):
+            if name not in contents:
+                raise swiftclient.client.ClientException('', http_status=404)
+            data = contents[name]
+            body = mock.MagicMock()
+            body.__iter__.return_value = iter(
+                [data[i:i + 3] for i in range(0, len(data), 3)])
+            bodies.append(body)
+            return {'content-length': str(len(data))}, body
+
+        url = reverse('download_archive', kwargs={'container': 'c',
+                                                  'prefix': 'a/b/'})
+        with self.settings(ARCHIVE_PREFETCH_SIZE=4, ARCHIVE_CONCURRENCY=2), \
+                mock.patch('swiftclient.client.head_container',
+                           return_value={}), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)), \
+                mock.patch('swiftclient.client.get_object', get_object):
+            resp = self.client.get(url, {'format': 'zip'})
+            self.assertEqual(resp['Content-Disposition'],
+                             "attachment; filename*=UTF-8''b.zip")
+            archive = zipfile.ZipFile(io.BytesIO(
+                b''.join(resp.streaming_content)))
+            self.assertEqual(archive.namelist(),
+                             ['b/', 'b/large', 'b/c/small'])
+            self.assertEqual(archive.read('b/large'), b'0123456789')
+            self.assertEqual(archive.read('b/c/small'), b'ab')
+            self.assertEqual(archive.getinfo('b/large').date_time[:3],
+                             (2020, 1, 31))
+            self.assertTrue(all(body.close.called for body in bodies))
+
+            resp = self.client.get(url, {'format': 'tar'})
+            content = b''.join(resp.streaming_content)
+            self.assertEqual(len(content) % tarfile.RECORDSIZE, 0)
+            archive = tarfile.open(fileobj=io.BytesIO(content))
+            self.assertEqual(archive.getnames(),
+                             ['b', 'b/large', 'b/c/small'])
+            self.assertTrue(archive.getmember('b').isdir())
+            self.assertEqual(archive.extractfile('b/large').read(),
+                             b'0123456789')
+
+            # A whole container is archived below its name
+            resp = self.client.get(reverse('download_archive',
+                                           kwargs={'container': 'c'}))
+            self.assertEqual(resp['Content-Disposition'],
+                             "attachment; filename*=UTF-8''c.zip")
+
+        with mock.patch('swiftclient.client.head_container',
+                        side_effect=swiftclient.client.ClientException('')):
+            resp = self.client.get(url)
+        self.assertEqual(resp['Location'], '/objects/c/')
+
+    @skipUnless(swiftbrowser.thumbnails.Image, "Thumbnails require Pillow")
+    def test_thumbnail(self):
+        Image = swiftbrowser.thumbnails.Image
+
+        def encode(size, fmt):
+            output = io.BytesIO()
+            Image.new('RGB', size, (255, 0, 0)).save(output, fmt)
+            return output.getvalue()
+
+        # A large JPEG with a thumbnail in its EXIF header
+        exif = b'Exif\x00\x00II*\x00\x08\x00\x00\x00' + b'\x00' * 6 + \
+            encode((16, 12), 'JPEG')
+        photo = b'\xff\xd8\xff\xe1' + (len(exif) + 2).to_bytes(2, 'big') + \
+            exif + b'\xff\xda' + b'\x00' * 100000
+        objects = {'img.png': encode((300, 200), 'PNG'), 'photo.jpg': photo,
+                   'a.txt': b'text'}
+        stored = {}
+
+        def get_object(url, token, container, name, headers=None, **kwargs):
+            if container == settings.THUMBNAIL_CONTAINER:
+                if name not in stored:
+                    raise swiftclient.client.ClientException(
+                        '', http_status=404)
+                return {}, stored[name]
+            data = objects[name]
+            start, _sep, end = headers['Range'][6:].partition('-')
+            end = min(int(end), len(data) - 1) if end else len(data) - 1
+            return {'content-range': 'bytes %s-%d/%d' % (
+                start, end, len(data))}, io.BytesIO(data[int(start):end + 1])
+
+        def put_object(url, token, container, name, contents=None,
+                       **kwargs):
+            if not put_container.called:
+                raise swiftclient.client.ClientException('', http_status=404)
+            stored[name] = contents
+
+        def thumbnail(name):
+            return self.client.get(reverse('thumbnail', kwargs={
+                'container': 'c', 'objectname': name}), {'v': 'etag'})
+
+        tmpdir = tempfile.mkdtemp()
+        get_object = mock.Mock(side_effect=get_object)
+        try:
+            with self.settings(THUMBNAIL_CACHE_PATH=tmpdir,
+                               THUMBNAIL_READ_SIZE=65536), \
+                    mock.patch('swiftclient.client.head_container',
+                               return_value={}) as head_container, \
+                    mock.patch('swiftclient.client.get_object', get_object), \
+                    mock.patch('swiftclient.client.put_object',
+                               side_effect=put_object), \
+                    mock.patch('swiftclient.client.put_container') \
+                    as put_container:
+                resp = thumbnail('img.png')
+                self.assertEqual(resp['Content-Type'], 'image/jpeg')
+                self.assertEqual(Image.open(io.BytesIO(resp.content)).size,
+                                 (128, 85))
+                self.assertEqual(len(stored), 1)
+                self.assertTrue(put_container.called)
+
+                # Served from the disk cache, then from Swift
+                get_object.reset_mock()
+                self.assertEqual(thumbnail('img.png').content, resp.content)
+                self.assertFalse(get_object.called)
+                shutil.rmtree(tmpdir)
+                self.assertEqual(thumbnail('img.png').content, resp.content)
+                self.assertEqual(get_object.call_count, 1)
+
+                get_object.reset_mock()
+                resp = thumbnail('photo.jpg')
+                self.assertEqual(Image.open(io.BytesIO(resp.content)).size,
+                                 (16, 12))
+                # Only the range holding the header is read
+                self.assertEqual(get_object.call_count, 2)
+                self.assertEqual(get_object.call_args[1]['headers'],
+                                 {'Range': 'bytes=0-65535'})
+
+                get_object.reset_mock()
+                self.assertEqual(thumbnail('a.txt').status_code, 404)
+                self.assertEqual(thumbnail('a.txt').status_code, 404)
+                self.assertEqual(get_object.call_count, 2)
+                self.assertEqual(head_container.call_count, 1)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def test_search(self):
+        objects = [{'name': 'a/Report 2020.pdf'}, {'name': 'a/b/photo.jpg'},
+                   {'name': 'notes.txt'}]
+        listings = {None: objects, 'notes.txt': [{'name': 'z/new.JPG'}]}
+
+        def get_container(url, token, container, marker=None, **kwargs):
+            return {}, listings[marker]
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        with mock.patch('swiftclient.client.head_container',
+                        return_value={'x-container-object-count': '3'}
+                        ) as head, \
+                mock.patch('swiftclient.client.get_container',
+                           side_effect=get_container) as get, \
+                self.settings(SEARCH_INDEX_PATH=tmpdir + '/index.sqlite3'):
+            resp = self.client.get(reverse('search', args=['c']),
+                                   {'q': 'REPORT'})
+            self.assertEqual([r['name'] for r in resp.context['results']],
+                             ['a/Report 2020.pdf'])
+            self.assertEqual(resp.context['results'][0]['prefix'], 'a/')
+            self.assertEqual(get.call_count, 1)
+
+            # Names are matched from the index without listing again
+            resp = self.client.get(reverse('search', args=['c']),
+                                   {'q': '*.jpg'})
+            self.assertEqual([r['name'] for r in resp.context['results']],
+                             ['a/b/photo.jpg'])
+            self.assertEqual(get.call_count, 1)
+
+            # New names are listed starting at the last indexed name
+            head.return_value = {'x-container-object-count': '4'}
+            with self.settings(SEARCH_INDEX_REFRESH=0):
+                resp = self.client.get(reverse('search', args=['c']),
+                                       {'q': 'jpg'})
+            self.assertEqual([r['name'] for r in resp.context['results']],
+                             ['a/b/photo.jpg', 'z/new.JPG'])
+            self.assertEqual(get.call_args[1]['marker'], 'notes.txt')
+
+        with mock.patch('swiftclient.client.head_container',
+                        side_effect=swiftclient.client.ClientException('')):
+            resp = self.client.get(reverse('search', args=['c']),
+                                   {'q': 'jpg'})
+            self.assertEqual(resp.status_code, 302)
+
+    def test_usage(self):
+        objects = [{'name': 'a/b/big', 'bytes': 100},
+                   {'name': 'a/c/small', 'bytes': 10},
+                   {'name': 'a/file', 'bytes': 1},
+                   {'name': 'root', 'bytes': 5}]
+        new = [{'name': 'z/new', 'bytes': 50}]
+        listings = {None: objects, 'root': new}
+
+        def get_container(url, token, container, marker=None, **kwargs):
+            return {}, listings.get(marker, [])
+
+        headers = {'x-container-object-count': '4',
+                   'x-container-bytes-used': '116'}
+        with mock.patch('swiftclient.client.head_container',
+                        return_value=headers), \
+                mock.patch('swiftclient.client.get_container',
+                           side_effect=get_container) as get:
+            resp = self.client.get(reverse('usage', args=['c']))
+            self.assertEqual(
+                [(f['prefix'], f['count'], f['bytes'])
+                 for f in resp.context['folders']], [('a/', 3, 111)])
+            self.assertEqual(resp.context['object_count'], 1)
+            self.assertEqual(resp.context['object_bytes'], 5)
+
+            resp = self.client.get(reverse('usage', args=['c', 'a/']))
+            self.assertEqual(
+                [(f['display_name'], f['bytes'])
+                 for f in resp.context['folders']], [('b', 100), ('c', 10)])
+            self.assertEqual(resp.context['object_bytes'], 1)
+            self.assertEqual(resp.context['largest'][0], ('a/b/', 1, 100))
+            self.assertEqual(get.call_count, 1)
+
+            # New objects are listed starting at the last scanned name
+            headers.update({'x-container-object-count': '5',
+                            'x-container-bytes-used': '166'})
+            resp = self.client.get(reverse('usage', args=['c']))
+            self.assertTrue(resp.context['current'])
+            self.assertEqual(resp.context['folders'][1]['prefix'], 'z/')
+            self.assertEqual(get.call_args[1]['marker'], 'root')
+
+            # Deleted objects require a complete rescan
+            objects[:] = objects[1:] + new
+            headers.update({'x-container-object-count': '4',
+                            'x-container-bytes-used': '66'})
+            with self.settings(USAGE_REBUILD_INTERVAL=0):
+                resp = self.client.get(reverse('usage', args=['c']))
+            self.assertEqual(resp.context['total_bytes'], 66)
+            self.assertIsNone(get.call_args[1]['marker'])
+
+        with mock.patch('swiftclient.client.head_container',
+                        side_effect=swiftclient.client.ClientException('')):
+            resp = self.client.get(reverse('usage', args=['c']))
+            self.assertEqual(resp.status_code, 302)
+
+    def test_listing_api(self):
+        headers = {'x-container-object-count': '3',
+                   'x-container-bytes-used': '30',
+                   'x-timestamp': '1400000000.00000'}
+        objects = [{'name': 'a', 'bytes': 10}, {'name': 'b', 'bytes': 10},
+                   {'name': 'c', 'bytes': 10}]
+        url = reverse('api_objects', args=['c'])
+        with mock.patch('swiftclient.client.head_container',
+                        return_value=headers), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)) as get:
+            resp = self.client.get(url, {'limit': 2})
+            self.assertEqual(resp.json(), {'items': objects[:2],
+                                           'next_marker': 'b'})
+            self.assertEqual(get.call_args[1]['limit'], 3)
+            etag = resp['ETag']
+
+            resp = self.client.get(url, {'limit': 2},
+                                   HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp['ETag'], etag)
+            self.assertEqual(get.call_count, 1)
+
+            # Other pages and changed containers have other ETags
+            resp = self.client.get(url, {'limit': 2, 'marker': 'b'},
+                                   HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            headers['x-container-object-count'] = '4'
+            resp = self.client.get(url, {'limit': 2},
+                                   HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(get.call_count, 3)
+
+            # Renames keep the container headers
+            etag = resp['ETag']
+            resp = self.client.get(url, {'limit': 2},
+                                   HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304)
+            swiftbrowser.utils.invalidate_listings('', 'c', 'dir/')
+            resp = self.client.get(url, {'limit': 2},
+                                   HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotEqual(resp['ETag'], etag)
+
+        with mock.patch('swiftclient.client.head_account',
+                        side_effect=swiftclient.client.ClientException(
+                            '', http_status=401)):
+            resp = self.client.get(reverse('api_containers'))
+            self.assertEqual(resp.status_code, 403)
+
+    def test_server_timing_and_metrics(self):
+        for histogram in swiftbrowser.metrics.HISTOGRAMS:
+            histogram.clear()
+        self.login('http://127.0.0.1:8080/v1/AUTH_test', 'token')
+        head = mock.Mock(__name__='head_container',
+                         return_value={'x-container-object-count': '0',
+                                       'x-container-bytes-used': '0'})
+        get = mock.Mock(__name__='get_container',
+                        side_effect=swiftclient.client.ClientException(
+                            '', http_status=404))
+        with mock.patch('swiftclient.client.head_container', head), \
+                mock.patch('swiftclient.client.get_container', get):
+            resp = self.client.get(reverse('api_objects', args=['c']))
+        timing = resp['Server-Timing']
+        self.assertTrue(timing.startswith('swift;dur='))
+        self.assertIn('desc="2 requests"', timing)
+        self.assertIn('swift.head_container;dur=', timing)
+        self.assertIn('swift.get_container;dur=', timing)
+        self.assertIn('desc="1x 404"', timing)
+
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.1']):
+            resp = self.client.get(reverse('metrics'))
+            self.assertEqual(resp.status_code, 403)
+        resp = self.client.get(reverse('metrics'))
+        text = resp.content.decode('utf-8')
+        self.assertIn('swiftbrowser_swift_request_duration_seconds_count'
+                      '{operation="get_container",status="404"} 1', text)
+        self.assertIn('swiftbrowser_view_swift_requests_bucket'
+                      '{view="api_objects",le="2"} 1', text)
+        self.assertIn('# TYPE swiftbrowser_pool_hits_total counter', text)
+
+        with self.settings(SERVER_TIMING=False):
+            resp = self.client.get(reverse('metrics'))
+            self.assertFalse(resp.has_header('Server-Timing'))
+
     def test_create_pseudofolder(self):
         swiftclient.client.put_object = mock.Mock(
             side_effect=swiftclient.client.ClientException(''))
@@ -318,5 +1166,507 @@ class MockTest(TestCase):
         self.assertEqual(resp.status_code, 200)
         swiftclient.client.post_container.assert_called_with(
             '', '', 'container',
-            {'X-Container-Read': ',testuser',
-             'X-Container-Write': ',testuser'})
+            {'X-Container-Read': 'testuser',
+             'X-Container-Write': 'testuser'})
+        self.assertEqual(swiftclient.client.head_container.call_count, 1)
+        self.assertEqual(resp.context['acls'],
+                         {'testuser': {'read': True, 'write': True}})
+
+        # Only changed ACLs are written
+        swiftclient.client.head_container = mock.Mock(return_value={
+            'x-container-read': 'a, testuser,a',
+            'x-container-write': 'testuser'})
+        swiftclient.client.post_container = mock.Mock()
+        self.client.post(reverse('edit_acl', args=['container']),
+                         {'username': 'testuser', 'read': 'On'})
+        self.assertFalse(swiftclient.client.post_container.called)
+
+        resp = self.client.get(reverse('edit_acl', args=['container']),
+                               {'delete': 'a'})
+        swiftclient.client.post_container.assert_called_with(
+            '', '', 'container', {'X-Container-Read': 'testuser'})
+        self.assertEqual(list(resp.context['acls']), ['testuser'])
+
+    def test_copy_and_rename(self):
+        self.login('http://127.0.0.1:8080/v1/AUTH_test', 'token')
+        url = reverse('copy_objects', args=['c', 'pre/'])
+        with mock.patch('swiftclient.client.get_account',
+                        return_value=({}, [{'name': 'c'}, {'name': 'd'}])), \
+                mock.patch('swiftclient.client.get_capabilities',
+                           return_value={}), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, [{'name': 'pre/dir/x'}])), \
+                mock.patch('swiftclient.client.put_object') as put, \
+                mock.patch('swiftclient.client.delete_object') as delete:
+            # Names outside the current folder are ignored
+            resp = self.client.get(url, {'name': ['pre/obj', 'other']})
+            self.assertEqual(resp.context['names'], ['pre/obj'])
+            self.assertEqual(resp.context['containers'], ['c', 'd'])
+
+            resp = self.client.post(url, {
+                'name': ['pre/obj', 'pre/dir/'], 'action': 'copy',
+                'container': 'd', 'folder': '/new/'})
+            self.assertEqual(resp['Location'], '/objects/c/pre/')
+            self.assertEqual(sorted((c[0][2], c[0][3])
+                                    for c in put.call_args_list),
+                             [('d', 'new/dir/x'), ('d', 'new/obj')])
+            self.assertFalse(delete.called)
+
+            resp = self.client.post(url, {
+                'name': ['pre/dir/'], 'action': 'move', 'container': 'c',
+                'folder': 'pre/dir/sub'})
+            self.assertContains(resp, 'can not be copied into itself')
+
+            put.reset_mock()
+            resp = self.client.post(
+                reverse('rename_object', args=['c', 'pre/dir/']),
+                {'name': 'renamed'})
+            self.assertEqual(resp['Location'], '/objects/c/pre/')
+            put.assert_called_once_with(
+                'http://127.0.0.1:8080/v1/AUTH_test', 'token', 'c',
+                'pre/renamed/x', contents=b'',
+                headers={'X-Copy-From': '/c/pre/dir/x'},
+                query_string='multipart-manifest=get', http_conn=mock.ANY)
+            delete.assert_called_once_with(
+                'http://127.0.0.1:8080/v1/AUTH_test', 'token', 'c',
+                'pre/dir/x', http_conn=mock.ANY)
+
+    def test_batch_acl(self):
+        containers = [{'name': 'c%d' % i} for i in range(5)]
+        acls = {'c1': 'team:user', 'c3': 'other'}
+
+        def head_container(url, token, container, **kwargs):
+            if container == 'c4':
+                raise swiftclient.client.ClientException(
+                    '', http_status=403)
+            return {'x-container-read': acls.get(container, '')}
+
+        with mock.patch('swiftclient.client.get_account',
+                        return_value=({}, containers)), \
+                mock.patch('swiftclient.client.head_container',
+                           side_effect=head_container), \
+                mock.patch('swiftclient.client.post_container') as post:
+            resp = self.client.get(reverse('batch_acl'))
+            self.assertEqual(resp.context['containers'],
+                             ['c0', 'c1', 'c2', 'c3', 'c4'])
+
+            resp = self.client.post(reverse('batch_acl'), {
+                'containers': ['c1', 'c3', 'c4'], 'username': 'team:user',
+                'read': 'On', 'action': 'grant'})
+            self.assertEqual(resp.status_code, 302)
+            post.assert_called_once_with(
+                '', '', 'c3', {'X-Container-Read': 'other,team:user'})
+
+        job = swiftbrowser.jobs.Job.get(self.client.session['jobs'][0])
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual((job.processed, job.failed), (3, 1))
+        self.assertIn('c4', job.message)
+
+
+class ConnectionPoolTest(TestCase):
+    """ Unit tests for the Swift connection pool """
+
+    def test_reuse(self):
+        pool = swiftbrowser.connection.ConnectionPool(maxsize=1)
+        url = 'http://127.0.0.1:8080/v1/AUTH_test'
+
+        with pool.connection(url) as (parsed, conn):
+            self.assertEqual(parsed.path, '/v1/AUTH_test')
+        with pool.connection(url + '2') as (parsed, conn2):
+            self.assertEqual(parsed.path, '/v1/AUTH_test2')
+        self.assertIs(conn, conn2)
+        self.assertEqual(pool.stats()['hits'], 1)
+        self.assertEqual(pool.stats()['misses'], 1)
+
+        # A connection failing without a Swift response is not reused
+        with self.assertRaises(swiftclient.client.ClientException):
+            with pool.connection(url):
+                raise swiftclient.client.ClientException('')
+        self.assertEqual(pool.stats()['idle'], 0)
+
+        # Idle connections time out
+        pool.idle_timeout = 0
+        with pool.connection(url):
+            pass
+        with pool.connection(url):
+            pass
+        self.assertEqual(pool.stats()['discarded'], 2)
+
+    def test_call(self):
+        get_account = mock.Mock(return_value=({}, []))
+        swiftbrowser.connection.call(get_account, '', '')
+        get_account.assert_called_with('', '')
+
+        swiftbrowser.connection.call(get_account, 'http://127.0.0.1', '')
+        self.assertIn('http_conn', get_account.call_args[1])
+
+
+class BulkTest(TestCase):
+    """ Unit tests for bulk operations """
+
+    url = 'http://127.0.0.1:8080/v1/AUTH_test'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_delete_objects_bulk(self):
+        capabilities = {'bulk_delete': {'max_deletes_per_request': 2}}
+        responses = [{'Number Deleted': 1, 'Number Not Found': 0,
+                      'Response Status': '400 Bad Request',
+                      'Errors': [['/container/obj%202', '409 Conflict']]},
+                     {'Number Deleted': 0, 'Number Not Found': 1,
+                      'Errors': []}]
+        objects = [{'name': 'obj1'}, {'name': 'obj 2'}, {'name': 'obj3'}]
+        with mock.patch('swiftclient.client.get_capabilities',
+                        return_value=capabilities), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)), \
+                mock.patch('swiftbrowser.bulk.bulk_delete',
+                           side_effect=responses) as bulk_delete:
+            result = swiftbrowser.bulk.delete_objects(
+                self.url, 'token', 'container')
+
+        self.assertEqual(bulk_delete.call_args_list, [
+            mock.call(self.url, 'token',
+                      ['/container/obj1', '/container/obj 2']),
+            mock.call(self.url, 'token', ['/container/obj3'])])
+        self.assertEqual(result.succeeded, 1)
+        self.assertEqual(result.not_found, 1)
+        self.assertEqual(result.errors, [('obj 2', 409)])
+
+    def test_delete_objects_bulk_failed(self):
+        # Failed batches are only reported in the response status
+        capabilities = {'bulk_delete': {'max_deletes_per_request': 10}}
+        response = {'Number Deleted': 1, 'Number Not Found': 0,
+                    'Response Status': '503 Service Unavailable',
+                    'Errors': []}
+        objects = [{'name': 'obj1'}, {'name': 'obj2'}, {'name': 'obj3'}]
+        with mock.patch('swiftclient.client.get_capabilities',
+                        return_value=capabilities), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)), \
+                mock.patch('swiftbrowser.bulk.bulk_delete',
+                           return_value=response):
+            result = swiftbrowser.bulk.delete_objects(
+                self.url, 'token', 'container')
+
+        self.assertEqual(result.succeeded, 1)
+        self.assertEqual(result.errors, [('obj2', 503), ('obj3', 503)])
+
+    def test_delete_objects_concurrent(self):
+        objects = [{'name': 'obj%d' % i} for i in range(5)]
+
+        def delete_object(url, token, container, name, **kwargs):
+            if name == 'obj3':
+                raise swiftclient.client.ClientException('', http_status=404)
+            if name == 'obj4':
+                raise swiftclient.client.ClientException('', http_status=409)
+
+        with mock.patch('swiftclient.client.get_capabilities',
+                        return_value={}), \
+                mock.patch('swiftclient.client.get_container',
+                           side_effect=[({}, objects), ({}, [])]), \
+                mock.patch('swiftclient.client.delete_object',
+                           side_effect=delete_object) as delete, \
+                self.settings(BULK_CONCURRENCY=2):
+            result = swiftbrowser.bulk.delete_objects(
+                self.url, 'token', 'container')
+
+        self.assertEqual(delete.call_count, 5)
+        self.assertEqual(result.succeeded, 3)
+        self.assertEqual(result.not_found, 1)
+        self.assertEqual(result.errors, [('obj4', 409)])
+        self.assertEqual(result.processed, 5)
+
+    def test_copy_objects(self):
+        capabilities = {'bulk_delete': {'max_deletes_per_request': 10}}
+        listing = [{'name': 'a/'}, {'name': 'a/x y'}, {'name': 'a/z'}]
+
+        def put_object(url, token, container, name, **kwargs):
+            if name == 'b/a/z':
+                raise swiftclient.client.ClientException('', http_status=403)
+
+        with mock.patch('swiftclient.client.get_capabilities',
+                        return_value=capabilities), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, listing)) as get, \
+                mock.patch('swiftclient.client.put_object',
+                           side_effect=put_object) as put, \
+                mock.patch('swiftbrowser.bulk.bulk_delete', return_value={
+                    'Number Deleted': 3, 'Errors': []}) as bulk_delete:
+            result = swiftbrowser.bulk.copy_objects(
+                self.url, 'token', 'c', ['file', 'a/'], '', 'c', 'b/',
+                move=True)
+
+            self.assertEqual(get.call_args[1]['prefix'], 'a/')
+            self.assertEqual(sorted(c[0][3] for c in put.call_args_list),
+                             ['b/a/', 'b/a/x y', 'b/a/z', 'b/file'])
+            self.assertEqual(
+                put.call_args_list[0][1]['headers'],
+                {'X-Copy-From': '/c/file'})
+            self.assertEqual(put.call_args_list[0][1]['query_string'],
+                             'multipart-manifest=get')
+            # Only copied objects are deleted
+            self.assertEqual(bulk_delete.call_args_list, [
+                mock.call(self.url, 'token', ['/c/file']),
+                mock.call(self.url, 'token', ['/c/a/', '/c/a/x y'])])
+            self.assertEqual(result.succeeded, 3)
+            self.assertEqual(result.errors, [('a/z', 403)])
+
+            with self.assertRaises(ValueError):
+                swiftbrowser.bulk.copy_objects(
+                    self.url, 'token', 'c', ['a/'], '', 'c', 'a/b/')
+
+    def test_extract_archive(self):
+        conn = mock.Mock()
+        conn.getresponse.return_value = mock.Mock(
+            status=200, read=mock.Mock(return_value=(
+                b'  {"Number Files Created": 1, "Response Status": '
+                b'"400 Bad Request", "Errors": [["c/p/x", "413"]]}')))
+        self.assertEqual(swiftbrowser.bulk.archive_format('A.TGZ'), 'tar.gz')
+        self.assertIsNone(swiftbrowser.bulk.archive_format('a.zip'))
+
+        with mock.patch.object(swiftbrowser.connection.pool, 'acquire',
+                               return_value=(urlparse(self.url), conn)), \
+                mock.patch.object(swiftbrowser.connection.pool, 'release'):
+            result = swiftbrowser.bulk.extract_archive(
+                self.url, 'token', 'c', 'p q/', 'body', 'tar.bz2', 4)
+
+        conn.request.assert_called_with(
+            'PUT', '/v1/AUTH_test/c/p%20q?extract-archive=tar.bz2', 'body',
+            {'X-Auth-Token': 'token', 'Accept': 'application/json',
+             'Content-Length': '4'})
+        self.assertEqual(result['Number Files Created'], 1)
+        self.assertEqual(result['Errors'], [['c/p/x', '413']])
+
+
+@skipUnless(django.VERSION >= (3, 1), "Async views require Django 3.1")
+@override_settings(ROOT_URLCONF='swiftbrowser.async_urls')
+class AsyncViewTest(TestCase):
+    """ Unit tests for the async views served by swiftbrowser.asgi """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_containerview(self):
+        with mock.patch('swiftclient.client.get_account',
+                        return_value=({}, [{'name': 'c', 'count': 1,
+                                            'bytes': 1}])):
+            resp = self.client.get(reverse('containerview'))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['containers'][0]['name'], 'c')
+
+        cache.clear()
+        with mock.patch('swiftclient.client.get_account',
+                        side_effect=swiftclient.client.ClientException('')):
+            resp = self.client.get(reverse('containerview'))
+        self.assertEqual(resp['Location'], reverse('login'))
+
+    def test_batch_acl(self):
+        # Sync views redirecting to async views must use the URL names
+        with mock.patch('swiftclient.client.get_account',
+                        return_value=({}, [{'name': 'c'}])), \
+                mock.patch('swiftclient.client.head_container',
+                           return_value={}), \
+                mock.patch('swiftclient.client.post_container'):
+            resp = self.client.post(reverse('batch_acl'), {
+                'containers': ['c'], 'username': 'team:user',
+                'read': 'On', 'action': 'grant'})
+        self.assertEqual(resp['Location'], reverse('containerview'))
+
+    def test_iterate(self):
+        # Blocking iterators are read in the executor
+        async def read():
+            return [chunk async for chunk in
+                    swiftbrowser.async_views.iterate([b'a', b'b'])]
+
+        self.assertEqual(asyncio.run(read()), [b'a', b'b'])
+
+    def test_concurrent_requests(self):
+        # Middleware must not serialize async views in a single thread
+        def get_account(*args, **kwargs):
+            time.sleep(0.3)
+            return {}, []
+
+        application = ASGIHandler()
+
+        async def get(path):
+            scope = {'type': 'http', 'asgi': {'version': '3.0'},
+                     'http_version': '1.1', 'method': 'GET',
+                     'scheme': 'http', 'path': path,
+                     'raw_path': path.encode('utf-8'), 'query_string': b'',
+                     'root_path': '', 'headers': [(b'host', b'testserver')],
+                     'client': ('127.0.0.1', 1234),
+                     'server': ('testserver', 80)}
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'',
+                        'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            await application(scope, receive, send)
+            return dict(messages[0]['headers']), messages[0]['status']
+
+        async def get_all():
+            return await asyncio.gather(*[
+                get(reverse('containerview')) for _i in range(4)])
+
+        threads = set()
+        view_name = swiftbrowser.metrics.view_name
+
+        def record_thread(request):
+            threads.add(threading.current_thread())
+            return view_name(request)
+
+        with mock.patch('swiftclient.client.get_account',
+                        side_effect=get_account), \
+                mock.patch('swiftbrowser.metrics.view_name',
+                           side_effect=record_thread):
+            start = time.time()
+            responses = asyncio.run(get_all())
+            duration = time.time() - start
+        self.assertEqual([status for _h, status in responses], [200] * 4)
+        # The middleware runs in the event loop, not in a worker thread
+        self.assertEqual(threads, {threading.main_thread()})
+        self.assertTrue(all(b'Server-Timing' in headers
+                            for headers, _s in responses))
+        self.assertLess(duration, 0.9)
+
+    def test_objectview(self):
+        objects = [{'subdir': 'pre/'}, {'name': 'obj'}]
+        with mock.patch('swiftclient.client.get_container',
+                        return_value=({}, objects)):
+            resp = self.client.get(reverse('objectview',
+                                   kwargs={'container': 'container'}))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['folders'], [('pre/', 'pre/')])
+
+        with mock.patch('swiftclient.client.head_container',
+                        side_effect=swiftclient.client.ClientException('')):
+            resp = self.client.get(reverse('public_objectview',
+                                   kwargs={'account': 'AUTH_test',
+                                           'container': 'other'}))
+        self.assertEqual(resp['Location'], '/')
+
+    def test_sorted_objectview(self):
+        objects = [{'name': 'pre/%d' % i, 'bytes': i} for i in range(5)]
+        with mock.patch('swiftclient.client.head_container',
+                        return_value={}), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)), \
+                self.settings(LISTING_PAGE_SIZE=2):
+            resp = self.client.get(
+                reverse('objectview', args=['c', 'pre/']),
+                {'sort': 'size', 'order': 'desc', 'offset': 2})
+        self.assertEqual([o.name for o in resp.context['objects']],
+                         ['pre/2', 'pre/1'])
+        self.assertEqual(resp.context['sorting']['prev_offset'], 0)
+        self.assertEqual(resp.context['sorting']['next_offset'], 4)
+
+        with mock.patch('swiftclient.client.head_container',
+                        side_effect=swiftclient.client.ClientException('')):
+            resp = self.client.get(reverse('objectview', args=['c']),
+                                   {'sort': 'size'})
+        self.assertEqual(resp['Location'], reverse('containerview'))
+
+    def test_public_objectview_cache(self):
+        url = reverse('public_objectview', kwargs={'account': 'AUTH_test',
+                                                   'container': 'container'})
+        headers = {'x-container-object-count': '1', 'x-timestamp': '1'}
+        with mock.patch('swiftclient.client.head_container',
+                        return_value=headers) as head, \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, [{'name': 'obj'}])) as get:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('public', resp['Cache-Control'])
+            self.assertIn('max-age=60', resp['Cache-Control'])
+            self.assertNotIn('Cookie', resp.get('Vary', ''))
+            self.assertIn('Accept-Encoding', resp['Vary'])
+            self.assertNotIn('Server-Timing', resp)
+            etag = resp['ETag']
+
+            # Shared between visitors, revalidated against the container
+            cached = self.client.get(url)
+            self.assertEqual(cached.content, resp.content)
+            self.assertEqual(cached['ETag'], etag)
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(head.call_count, 1)
+            self.assertEqual(get.call_count, 1)
+
+            headers['x-container-object-count'] = '2'
+            swiftbrowser.utils.invalidate_listings(
+                settings.STORAGE_URL + 'AUTH_test', 'container')
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotEqual(resp['ETag'], etag)
+            self.assertEqual(head.call_count, 2)
+            self.assertEqual(get.call_count, 2)
+
+            # Renames don't change the container headers
+            etag = resp['ETag']
+            swiftbrowser.utils.invalidate_listings(
+                settings.STORAGE_URL + 'AUTH_test', 'container', 'dir/')
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotEqual(resp['ETag'], etag)
+            self.assertEqual(get.call_count, 3)
+
+    def test_enrich_listings(self):
+        objects = [{'name': 'large', 'bytes': 0, 'hash': 'a'},
+                   {'name': 'dynamic', 'bytes': 0, 'hash': 'b'},
+                   {'name': 'temporary', 'bytes': 5, 'hash': 'c'},
+                   {'name': 'gone', 'bytes': 7, 'hash': 'd'}]
+        headers = {
+            'large': {'content-length': '3000000',
+                      'x-static-large-object': 'True',
+                      'x-object-meta-color': 'blue'},
+            'dynamic': {'content-length': '2048',
+                        'x-object-manifest': 'c_segments/dynamic/'},
+            'temporary': {'content-length': '5',
+                          'x-delete-at': '1893456000'}}
+
+        def head_object(url, token, container, name, **kwargs):
+            if name not in headers:
+                raise swiftclient.client.ClientException('', http_status=404)
+            return headers[name]
+
+        url = reverse('objectview', kwargs={'container': 'c'})
+        with self.settings(ENRICH_LISTINGS=True), \
+                mock.patch('swiftclient.client.get_container',
+                           return_value=({}, objects)), \
+                mock.patch('swiftclient.client.head_object',
+                           side_effect=head_object) as head:
+            resp = self.client.get(url)
+            rows = dict((row.name, row) for row in resp.context['objects'])
+            self.assertEqual(rows['large'].bytes, 3000000)
+            self.assertEqual(rows['large'].size, filesizeformat(3000000))
+            self.assertEqual(rows['large'].manifest, 'slo')
+            self.assertEqual(rows['large'].metadata, [('color', 'blue')])
+            self.assertEqual(rows['dynamic'].manifest, 'dlo')
+            self.assertEqual(rows['temporary'].delete_at.year, 2030)
+            self.assertTrue(rows['temporary'].expires)
+            self.assertEqual(rows['gone'].bytes, 7)
+            self.assertEqual(head.call_count, 4)
+
+            # Cached per object version, failed requests are retried
+            self.client.get(url)
+            self.assertEqual(head.call_count, 5)
+
+        with mock.patch('swiftclient.client.get_container',
+                        return_value=({}, objects)), \
+                mock.patch('swiftclient.client.head_object') as head:
+            resp = self.client.get(url)
+        self.assertFalse(head.called)
+
+    def test_download(self):
+        with mock.patch('swiftbrowser.utils.get_temp_url',
+                        return_value='http://url'):
+            resp = self.client.get(reverse('download', kwargs={
+                                           'container': 'container',
+                                           'objectname': 'testfile'}))
+        self.assertEqual(resp['Location'], 'http://url')